@@ -0,0 +1,183 @@
+import os
+import time
+import hashlib
+import numpy as np
+import manifolds
+from parallel import parallel_map, scene_state, worker_scene
+from scene_format import hash_geometry
+
+# Precomputed map of the start configuration space of a scene: paths are traced
+# (`Scene.sample_path`) on a regular grid over the start position `u` and the start
+# angle, and for every grid cell the end shape parameter and the sequence of shape
+# ids along the path (its signature) are recorded. Queries for a requested endpoint
+# interpolate the start angle between neighbouring grid cells with matching
+# signatures, which gives a starting path close to the target.
+# Rows of the grid are traced on a process pool, and built atlases are cached on disk,
+# keyed by the scene geometry and the grid size.
+
+ATLAS_CACHE_DIR = os.environ.get('MANIFOLDS_CACHE_DIR', os.path.expanduser('~/.cache/manifold-visualizer'))
+
+def path_signature(path):
+    return tuple(vtx.shape.id for vtx in path)
+
+class ManifoldAtlas:
+    def __init__(self, start_u, angles, end_u, signature_index, signatures):
+        self.start_u = start_u                  # (N_u,) grid over the start shape
+        self.angles = angles                    # (N_a,) grid over start angles in degrees
+        self.end_u = end_u                      # (N_u, N_a) end shape parameter of each path
+        self.signature_index = signature_index  # (N_u, N_a) index into `signatures`
+        self.signatures = signatures            # List of shape id tuples
+
+    @staticmethod
+    def build(scene, n_u=64, n_angles=256, processes=None):
+        start_u = np.linspace(0, 1, n_u)
+        angles = np.linspace(-180, 180, n_angles, endpoint=False)
+        state = scene_state(scene)
+        jobs = [(scene.name, state, u, angles) for u in start_u]
+        rows = parallel_map(atlas_row, jobs, processes, chunks_per_process=1)
+
+        end_u = np.full((n_u, n_angles), np.nan)
+        signature_index = np.zeros((n_u, n_angles), dtype=np.int32)
+        signatures, lookup = [], {}
+        for i, (row_end_u, row_signatures) in enumerate(rows):
+            end_u[i] = row_end_u
+            for j, signature in enumerate(row_signatures):
+                if signature not in lookup:
+                    lookup[signature] = len(signatures)
+                    signatures.append(signature)
+                signature_index[i, j] = lookup[signature]
+
+        return ManifoldAtlas(start_u, angles, end_u, signature_index, signatures)
+
+    def save(self, filename):
+        # Signatures are stored as rows of a -1 padded integer table
+        max_len = max(len(s) for s in self.signatures)
+        table = np.full((len(self.signatures), max_len), -1, dtype=np.int32)
+        for k, s in enumerate(self.signatures):
+            table[k, :len(s)] = s
+        np.savez_compressed(filename, start_u=self.start_u, angles=self.angles, end_u=self.end_u,
+                            signature_index=self.signature_index, signatures=table)
+
+    @staticmethod
+    def load(filename):
+        data = np.load(filename)
+        signatures = [tuple(int(v) for v in row if v >= 0) for row in data['signatures']]
+        return ManifoldAtlas(data['start_u'], data['angles'], data['end_u'],
+                             data['signature_index'], signatures)
+
+    def row_angles(self, i, s, end_u):
+        # All start angles in grid row `i` for which a path with signature index `s` ends
+        # at `end_u`, linearly interpolated between neighbouring angle cells
+        e0 = self.end_u[i]
+        e1 = np.roll(e0, -1)
+        same = (self.signature_index[i] == s) & (np.roll(self.signature_index[i], -1) == s)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = (end_u - e0) / (e1 - e0)
+        candidates = np.where(same & (t >= 0) & (t <= 1))[0]
+        step = self.angles[1] - self.angles[0]
+        angles = self.angles[candidates] + t[candidates]*step
+        return (angles + 180) % 360 - 180
+
+    def query(self, start_u, signature, end_u, near_angle=None):
+        # Start angle (in degrees) for which a path with the given signature, starting at
+        # `start_u`, ends at `end_u`. The solutions of the two grid rows around `start_u`
+        # are blended linearly; if there are several, the one closest to `near_angle` is
+        # used. None if unreachable.
+        if signature not in self.signatures:
+            return None
+        s = self.signatures.index(signature)
+
+        i = int(np.clip(np.searchsorted(self.start_u, start_u) - 1, 0, len(self.start_u) - 2))
+        f = np.clip((start_u - self.start_u[i]) / (self.start_u[i+1] - self.start_u[i]), 0, 1)
+        angles0 = self.row_angles(i, s, end_u)
+        angles1 = self.row_angles(i + 1, s, end_u)
+
+        def closest(angles, target):
+            if target is None:
+                return angles[0]
+            return angles[np.argmin(np.abs((angles - target + 180) % 360 - 180))]
+
+        if len(angles0) == 0 and len(angles1) == 0:
+            return None
+        if len(angles1) == 0:
+            return closest(angles0, near_angle)
+        if len(angles0) == 0:
+            return closest(angles1, near_angle)
+        # Pair the solution of the nearer row with the matching one of the other row
+        if f < 0.5:
+            a0 = closest(angles0, near_angle)
+            a1 = closest(angles1, a0)
+        else:
+            a1 = closest(angles1, near_angle)
+            a0 = closest(angles0, a1)
+        angle = a0 + f*((a1 - a0 + 180) % 360 - 180)
+        return (angle + 180) % 360 - 180
+
+    def starting_path(self, scene, target_path_signature, end_u):
+        # Traced path from the current start position towards `end_u`, or None. Leaves the
+        # scene's start angle set accordingly.
+        angle = self.query(scene.start_u_current, target_path_signature, end_u, scene.start_angle_current)
+        if angle is None:
+            return None
+        start_angle_current = scene.start_angle_current
+        scene.start_angle_current = angle
+        path = scene.sample_path()
+        if path_signature(path) != target_path_signature:
+            scene.start_angle_current = start_angle_current
+            return None
+        return path
+
+def atlas_row(job):
+    # Traced paths for all start angles at a single start position
+    name, state, u, angles = job
+    scene = worker_scene(name, state)
+    start_u_current, start_angle_current = scene.start_u_current, scene.start_angle_current
+    scene.start_u_current = u
+    end_u = np.full(len(angles), np.nan)
+    signatures = []
+    for j, angle in enumerate(angles):
+        scene.start_angle_current = angle
+        path = scene.sample_path()
+        signatures.append(path_signature(path))
+        if len(path) > 1:
+            end_u[j] = path[-1].u
+    scene.start_u_current, scene.start_angle_current = start_u_current, start_angle_current
+    return end_u, signatures
+
+def cache_key(scene, n_u, n_angles):
+    h = hashlib.sha1()
+    h.update(repr((scene.name, manifolds.double_precision, n_u, n_angles)).encode())
+    hash_geometry(h, scene)
+    return h.hexdigest()
+
+def manifold_atlas(scene, n_u=64, n_angles=256, processes=None, cache=True):
+    # Atlas of `scene`, loaded from the disk cache if it was built before
+    filename = None
+    if cache:
+        filename = os.path.join(ATLAS_CACHE_DIR, "atlas_%s.npz" % cache_key(scene, n_u, n_angles))
+        if os.path.exists(filename):
+            return ManifoldAtlas.load(filename)
+
+    atlas = ManifoldAtlas.build(scene, n_u, n_angles, processes)
+
+    if filename is not None:
+        os.makedirs(ATLAS_CACHE_DIR, exist_ok=True)
+        atlas.save(filename)
+    return atlas
+
+if __name__ == "__main__":
+    import sys
+    from scenes import registry
+
+    if len(sys.argv) < 2:
+        print("Usage: python atlas.py <scene name> [output file]")
+        sys.exit(1)
+    scene = registry.get(sys.argv[1])
+    # Without an output file, the atlas is written to the cache used by the viewer
+    start = time.perf_counter()
+    if len(sys.argv) > 2:
+        atlas = ManifoldAtlas.build(scene)
+        atlas.save(sys.argv[2])
+    else:
+        atlas = manifold_atlas(scene)
+    print("Atlas with %d signatures in %.2f s" % (len(atlas.signatures), time.perf_counter() - start))
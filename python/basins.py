@@ -0,0 +1,193 @@
+import os
+import hashlib
+import numpy as np
+import manifolds
+from misc import *
+from path import *
+from solver import newton_solver
+from caustics import solution_key
+from parallel import parallel_map, scene_state, worker_scene
+from scene_format import hash_geometry
+
+# Convergence basins of the Newton solver: for a grid of seed positions `spec_u` on the
+# first specular shape (and optionally several endpoints `end_u`), record which
+# solution the solver converges to, after how many iterations, or why it failed.
+# Results are cached on disk, keyed by the scene geometry and all solver parameters.
+
+FAILURE_REASONS = ['', 'invalid_seed', 'max_steps', 'singular', 'occluded']
+
+BASIN_CACHE_DIR = os.environ.get('MANIFOLDS_CACHE_DIR', os.path.expanduser('~/.cache/manifold-visualizer'))
+
+class BasinMap:
+    def __init__(self, spec_u, end_u):
+        self.spec_u = spec_u                                        # (N_s,) seed positions
+        self.end_u = end_u                                          # (N_e,) endpoints
+        shape = (len(end_u), len(spec_u))
+        self.solution = np.full(shape, -1, dtype=np.int32)          # Index into `solution_u`, -1 on failure
+        self.iterations = np.zeros(shape, dtype=np.int32)
+        self.failure = np.zeros(shape, dtype=np.uint8)              # Index into FAILURE_REASONS
+        self.solution_u = np.zeros(shape[0:1] + (0,))               # (N_e, N_sol) `u` of the first specular vertex
+
+    def n_solutions(self, row=0):
+        return int(np.max(self.solution[row])) + 1
+
+    def save(self, filename):
+        np.savez_compressed(filename, spec_u=self.spec_u, end_u=self.end_u, solution=self.solution,
+                            iterations=self.iterations, failure=self.failure, solution_u=self.solution_u)
+
+    @staticmethod
+    def load(filename):
+        data = np.load(filename)
+        basins = BasinMap(data['spec_u'], data['end_u'])
+        basins.solution = data['solution']
+        basins.iterations = data['iterations']
+        basins.failure = data['failure']
+        basins.solution_u = data['solution_u']
+        return basins
+
+def basin_row(job):
+    # Newton solves for all seeds towards a single endpoint
+    name, state, end_u, spec_u, options = job
+    scene = worker_scene(name, state)
+    # With a single job this runs on the viewer's own scene, so restore its state
+    end_u_current, spec_u_current = scene.end_u_current, scene.spec_u_current
+    scene.end_u_current = end_u
+    constraint_type = ConstraintType(options['constraint_type'])
+
+    solution = np.full(len(spec_u), -1, dtype=np.int32)
+    iterations = np.zeros(len(spec_u), dtype=np.int32)
+    failure = np.zeros(len(spec_u), dtype=np.uint8)
+    keys, solution_u = {}, []
+    try:
+        for k, u in enumerate(spec_u):
+            scene.spec_u_current = u
+            seed_path = scene.sample_seed_path(options['n_bounces'])
+            if not seed_path.has_specular_segment():
+                failure[k] = FAILURE_REASONS.index('invalid_seed')
+                continue
+            result = newton_solver(scene, seed_path, constraint_type, options['n_bounces'],
+                                   options['max_steps'], options['eps'], options['step_scale'])
+            iterations[k] = result.iterations
+            if not result.success:
+                failure[k] = FAILURE_REASONS.index(result.failure)
+                continue
+            key = solution_key(result.solution_path)
+            if key not in keys:
+                keys[key] = len(solution_u)
+                solution_u.append(result.solution_path[1].u)
+            solution[k] = keys[key]
+    finally:
+        scene.end_u_current, scene.spec_u_current = end_u_current, spec_u_current
+
+    # Number solutions by their position on the specular shape, so that colors are
+    # stable between neighbouring endpoints
+    order = np.argsort(solution_u)
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order))
+    solution[solution >= 0] = rank[solution[solution >= 0]]
+    return solution, iterations, failure, np.sort(solution_u)
+
+def cache_key(scene, spec_u, end_u, options):
+    h = hashlib.sha1()
+    h.update(repr((scene.name, manifolds.double_precision, sorted(options.items()),
+                   scene.start_u_current)).encode())
+    hash_geometry(h, scene)
+    h.update(np.asarray(spec_u, dtype=np.float64).tobytes())
+    h.update(np.asarray(end_u, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def basin_map(scene, n_spec=256, end_u=None, constraint_type=ConstraintType.HalfVector, n_bounces=None,
+              max_steps=20, eps=1e-5, step_scale=1.0, processes=None, cache=True):
+    # Basin map for `n_spec` seeds (cell centers) and the endpoints `end_u` (default:
+    # the current endpoint). Rows are distributed over a process pool.
+    if n_bounces is None:
+        n_bounces = scene.n_bounces_default
+    spec_u = (np.arange(n_spec) + 0.5) / n_spec
+    end_u = np.atleast_1d(scene.end_u_current if end_u is None else end_u).astype(float)
+    options = {
+        'constraint_type': int(constraint_type),
+        'n_bounces': n_bounces,
+        'max_steps': max_steps,
+        'eps': eps,
+        'step_scale': step_scale,
+    }
+
+    filename = None
+    if cache:
+        filename = os.path.join(BASIN_CACHE_DIR, "basins_%s.npz" % cache_key(scene, spec_u, end_u, options))
+        if os.path.exists(filename):
+            return BasinMap.load(filename)
+
+    state = scene_state(scene)
+    jobs = [(scene.name, state, u, spec_u, options) for u in end_u]
+    rows = parallel_map(basin_row, jobs, processes, chunks_per_process=1)
+
+    basins = BasinMap(spec_u, end_u)
+    basins.solution_u = np.full((len(end_u), max(len(row[3]) for row in rows)), np.nan)
+    for k, (solution, iterations, failure, solution_u) in enumerate(rows):
+        basins.solution[k] = solution
+        basins.iterations[k] = iterations
+        basins.failure[k] = failure
+        basins.solution_u[k, :len(solution_u)] = solution_u
+
+    if filename is not None:
+        os.makedirs(BASIN_CACHE_DIR, exist_ok=True)
+        basins.save(filename)
+    return basins
+
+BASIN_COLORS = np.array([
+    [ 31, 119, 180], [255, 127,  14], [ 44, 160,  44], [214,  39,  40], [148, 103, 189],
+    [140,  86,  75], [227, 119, 194], [188, 189,  34], [ 23, 190, 207],
+])
+
+def basin_colors(basins, row=0, max_steps=None):
+    # RGB color per seed: hue from the solution, darker with more iterations, gray on failure
+    solution = basins.solution[row]
+    iterations = basins.iterations[row]
+    if max_steps is None:
+        max_steps = max(1, int(np.max(iterations)))
+    colors = np.full((len(solution), 3), 60.0)
+    ok = solution >= 0
+    shade = 1.0 - 0.7*np.clip(iterations[ok] / max_steps, 0, 1)
+    colors[ok] = BASIN_COLORS[solution[ok] % len(BASIN_COLORS)] * shade[:, None]
+    colors[basins.failure[row] == FAILURE_REASONS.index('invalid_seed')] = 200
+    return colors.astype(int)
+
+def basin_strip(scene, basins, row=0, width=0.04):
+    # Quad corners (inner and outer edge) of the strip along the first specular shape
+    # for all seed cells. Cell edges are halfway between the seed positions.
+    shape = scene.first_specular_shape()
+    edges = np.linspace(0, 1, len(basins.spec_u) + 1)
+    inner = np.zeros((len(edges), 2))
+    outer = np.zeros((len(edges), 2))
+    for k, u in enumerate(edges):
+        it = shape.sample_position(u)
+        inner[k] = it.p
+        outer[k] = it.p + width*it.n
+    return inner, outer, basin_colors(basins, row)
+
+if __name__ == "__main__":
+    import argparse
+    from scenes import registry
+
+    parser = argparse.ArgumentParser(description="Newton convergence basins over the seed domain")
+    parser.add_argument('scene', help="scene name")
+    parser.add_argument('-n', '--seeds', type=int, default=256, help="number of seed positions")
+    parser.add_argument('-e', '--endpoints', type=int, default=0, help="number of endpoints (default: only the scene's endpoint)")
+    parser.add_argument('-j', '--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--no-cache', action='store_true', help="ignore and don't write the disk cache")
+    parser.add_argument('-o', '--output', default=None, help="output file (.npz)")
+    args = parser.parse_args()
+
+    scene = registry.get(args.scene)
+    end_u = (np.arange(args.endpoints) + 0.5) / args.endpoints if args.endpoints > 0 else None
+    basins = basin_map(scene, args.seeds, end_u, processes=args.processes, cache=not args.no_cache)
+    for k, u in enumerate(basins.end_u):
+        counts = np.bincount(basins.failure[k], minlength=len(FAILURE_REASONS))
+        failures = ", ".join("%s: %d" % (FAILURE_REASONS[i], c) for i, c in enumerate(counts) if i > 0 and c > 0)
+        ok = basins.solution[k] >= 0
+        print("end_u=%.3f: %d solutions, %.1f%% converged (avg. %.1f iterations)%s" %
+              (u, basins.n_solutions(k), 100*np.mean(ok),
+               np.mean(basins.iterations[k][ok]) if np.any(ok) else 0, ", " + failures if failures else ""))
+    if args.output:
+        basins.save(args.output)
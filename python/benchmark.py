@@ -0,0 +1,351 @@
+import precision
+import os
+import sys
+import time
+import json
+import argparse
+import tracemalloc
+import subprocess
+import numpy as np
+
+import manifolds
+from misc import *
+from scene import Scene
+from scenes import create_scenes
+from svg_import import load_svg, gear_svg
+from solver import newton_solver
+from manifold_walk import reprojection_walk, predictor_corrector_walk
+from seeding import compare_strategies
+from profiler import profiler
+from manifolds import BezierCurve
+
+# Newton solver convergence and throughput for a sweep of eps thresholds, using
+# random seed paths on every scene.
+def benchmark_newton(n_seeds=100, max_steps=50, eps_values=(1e-3, 1e-5, 1e-6, 1e-7, 1e-8)):
+    results = []
+    rng = np.random.RandomState(0)
+    for scene in create_scenes():
+        seeds = []
+        for k in range(n_seeds):
+            scene.spec_u_current = rng.uniform()
+            seed_path = scene.sample_seed_path(scene.n_bounces_default)
+            if seed_path.has_specular_segment():
+                seeds.append(seed_path)
+        scene.spec_u_current = scene.spec_u_default
+        if len(seeds) == 0:
+            continue
+
+        for eps in eps_values:
+            n_success = 0
+            n_iterations = 0
+            start = time.perf_counter()
+            for seed_path in seeds:
+                result = newton_solver(scene, seed_path, ConstraintType.HalfVector,
+                                       scene.n_bounces_default, max_steps, eps)
+                n_success += result.success
+                n_iterations += result.iterations
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                'scene': scene.name,
+                'eps': eps,
+                'seeds': len(seeds),
+                'success_rate': n_success / len(seeds),
+                'mean_iterations': n_iterations / len(seeds),
+                'solves_per_second': len(seeds) / elapsed,
+            })
+    return results
+
+# Rays from random directions aimed at random points on the given curves
+def aimed_rays(curves, n_rays, rng):
+    targets = []
+    for k in range(n_rays):
+        curve = curves[rng.randint(len(curves))]
+        targets.append(curve.sample_position(rng.uniform()).p)
+    targets = np.array(targets)
+    phi = rng.uniform(0, 2*np.pi, n_rays)
+    dist = rng.uniform(0.05, 1.0, n_rays)
+    d = -np.stack([np.cos(phi), np.sin(phi)], axis=1)
+    o = targets - dist[:, None]*d
+    return o, d
+
+# Double precision reference distance of points `q` (N, 2) to a curve made of cubic
+# splines (control points (4 * #splines, 2)): closest of `n_samples` points per spline,
+# refined with Newton iterations on the squared distance
+def bezier_distance(control_points, q, n_samples=64, n_iterations=5, chunk_size=64):
+    P = np.asarray(control_points, dtype=np.float64).reshape(-1, 4, 2)
+    def bernstein(t):
+        return np.stack([(1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t**2, t**3], axis=-1)
+    t_samples = np.linspace(0, 1, n_samples)
+    samples = np.einsum('tk,skd->std', bernstein(t_samples), P).reshape(-1, 2)
+
+    idx = np.empty(len(q), dtype=int)
+    for k in range(0, len(q), chunk_size):
+        diff = q[k:k + chunk_size, None, :] - samples[None, :, :]
+        idx[k:k + chunk_size] = np.argmin(np.sum(diff*diff, axis=2), axis=1)
+    Q = P[idx // n_samples]
+    t = t_samples[idx % n_samples]
+
+    dQ, ddQ = 3*(Q[:, 1:] - Q[:, :-1]), 6*(Q[:, 2:] - 2*Q[:, 1:-1] + Q[:, :-2])
+    def evaluate(t):
+        return (np.einsum('nk,nkd->nd', bernstein(t), Q),
+                np.einsum('nk,nkd->nd', np.stack([(1-t)**2, 2*(1-t)*t, t**2], axis=-1), dQ),
+                np.einsum('nk,nkd->nd', np.stack([1-t, t], axis=-1), ddQ))
+    for i in range(n_iterations):
+        c, dc, ddc = evaluate(t)
+        df = np.sum((c - q)*dc, axis=1)
+        d2f = np.sum(dc*dc, axis=1) + np.sum((c - q)*ddc, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip(t - np.where(d2f > 0, df / d2f, 0), 0, 1)
+    return np.linalg.norm(evaluate(t)[0] - q, axis=1)
+
+# Polyline vs. exact ray intersection with Bezier curves. Rays are aimed at random
+# points on each curve, so every one of them should hit geometry.
+def benchmark_bezier(n_rays=20000, n_repeat=5):
+    results = []
+    rng = np.random.RandomState(0)
+    for scene in create_scenes():
+        curves = [s for s in scene.shapes if isinstance(s, BezierCurve)]
+        if len(curves) == 0:
+            continue
+
+        o, d = aimed_rays(curves, n_rays, rng)
+
+        for exact in [False, True]:
+            scene.set_exact_bezier_intersection(exact)
+            start = time.perf_counter()
+            for r in range(n_repeat):
+                batch = scene.ray_intersect_batch(o, d)
+            elapsed = time.perf_counter() - start
+
+            valid = batch.is_valid()
+            # Distance of the hit point along the ray to the true curve (double precision
+            # reference), for all hits on Bezier curves
+            error = []
+            for curve in curves:
+                rows = valid & (batch.shape_id == curve.id)
+                q = o[rows] + batch.rayt[rows, None]*d[rows]
+                error.append(bezier_distance(curve.control_points, q))
+            error = np.concatenate(error)
+            results.append({
+                'scene': scene.name,
+                'method': 'exact' if exact else 'polyline',
+                'hit_rate': np.mean(valid),
+                'mean_error': float(np.mean(error)) if len(error) > 0 else 0.0,
+                'max_error': float(np.max(error)) if len(error) > 0 else 0.0,
+                'rays_per_second': n_repeat*n_rays / elapsed,
+            })
+        scene.set_exact_bezier_intersection(False)
+    return results
+
+def print_bezier(results, label):
+    print("%-28s %9s %9s %10s %10s %12s" % ("bezier (%s)" % label, "method", "hit rate", "mean err", "max err", "rays/s"))
+    for r in results:
+        print("%-28s %9s %8.2f%% %10.2e %10.2e %12.0f" % (r['scene'][:28], r['method'], 100*r['hit_rate'],
+                                                           r['mean_error'], r['max_error'], r['rays_per_second']))
+
+# Import time, Python side peak memory and ray throughput for SVG outlines of
+# increasing complexity
+def benchmark_svg(segment_counts=(1000, 10000, 50000), n_rays=20000, n_repeat=5):
+    results = []
+    rng = np.random.RandomState(0)
+    for n_segments in segment_counts:
+        svg = gear_svg(n_segments)
+        tracemalloc.start()
+        start = time.perf_counter()
+        shapes = load_svg(svg)
+        load_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        scene = Scene(shapes)
+        o, d = aimed_rays(shapes, n_rays, rng)
+        start = time.perf_counter()
+        for r in range(n_repeat):
+            batch = scene.ray_intersect_batch(o, d)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'segments': n_segments,
+            'load_time': load_time,
+            'peak_memory': peak_memory,
+            'hit_rate': float(np.mean(batch.is_valid())),
+            'rays_per_second': n_repeat*n_rays / elapsed,
+        })
+    return results
+
+def print_svg(results, label):
+    print("%-12s %10s %12s %9s %12s" % ("svg (%s)" % label, "load [s]", "peak [MiB]", "hit rate", "rays/s"))
+    for r in results:
+        print("%-12d %10.3f %12.2f %8.2f%% %12.0f" % (r['segments'], r['load_time'], r['peak_memory'] / 2**20,
+                                                       100*r['hit_rate'], r['rays_per_second']))
+
+# Reprojection vs. predictor-corrector manifold walks from the default path of each
+# scene towards random endpoint targets
+def benchmark_walk(n_targets=50, max_u_offset=0.15, max_steps=50, eps=1e-4):
+    methods = [('reprojection', reprojection_walk), ('predictor-corrector', predictor_corrector_walk)]
+    results = []
+    rng = np.random.RandomState(0)
+    for scene in create_scenes():
+        scene.set_start(scene.start_u_default, scene.start_angle_default, scene.end_u_default, scene.spec_u_default)
+        path = scene.sample_path()
+        if not path.has_specular_segment():
+            continue
+        end = path[-1]
+        u = np.clip(end.u + rng.uniform(-max_u_offset, max_u_offset, n_targets), 0, 1)
+        targets = [end.shape.sample_position(ui).p for ui in u]
+
+        for name, walk in methods:
+            n_success = n_steps = n_traces = 0
+            distance = 0.0
+            start = time.perf_counter()
+            for target in targets:
+                walked_path, stats = walk(scene, path, target, ConstraintType.HalfVector, max_steps, eps)
+                n_success += stats.success
+                n_steps += stats.steps
+                n_traces += stats.traces
+                distance += stats.distance
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                'scene': scene.name,
+                'method': name,
+                'success_rate': n_success / n_targets,
+                'mean_steps': n_steps / n_targets,
+                'mean_traces': n_traces / n_targets,
+                'steps_per_distance': n_steps / distance if distance > 0 else float('inf'),
+                'seconds_per_distance': elapsed / distance if distance > 0 else float('inf'),
+            })
+    return results
+
+def print_walk(results, label):
+    print("%-28s %20s %8s %8s %8s %10s %10s" % ("walk (%s)" % label, "method", "success", "steps", "traces",
+                                                 "steps/dist", "s/dist"))
+    for r in results:
+        print("%-28s %20s %7.1f%% %8.2f %8.2f %10.1f %10.4f" % (r['scene'][:28], r['method'], 100*r['success_rate'],
+                                                                 r['mean_steps'], r['mean_traces'],
+                                                                 r['steps_per_distance'], r['seconds_per_distance']))
+
+# Seed path generation, one path at a time vs. batched
+def benchmark_seeds(n_seeds=20000):
+    results = []
+    rng = np.random.RandomState(0)
+    for scene in create_scenes():
+        scene.set_start(scene.start_u_default, scene.start_angle_default, scene.end_u_default, scene.spec_u_default)
+        n_bounces = scene.n_bounces_default
+        spec_u = rng.uniform(size=n_seeds)
+
+        start = time.perf_counter()
+        n_valid = 0
+        for u in spec_u:
+            scene.spec_u_current = u
+            n_valid += scene.sample_seed_path(n_bounces).has_specular_segment()
+        scalar_time = time.perf_counter() - start
+        scene.spec_u_current = scene.spec_u_default
+
+        start = time.perf_counter()
+        batch = scene.sample_seed_path_batch(spec_u, n_bounces)
+        batch_time = time.perf_counter() - start
+
+        results.append({
+            'scene': scene.name,
+            'valid_rate': n_valid / n_seeds,
+            'batch_valid_rate': np.mean(batch.valid),
+            'seeds_per_second': n_seeds / scalar_time,
+            'batch_seeds_per_second': n_seeds / batch_time,
+        })
+    return results
+
+def print_seeds(results, label):
+    print("%-28s %9s %9s %12s %12s" % ("seeds (%s)" % label, "valid", "batched", "seeds/s", "batched/s"))
+    for r in results:
+        print("%-28s %8.1f%% %8.1f%% %12.0f %12.0f" % (r['scene'][:28], 100*r['valid_rate'], 100*r['batch_valid_rate'],
+                                                      r['seeds_per_second'], r['batch_seeds_per_second']))
+
+# Seeding strategies for SMS, for all scenes with specular shapes
+def benchmark_seeding(n_seeds=200):
+    results = []
+    for scene in create_scenes():
+        scene.set_start(scene.start_u_default, scene.start_angle_default, scene.end_u_default, scene.spec_u_default)
+        for strategy, stats in compare_strategies(scene, n_seeds).items():
+            if stats.n_seeds == 0:
+                continue
+            results.append({
+                'scene': scene.name,
+                'strategy': strategy,
+                'convergence_rate': stats.n_converged / stats.n_seeds,
+                'solutions': len(stats.solutions),
+                'converged_per_second': stats.converged_per_second(),
+            })
+    return results
+
+def print_seeding(results, label):
+    print("%-28s %12s %9s %9s %12s" % ("seeding (%s)" % label, "strategy", "success", "solutions", "paths/s"))
+    for r in results:
+        print("%-28s %12s %8.1f%% %9d %12.1f" % (r['scene'][:28], r['strategy'], 100*r['convergence_rate'],
+                                                 r['solutions'], r['converged_per_second']))
+
+def print_newton(results, label):
+    print("%-36s %8s %8s %10s %10s" % ("newton (%s)" % label, "eps", "success", "iterations", "solves/s"))
+    for r in results:
+        print("%-36s %8.0e %7.1f%% %10.2f %10.1f" % (r['scene'][:36], r['eps'], 100*r['success_rate'],
+                                                     r['mean_iterations'], r['solves_per_second']))
+
+# name -> (benchmark function, report function)
+sections = {
+    'newton': (benchmark_newton, print_newton),
+    'bezier': (benchmark_bezier, print_bezier),
+    'svg': (benchmark_svg, print_svg),
+    'walk': (benchmark_walk, print_walk),
+    'seeding': (benchmark_seeding, print_seeding),
+    'seeds': (benchmark_seeds, print_seeds),
+}
+
+def run_sections(names):
+    results = {}
+    for name in names:
+        with profiler.scope(name, 'benchmark'):
+            results[name] = sections[name][0]()
+    return results
+
+def run_sections_subprocess(names, double):
+    # The C++ module is selected at import time, so each precision needs its own process
+    env = dict(os.environ, MANIFOLDS_DOUBLE='1' if double else '0')
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--json'] + names,
+                            env=env, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(output)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manifold visualizer benchmarks")
+    parser.add_argument('sections', nargs='*', help="subset of: %s" % ", ".join(sections.keys()))
+    parser.add_argument('--double', action='store_true', help="use the double precision library")
+    parser.add_argument('--compare-precision', action='store_true', help="run with both float and double precision")
+    parser.add_argument('--json', action='store_true', help="print raw results as JSON")
+    parser.add_argument('--profile', default=None, help="write a Chrome trace of the run to this file")
+    args = parser.parse_args()
+    args.sections = args.sections or list(sections.keys())
+    for name in args.sections:
+        if name not in sections:
+            parser.error("unknown section '%s'" % name)
+
+    if args.profile and args.compare_precision:
+        parser.error("--profile can't be combined with --compare-precision")
+
+    if args.compare_precision:
+        runs = [('float', run_sections_subprocess(args.sections, False)),
+                ('double', run_sections_subprocess(args.sections, True))]
+    else:
+        if args.profile:
+            profiler.enable()
+        runs = [('double' if manifolds.double_precision else 'float', run_sections(args.sections))]
+        if args.profile:
+            profiler.disable()
+            profiler.save(args.profile)
+
+    if args.json:
+        print(json.dumps(runs[0][1] if len(runs) == 1 else dict(runs)))
+    else:
+        for name in args.sections:
+            for label, results in runs:
+                sections[name][1](results[name], label)
+            print()
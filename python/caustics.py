@@ -0,0 +1,146 @@
+import time
+import numpy as np
+from misc import *
+from path import *
+from solver import newton_solver
+from parallel import parallel_map, scene_state, worker_scene
+
+# Caustic irradiance along the end (receiver) shape. For a grid of receiver positions
+# all specular connections to the start position are found with SMS (random seeds on
+# the first specular shape) or MNEE (single straight-line seed), and each distinct
+# solution contributes its generalized geometry term:
+#
+#   E(u_k) = sum_paths  I(theta_0) * |d theta_0 / d u_1| * |d u_1 / d u_k| / |dp_k / d u_k|
+#
+# i.e. the flux per unit receiver length carried by that path. `d u_1 / d u_k` is the
+# manifold tangent of the first specular vertex (`dC_duk` after
+# `Path.compute_tangent_derivatives`), the start vertex is held fixed. The start
+# position acts as a point light with unit power and Lambertian emission,
+# I(theta_0) = cos(theta_0) / 2. Specular interactions are assumed to be lossless.
+
+class CausticProfile:
+    def __init__(self, u):
+        self.u = u                                       # Receiver (end shape) parameters
+        self.irradiance = np.zeros(len(u))
+        self.n_solutions = np.zeros(len(u), dtype=int)  # Distinct solutions found per cell
+        self.time = 0.0
+
+def geometry_terms(paths, constraint_type):
+    # Generalized geometry term of each converged path, vectorized over the paths
+    G = np.zeros(len(paths))
+    valid = []
+    for k, path in enumerate(paths):
+        path.compute_tangent_derivatives(constraint_type)
+        if not path.singular:
+            valid.append(k)
+    if len(valid) == 0:
+        return G
+
+    paths = [paths[k] for k in valid]
+    p0    = np.array([path[0].p for path in paths])
+    n0    = np.array([path[0].n for path in paths])
+    p1    = np.array([path[1].p for path in paths])
+    dp1   = np.array([path[1].dp_du for path in paths])
+    du1   = np.array([path[1].dC_duk for path in paths])
+    dpk   = np.array([path[-1].dp_du for path in paths])
+
+    d = p1 - p0
+    r = norm(d)
+    w = d / col(r)
+    cos_theta0 = np.maximum(0, dot(w, n0))
+    dtheta_du1 = np.abs(cross(w, dp1)) / r
+    G[valid] = 0.5*cos_theta0 * dtheta_du1 * np.abs(du1) / norm(dpk)
+    return G
+
+def solution_key(path):
+    return tuple((vtx.shape.id, round(float(vtx.u), 5)) for vtx in path[1:-1])
+
+def find_solutions(scene, end_u, strategy_type, constraint_type, n_seeds=16, n_bounces=1,
+                   max_steps=20, eps=1e-5, rng=np.random):
+    # Distinct specular connections between the start position and `end_u`
+    end_u_current, spec_u_current = scene.end_u_current, scene.spec_u_current
+    scene.end_u_current = end_u
+
+    seed_paths = []
+    if strategy_type == StrategyType.MNEE:
+        seed_paths.append(scene.sample_mnee_seed_path())
+    else:
+        for k in range(n_seeds):
+            scene.spec_u_current = rng.uniform()
+            seed_paths.append(scene.sample_seed_path(n_bounces))
+
+    solutions = {}
+    for seed_path in seed_paths:
+        if not seed_path.has_specular_segment():
+            continue
+        result = newton_solver(scene, seed_path, constraint_type, n_bounces, max_steps, eps)
+        if result.success:
+            solutions.setdefault(solution_key(result.solution_path), result.solution_path)
+
+    scene.end_u_current, scene.spec_u_current = end_u_current, spec_u_current
+    return list(solutions.values())
+
+def caustic_cell(job):
+    name, state, end_u, options, seed = job
+    scene = worker_scene(name, state)
+    strategy_type = StrategyType(options['strategy_type'])
+    constraint_type = ConstraintType(options['constraint_type'])
+    solutions = find_solutions(scene, end_u, strategy_type, constraint_type, options['n_seeds'],
+                               options['n_bounces'], options['max_steps'], options['eps'],
+                               np.random.RandomState(seed))
+    return np.sum(geometry_terms(solutions, constraint_type)), len(solutions)
+
+def caustic_profile(scene, n_cells=128, strategy_type=StrategyType.SMS, constraint_type=ConstraintType.HalfVector,
+                    n_seeds=16, n_bounces=None, max_steps=20, eps=1e-5, processes=None, seed=0):
+    # Irradiance profile over `n_cells` receiver positions (cell centers), from the
+    # scene's current start position. Cells are distributed over a process pool.
+    if n_bounces is None:
+        n_bounces = scene.n_bounces_default
+    u = (np.arange(n_cells) + 0.5) / n_cells
+    profile = CausticProfile(u)
+
+    options = {
+        'strategy_type': int(strategy_type),
+        'constraint_type': int(constraint_type),
+        'n_seeds': n_seeds,
+        'n_bounces': n_bounces,
+        'max_steps': max_steps,
+        'eps': eps,
+    }
+    state = scene_state(scene)
+    jobs = [(scene.name, state, u[k], options, seed + k) for k in range(n_cells)]
+
+    start = time.perf_counter()
+    for k, (E, n) in enumerate(parallel_map(caustic_cell, jobs, processes)):
+        profile.irradiance[k] = E
+        profile.n_solutions[k] = n
+    profile.time = time.perf_counter() - start
+    return profile
+
+def profile_curve(scene, profile, height=0.3):
+    # Receiver positions and the profile plotted on top of them along the normal,
+    # scaled so that the maximum irradiance is drawn at `height`
+    base = np.zeros((len(profile.u), 2))
+    tips = np.zeros((len(profile.u), 2))
+    E_max = np.max(profile.irradiance)
+    scale = height / E_max if E_max > 0 else 0.0
+    for k, u in enumerate(profile.u):
+        it = scene.sample_end_position(u)
+        base[k] = it.p
+        tips[k] = it.p + scale*profile.irradiance[k]*it.n
+    return base, tips
+
+if __name__ == "__main__":
+    import sys
+    from scenes import registry
+
+    if len(sys.argv) < 2:
+        print("Usage: python caustics.py <scene name> [n_cells] [output file (.npz)]")
+        sys.exit(1)
+    scene = registry.get(sys.argv[1])
+    n_cells = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    profile = caustic_profile(scene, n_cells)
+    print("%d cells, %d solutions in %.2f s, peak irradiance %.4f" %
+          (n_cells, np.sum(profile.n_solutions), profile.time, np.max(profile.irradiance)))
+    if len(sys.argv) > 3:
+        np.savez(sys.argv[3], u=profile.u, irradiance=profile.irradiance, n_solutions=profile.n_solutions)
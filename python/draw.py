@@ -1,7 +1,10 @@
 import numpy as np
 from nanogui import nanovg as nvg
 from misc import *
+from manifolds import splat_segments, nvgCurrentTransform, nvgCreateImageRGBA, \
+                      nvgUpdateImage, nvgDeleteImage, nvgDrawImage
 import copy
+import manifolds
 
 def draw_coord_system(ctx):
     ctx.StrokeColor(nvg.RGB(0, 0, 0))
@@ -31,7 +34,7 @@ def draw_coord_system(ctx):
     ctx.LineTo(0.0, +1000.0)
     ctx.Stroke()
 
-def draw_path_lines(ctx, path, modifier='', scale=1):
+def path_line_style(ctx, modifier='', scale=1):
     if modifier == 'tangent' or modifier == 'seed':
         ctx.StrokeColor(nvg.RGB(255, 0, 0))
         ctx.StrokeWidth(0.004*scale)
@@ -41,35 +44,54 @@ def draw_path_lines(ctx, path, modifier='', scale=1):
     elif modifier == '':
         ctx.StrokeColor(nvg.RGB(80, 80, 80))
         ctx.StrokeWidth(0.008*scale)
-    for i in range(len(path) - 1):
-        v0 = path[i].p
-        v1 = path[i+1].p
 
-        ctx.BeginPath()
-        ctx.MoveTo(v0[0], v0[1])
-        ctx.LineTo(v1[0], v1[1])
-        ctx.Stroke()
+def add_path_segments(ctx, paths):
+    # Add the segments of all paths as subpaths of the current nanovg path
+    for path in paths:
+        if len(path) < 2:
+            continue
+        p = path[0].p
+        ctx.MoveTo(p[0], p[1])
+        for i in range(1, len(path)):
+            p = path[i].p
+            ctx.LineTo(p[0], p[1])
+
+# The *_batch variants below draw any number of paths with a single stroke / fill
+# call, which keeps large result sets (e.g. SMS solutions) interactive.
+
+def draw_path_lines_batch(ctx, paths, modifier='', scale=1):
+    path_line_style(ctx, modifier, scale)
+    ctx.BeginPath()
+    add_path_segments(ctx, paths)
+    ctx.Stroke()
 
-def draw_intermediate_path_lines(ctx, path, color, scale=1):
+def draw_path_lines(ctx, path, modifier='', scale=1):
+    draw_path_lines_batch(ctx, [path], modifier, scale)
+
+def draw_intermediate_path_lines_batch(ctx, paths, color, scale=1):
     ctx.StrokeColor(color)
     ctx.StrokeWidth(0.004*scale)
-    for i in range(len(path) - 1):
-        v0 = path[i].p
-        v1 = path[i+1].p
+    ctx.BeginPath()
+    add_path_segments(ctx, paths)
+    ctx.Stroke()
 
-        ctx.BeginPath()
-        ctx.MoveTo(v0[0], v0[1])
-        ctx.LineTo(v1[0], v1[1])
-        ctx.Stroke()
+def draw_intermediate_path_lines(ctx, path, color, scale=1):
+    draw_intermediate_path_lines_batch(ctx, [path], color, scale)
+
+def draw_dotted_path_lines_batch(ctx, paths, scale=1.0, spacing=0.05):
+    ctx.Save()
+    ctx.FillColor(nvg.RGB(80, 80, 80))
+    ctx.BeginPath()
+    for path in paths:
+        for i in range(len(path) - 1):
+            add_dotted_line(ctx, path[i].p, path[i+1].p, scale, spacing)
+    ctx.Fill()
+    ctx.Restore()
 
 def draw_dotted_path_lines(ctx, path, scale=1.0, spacing=0.05):
-    color = nvg.RGB(80, 80, 80)
-    for i in range(len(path) - 1):
-        v0 = path[i].p
-        v1 = path[i+1].p
-        draw_dotted_line(ctx, v0, v1, color, scale=scale, spacing=spacing)
+    draw_dotted_path_lines_batch(ctx, [path], scale, spacing)
 
-def draw_path_vertices(ctx, path, modifier='', scale=1):
+def draw_path_vertices_batch(ctx, paths, modifier='', scale=1):
     if modifier == 'seed':
         ctx.FillColor(nvg.RGB(255, 0, 0))
     elif modifier == 'manifold':
@@ -79,13 +101,17 @@ def draw_path_vertices(ctx, path, modifier='', scale=1):
 
     ctx.StrokeColor(nvg.RGB(255, 255, 255))
     ctx.StrokeWidth(0.005*scale)
-    for i in range(0, len(path)):
-        vtx = path[i]
-        ctx.BeginPath()
-        ctx.Circle(vtx.p[0], vtx.p[1], 0.015*scale)
-        ctx.Fill()
-        if modifier != 'seed':
-            ctx.Stroke()
+    ctx.BeginPath()
+    for path in paths:
+        for i in range(0, len(path)):
+            p = path[i].p
+            ctx.Circle(p[0], p[1], 0.015*scale)
+    ctx.Fill()
+    if modifier != 'seed':
+        ctx.Stroke()
+
+def draw_path_vertices(ctx, path, modifier='', scale=1):
+    draw_path_vertices_batch(ctx, [path], modifier, scale)
 
 def draw_points(ctx, positions, color, scale=1):
     ctx.Save()
@@ -109,6 +135,58 @@ def draw_vertices(ctx, positions, color, scale=1):
         ctx.Stroke()
     ctx.Restore()
 
+def draw_profile(ctx, base, tips, color, scale=1):
+    # Filled plot between a curve (`base`) and the plotted values (`tips`)
+    ctx.Save()
+    ctx.BeginPath()
+    ctx.MoveTo(base[0][0], base[0][1])
+    for p in tips:
+        ctx.LineTo(p[0], p[1])
+    for p in base[::-1]:
+        ctx.LineTo(p[0], p[1])
+    ctx.ClosePath()
+    ctx.FillColor(nvg.RGBA(color[0], color[1], color[2], 80))
+    ctx.Fill()
+
+    ctx.BeginPath()
+    ctx.MoveTo(tips[0][0], tips[0][1])
+    for p in tips[1:]:
+        ctx.LineTo(p[0], p[1])
+    ctx.StrokeColor(nvg.RGB(*color))
+    ctx.StrokeWidth(0.006*scale)
+    ctx.Stroke()
+    ctx.Restore()
+
+def draw_strip(ctx, inner, outer, colors):
+    # Band of quads between two polylines, one color per quad
+    ctx.Save()
+    for k in range(len(colors)):
+        ctx.BeginPath()
+        ctx.MoveTo(inner[k][0], inner[k][1])
+        ctx.LineTo(inner[k+1][0], inner[k+1][1])
+        ctx.LineTo(outer[k+1][0], outer[k+1][1])
+        ctx.LineTo(outer[k][0], outer[k][1])
+        ctx.ClosePath()
+        ctx.FillColor(nvg.RGB(int(colors[k][0]), int(colors[k][1]), int(colors[k][2])))
+        ctx.Fill()
+    ctx.Restore()
+
+def draw_text_box(ctx, x, y, lines, font_size=15, padding=6):
+    # Lines of monospaced text on a translucent box, in screen coordinates
+    width = 0.6*font_size*max(len(line) for line in lines) + 2*padding
+    height = font_size*len(lines) + 2*padding
+    ctx.Save()
+    ctx.BeginPath()
+    ctx.RoundedRect(x, y, width, height, 4)
+    ctx.FillColor(nvg.RGBA(0, 0, 0, 160))
+    ctx.Fill()
+    ctx.FontFace("mono")
+    ctx.FontSize(font_size)
+    ctx.FillColor(nvg.RGB(255, 255, 255))
+    for k, line in enumerate(lines):
+        ctx.Text(x + padding, y + padding + (k + 0.8)*font_size, line)
+    ctx.Restore()
+
 def draw_line(ctx, a, b, color, scale=1.0, endcap_a=False, endcap_b=False):
     ctx.Save()
     ctx.StrokeWidth(0.01*scale)
@@ -141,22 +219,22 @@ def draw_line(ctx, a, b, color, scale=1.0, endcap_a=False, endcap_b=False):
 
     ctx.Restore()
 
+def add_dotted_line(ctx, a, b, scale=1.0, spacing=0.05):
+    v = b - a
+    dist = norm(v)
+    if dist == 0:
+        return
+    v = v / dist
+    # Dots at (k + 0.5)*spacing along the line
+    for k in range(int(dist / spacing + 0.5)):
+        c = a + (k+0.5)*spacing*v
+        ctx.Circle(c[0], c[1], 0.005*scale)
+
 def draw_dotted_line(ctx, a, b, color, scale=1.0, spacing=0.05):
     ctx.Save()
     ctx.FillColor(color)
-
     ctx.BeginPath()
-    v = b - a
-    dist = norm(v)
-    v /= dist
-    k = 0
-    while True:
-        offset = (k+0.5)*spacing*v
-        if norm(offset) > dist:
-            break
-        c = a + offset
-        ctx.Circle(c[0], c[1], 0.005*scale)
-        k += 1
+    add_dotted_line(ctx, a, b, scale, spacing)
     ctx.Fill()
     ctx.Restore()
 
@@ -259,3 +337,107 @@ def draw_path_origin(ctx, path, last_picked_vtx_idx):
     ctx.LineTo(p3[0], p3[1])
     ctx.LineTo(p4[0], p4[1])
     ctx.Fill()
+
+def path_segments(paths):
+    # End points of all segments in a list of paths, as two (N, 2) arrays
+    a, b = [], []
+    for path in paths:
+        for i in range(len(path) - 1):
+            a.append(path[i].p)
+            b.append(path[i+1].p)
+    if len(a) == 0:
+        return np.zeros((0, 2)), np.zeros((0, 2))
+    return np.array(a), np.array(b)
+
+class PathDensityLayer:
+    # Level of detail replacement for very large path sets. All segments are splatted
+    # into a screen space density image that is uploaded once and then drawn as a
+    # textured rectangle until either the paths or the view transform change.
+    def __init__(self, color=(80, 80, 80), threshold=2000):
+        self.color = color
+        self.threshold = threshold
+        self.image = None
+        self.image_size = None
+        self.key = None
+
+    def active(self, paths):
+        return len(paths) > self.threshold
+
+    def draw(self, ctx, paths, version, size):
+        # `version` needs to change whenever `paths` is modified
+        transform = nvgCurrentTransform(ctx)
+        width, height = int(size[0]), int(size[1])
+        key = (version, transform, width, height)
+        if key != self.key:
+            self.update(ctx, paths, transform, width, height)
+            self.key = key
+
+        ctx.Save()
+        ctx.ResetTransform()
+        nvgDrawImage(ctx, self.image, 0, 0, width, height)
+        ctx.Restore()
+
+    def update(self, ctx, paths, transform, width, height):
+        a, b = path_segments(paths)
+        M = np.array([[transform[0], transform[2]],
+                      [transform[1], transform[3]]])
+        t = np.array([transform[4], transform[5]])
+        density = splat_segments(a @ M.T + t, b @ M.T + t, width, height)
+
+        # Logarithmic tone mapping, the densest pixel is fully opaque
+        alpha = np.log1p(density) / np.log1p(max(density.max(), 1.0))
+        rgba = np.empty((height, width, 4), dtype=np.uint8)
+        rgba[:, :, :3] = self.color
+        rgba[:, :, 3] = (255*alpha).astype(np.uint8)
+
+        if self.image is not None and self.image_size == (width, height):
+            nvgUpdateImage(ctx, self.image, rgba)
+        else:
+            if self.image is not None:
+                nvgDeleteImage(ctx, self.image)
+            self.image = nvgCreateImageRGBA(ctx, rgba)
+            self.image_size = (width, height)
+
+class SceneLayer:
+    # Retained drawing of the static scene geometry. The shapes are rendered into an
+    # offscreen framebuffer and then drawn as a single textured rectangle until the
+    # scene, the view transform or the window size change, so unchanged geometry is
+    # not tessellated again every frame. Only available with nanogui's OpenGL backend.
+    def __init__(self):
+        self.framebuffer = None
+        self.key = None
+
+    @staticmethod
+    def supported():
+        return hasattr(manifolds, 'Framebuffer')
+
+    def update(self, ctx, scene, apply_view, size, pixel_ratio):
+        # Needs to run before anything else is drawn in the current nanovg frame.
+        # `apply_view(ctx)` sets up the view transform.
+        ctx.Save()
+        apply_view(ctx)
+        transform = nvgCurrentTransform(ctx)
+        ctx.Restore()
+        width, height = int(size[0]), int(size[1])
+        key = (id(scene), transform, width, height, pixel_ratio)
+        if key == self.key:
+            return
+
+        fb = self.framebuffer
+        if fb is None or (fb.width, fb.height, fb.pixel_ratio) != (width, height, pixel_ratio):
+            self.framebuffer = None
+            self.framebuffer = manifolds.Framebuffer(ctx, width, height, pixel_ratio)
+        self.framebuffer.begin()
+        apply_view(ctx)
+        scene.draw_shapes(ctx)
+        self.framebuffer.end()
+        self.key = key
+
+    def valid(self, scene):
+        return self.key is not None and self.key[0] == id(scene)
+
+    def draw(self, ctx):
+        ctx.Save()
+        ctx.ResetTransform()
+        nvgDrawImage(ctx, self.framebuffer.image, 0, 0, self.framebuffer.width, self.framebuffer.height)
+        ctx.Restore()
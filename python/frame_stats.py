@@ -0,0 +1,72 @@
+import time
+import numpy as np
+from collections import deque
+
+# Performance counters for the viewer's HUD. The counters are plain increments at the
+# call sites (ray queries, Newton iterations, cache lookups) and are reset by the
+# viewer at the start of every frame; `FrameStats` keeps a rolling window of the
+# frame timings and counters.
+
+class FrameCounters:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.rays = 0
+        self.newton_iterations = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def cache_lookup(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+counters = FrameCounters()
+
+class FrameStats:
+    def __init__(self, n_frames=60):
+        self.frame_times  = deque(maxlen=n_frames)   # Time between frame starts
+        self.update_times = deque(maxlen=n_frames)
+        self.draw_times   = deque(maxlen=n_frames)
+        self.cache_hits   = deque(maxlen=n_frames)
+        self.cache_misses = deque(maxlen=n_frames)
+        self.rays = 0                                 # Counters of the last frame
+        self.newton_iterations = 0
+        self.last_start = None
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self.last_start is not None:
+            self.frame_times.append(now - self.last_start)
+        self.last_start = now
+        counters.reset()
+
+    def end_frame(self, update_time, draw_time):
+        self.update_times.append(update_time)
+        self.draw_times.append(draw_time)
+        self.cache_hits.append(counters.cache_hits)
+        self.cache_misses.append(counters.cache_misses)
+        self.rays = counters.rays
+        self.newton_iterations = counters.newton_iterations
+
+    def mean(self, values):
+        return np.mean(values) if len(values) > 0 else 0.0
+
+    def cache_hit_rate(self):
+        # Over the whole window, None if nothing was looked up
+        hits, misses = sum(self.cache_hits), sum(self.cache_misses)
+        return hits / (hits + misses) if hits + misses > 0 else None
+
+    def hud_lines(self):
+        frame_time = self.mean(self.frame_times)
+        hit_rate = self.cache_hit_rate()
+        return [
+            "frame   %6.1f ms  (%5.1f fps)" % (1e3*frame_time, 1.0 / frame_time if frame_time > 0 else 0.0),
+            "update  %6.1f ms" % (1e3*self.mean(self.update_times)),
+            "draw    %6.1f ms" % (1e3*self.mean(self.draw_times)),
+            "rays    %6d" % self.rays,
+            "newton  %6d it" % self.newton_iterations,
+            "cache   %s" % ("   -" if hit_rate is None else "%5.1f%% hits" % (100*hit_rate)),
+        ]
@@ -0,0 +1,180 @@
+import time
+import numpy as np
+from misc import *
+from path import *
+from parallel import parallel_map, scene_state, worker_scene
+
+# Brute-force reference for caustic estimates: rays are emitted from the start shape,
+# followed through reflections and refractions with batched ray queries (and the array
+# versions of `reflect` / `refract`), and hits on the end shape are binned into a
+# histogram over its parameter `u`. The result is the irradiance per unit receiver
+# length, with the same normalization as caustics.py (unit power, Lambertian emission,
+# lossless specular interactions).
+
+class ShapeTable:
+    # Positions, normals and |dp/du| of a shape on a regular grid over `u`, so that
+    # positions can be sampled for many parameters at once by linear interpolation
+    def __init__(self, shape, resolution=4096):
+        self.u = np.linspace(0, 1, resolution)
+        its = [shape.sample_position(u) for u in self.u]
+        self.p = np.array([it.p for it in its])
+        self.n = np.array([it.n for it in its])
+        self.dp_du = np.array([norm(it.dp_du) for it in its])
+        # Arc length up to each grid point
+        seg = norm(np.diff(self.p, axis=0))
+        self.length = np.concatenate([[0], np.cumsum(seg)])
+
+    def sample(self, u):
+        x = u * (len(self.u) - 1)
+        i = np.clip(x.astype(int), 0, len(self.u) - 2)
+        t = (x - i)[:, None]
+        p = (1 - t)*self.p[i] + t*self.p[i + 1]
+        n = (1 - t)*self.n[i] + t*self.n[i + 1]
+        n = normalize(n)
+        dp_du = (1 - t[:, 0])*self.dp_du[i] + t[:, 0]*self.dp_du[i + 1]
+        return p, n, dp_du
+
+    def bin_lengths(self, n_bins):
+        edges = np.interp(np.linspace(0, 1, n_bins + 1), self.u, self.length)
+        return np.diff(edges)
+
+class LightTracerResult:
+    def __init__(self, n_bins):
+        self.u = (np.arange(n_bins) + 0.5) / n_bins   # Bin centers on the end shape
+        self.flux = np.zeros(n_bins)                   # Flux arriving in each bin
+        self.irradiance = np.zeros(n_bins)             # Flux per unit length
+        self.n_rays = 0
+        self.time = 0.0
+
+def trace_rays(scene, n_rays, rng, start_u=None, n_bounces=None, n_bins=128, max_depth=16, emitter=None):
+    # Flux histogram over the end shape for `n_rays` light paths. With `start_u`, light
+    # is emitted from that single position, otherwise uniformly over the start shape.
+    # Only paths with `n_bounces` specular interactions (any number >= 1 if None) count.
+    if start_u is not None:
+        it = scene.sample_start_position(start_u)
+        o = np.tile(it.p, (n_rays, 1))
+        n = np.tile(it.n, (n_rays, 1))
+        weight = np.full(n_rays, 1.0 / n_rays)
+    else:
+        if emitter is None:
+            emitter = ShapeTable(scene.start_shape())
+        o, n, dp_du = emitter.sample(rng.uniform(size=n_rays))
+        weight = dp_du / (emitter.length[-1] * n_rays)
+
+    # Lambertian emission: sin(theta) is uniformly distributed in [-1, 1]
+    sin_theta = rng.uniform(-1, 1, size=n_rays)
+    cos_theta = np.sqrt(1 - sin_theta**2)
+    t = np.stack([n[:, 1], -n[:, 0]], axis=1)
+    d = cos_theta[:, None]*n + sin_theta[:, None]*t
+
+    shape_type = np.array([int(shape.type) for shape in scene.shapes])
+    end_id = scene.end_shape().id
+    reflection, refraction = int(Shape.Type.Reflection), int(Shape.Type.Refraction)
+
+    flux = np.zeros(n_bins)
+    depth = np.zeros(n_rays, dtype=int)
+    for bounce in range(max_depth + 1):
+        if len(o) == 0:
+            break
+        its = scene.ray_intersect_batch(o, d)
+        shape_id = its.shape_id
+        valid = shape_id >= 0
+        types = np.where(valid, shape_type[np.maximum(shape_id, 0)], -1)
+
+        # Record hits on the receiver
+        hit = valid & (shape_id == end_id) & (depth >= 1 if n_bounces is None else depth == n_bounces)
+        if np.any(hit):
+            bins = np.minimum((its.u[hit] * n_bins).astype(int), n_bins - 1)
+            flux += np.bincount(bins, weights=weight[hit], minlength=n_bins)
+
+        # Continue specular paths
+        wi = -d
+        p, n_hit = its.p, its.n
+        wo = np.zeros_like(d)
+        alive = np.zeros(len(o), dtype=bool)
+
+        is_refl = types == reflection
+        if np.any(is_refl):
+            front = dot(wi[is_refl], n_hit[is_refl]) >= 0
+            idx = np.where(is_refl)[0][front]
+            wo[idx] = reflect(wi[idx], n_hit[idx])[1]
+            alive[idx] = True
+
+        is_refr = types == refraction
+        if np.any(is_refr):
+            ok, wt = refract(wi[is_refr], n_hit[is_refr], its.eta[is_refr])
+            idx = np.where(is_refr)[0]
+            wo[idx] = wt
+            alive[idx] = ok
+
+        if n_bounces is not None:
+            alive &= depth < n_bounces
+        o, d = p[alive], wo[alive]
+        weight, depth = weight[alive], depth[alive] + 1
+
+    return flux
+
+def trace_job(job):
+    name, state, n_rays, options, seed = job
+    scene = worker_scene(name, state)
+    rng = np.random.RandomState(seed)
+    return trace_rays(scene, n_rays, rng, **options)
+
+def light_trace(scene, n_rays=10**7, n_bins=128, point_light=True, n_bounces=None, max_depth=16,
+                batch_size=2**20, processes=None, seed=0):
+    # Reference irradiance profile over the end shape. Rays are traced in batches of
+    # `batch_size`, which are distributed over a process pool.
+    result = LightTracerResult(n_bins)
+    options = {
+        'start_u': scene.start_u_current if point_light else None,
+        'n_bounces': n_bounces,
+        'n_bins': n_bins,
+        'max_depth': max_depth,
+    }
+    n_batches = max(1, int(np.ceil(n_rays / batch_size)))
+    sizes = [batch_size] * (n_batches - 1) + [n_rays - batch_size*(n_batches - 1)]
+    state = scene_state(scene)
+    jobs = [(scene.name, state, size, options, seed + k) for k, size in enumerate(sizes)]
+
+    start = time.perf_counter()
+    for size, flux in zip(sizes, parallel_map(trace_job, jobs, processes)):
+        # Each batch is normalized by its own size
+        result.flux += flux * (size / n_rays)
+    result.time = time.perf_counter() - start
+    result.n_rays = n_rays
+    result.irradiance = result.flux / ShapeTable(scene.end_shape()).bin_lengths(n_bins)
+    return result
+
+def relative_error(reference, irradiance):
+    # L1 error of an irradiance profile relative to a reference on the same grid
+    total = np.sum(np.abs(reference))
+    return np.sum(np.abs(irradiance - reference)) / total if total > 0 else np.inf
+
+if __name__ == "__main__":
+    import argparse
+    from scenes import registry
+    from caustics import caustic_profile
+
+    parser = argparse.ArgumentParser(description="Reference caustic irradiance by light tracing")
+    parser.add_argument('scene', help="scene name")
+    parser.add_argument('-n', '--rays', type=float, default=1e7, help="number of rays")
+    parser.add_argument('-b', '--bins', type=int, default=128, help="number of histogram bins")
+    parser.add_argument('-j', '--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--area', action='store_true', help="emit from the whole start shape instead of the start position")
+    parser.add_argument('--compare', action='store_true', help="compare against the SMS caustic estimate")
+    parser.add_argument('-o', '--output', default=None, help="output file (.npz)")
+    args = parser.parse_args()
+
+    scene = registry.get(args.scene)
+    n_bounces = scene.n_bounces_default if args.compare else None
+    result = light_trace(scene, int(args.rays), args.bins, not args.area, n_bounces, processes=args.processes)
+    print("%d rays in %.2f s (%.1f M rays/s)" % (result.n_rays, result.time, 1e-6*result.n_rays / result.time))
+
+    if args.compare:
+        if args.area:
+            parser.error("--compare requires a point light")
+        profile = caustic_profile(scene, args.bins, processes=args.processes)
+        print("SMS estimate in %.2f s, relative L1 error: %.4f" %
+              (profile.time, relative_error(result.irradiance, profile.irradiance)))
+    if args.output:
+        np.savez(args.output, u=result.u, flux=result.flux, irradiance=result.irradiance)
@@ -0,0 +1,265 @@
+from misc import *
+from path import *
+from solver import specular_residual
+from frame_stats import counters
+
+# Manifold walks: move the endpoint of a light path (with fixed start vertex) towards
+# a target position on the end shape while keeping all specular constraints satisfied.
+
+class WalkIteration:
+    # Diagnostics of a single walk iteration
+    def __init__(self, step_size, distance, residual, accepted):
+        self.step_size = step_size      # beta (reprojection) or du of the endpoint (predictor-corrector)
+        self.distance = distance        # Remaining distance of the endpoint to the target
+        self.residual = residual        # Largest |C| of the current path
+        self.accepted = accepted
+
+    def __repr__(self):
+        return "WalkIteration[step_size=%g, distance=%g, residual=%g, accepted=%s]" % \
+            (self.step_size, self.distance, self.residual, self.accepted)
+
+class WalkStats:
+    def __init__(self):
+        self.success = False
+        self.steps = 0                  # Outer iterations (accepted + rejected)
+        self.rejected = 0               # Steps that had to be retried with a smaller step size
+        self.corrector_iterations = 0   # Newton iterations (predictor-corrector walk only)
+        self.traces = 0                 # Path re-tracing / visibility checks
+        self.distance = 0.0             # Distance the endpoint moved
+        self.iterations = []            # WalkIteration records
+
+    def cost_per_distance(self):
+        return self.steps / self.distance if self.distance > 0 else np.inf
+
+def reprojection_walk(scene, path, target, constraint_type, max_steps=20, eps=1e-3):
+    # Original scheme: move only the first specular vertex to first order, re-trace the
+    # path from the start vertex and adapt the step size based on forward progress.
+    stats = WalkStats()
+    current_path = path.copy()
+    dx = target - current_path[-1].p
+
+    beta = 1.0
+    while stats.steps < max_steps:
+        # Compute tangents and constraints
+        current_path.compute_tangent_derivatives(constraint_type)
+        if current_path.singular:
+            break
+
+        # Convert spatial offset of endpoint into tangential offset (along u)
+        du = current_path[-1].s @ dx
+
+        # And move first specular vertex in chain according to it
+        offset_positions = current_path.copy_positions()
+        offset_positions[1] -= beta * current_path[1].dp_du * current_path[1].dC_duk * du
+
+        # Ray trace to re-project onto specular manifold
+        proposed_path = scene.reproject_path_me(offset_positions)
+        stats.traces += 1
+        stats.steps += 1
+        delta_old = norm(target - current_path[-1].p)
+        accepted = False
+        if current_path.same_submanifold(proposed_path):
+            # Check for forward progress
+            delta_new = norm(target - proposed_path[-1].p)
+            if delta_new < delta_old:
+                accepted = True
+        stats.iterations.append(WalkIteration(beta, delta_old, specular_residual(current_path), accepted))
+
+        if accepted:
+            beta = min(1.0, 2*beta)
+            stats.distance += norm(proposed_path[-1].p - current_path[-1].p)
+            current_path = proposed_path
+        else:
+            beta = 0.5 * beta
+            stats.rejected += 1
+            continue
+
+        # Check for success
+        dx = target - current_path[-1].p
+        if norm(dx) < eps:
+            stats.success = True
+            break
+
+    return (current_path if stats.success else None), stats
+
+def closed_shape(shape):
+    # Shapes that end where they start (circles, closed Bezier outlines) have a periodic `u`
+    return norm(shape.sample_position(1.0).p - shape.sample_position(0.0).p) < 1e-5
+
+def u_difference(shape, u0, u1):
+    # Signed parameter difference u1 - u0, the shorter way round on closed shapes
+    du = u1 - u0
+    if closed_shape(shape):
+        du = (du + 0.5) % 1.0 - 0.5
+    return du
+
+def move_vertices(path, du):
+    # Copy of `path` with every vertex moved by `du[k]` along its shape parameterization,
+    # None if a vertex leaves its shape. `u` wraps around on closed shapes.
+    moved = Path()
+    for k, vtx in enumerate(path):
+        if du[k] == 0:
+            moved.append(vtx.copy())
+            continue
+        u = vtx.u + du[k]
+        if u < 0 or u > 1:
+            if not closed_shape(vtx.shape):
+                return None
+            u %= 1.0
+        it = vtx.shape.sample_position(u)
+        it.eta = vtx.shape.eta
+        it.n_offset = vtx.n_offset
+        moved.append(it)
+    return moved
+
+def path_visible(scene, path):
+    # Check that all segments of a path are unoccluded
+    for k in range(len(path) - 1):
+        d = path[k+1].p - path[k].p
+        dist = norm(d)
+        it = scene.ray_intersect(Ray2f(path[k].p, d / dist))
+        if not it.is_valid() or it.shape.id != path[k+1].shape.id or norm(it.p - path[k+1].p) > 1e-3:
+            return False
+    return True
+
+def correct_path(path, constraint_type, eps, max_iterations):
+    # Newton iterations on the specular constraints with both endpoints held fixed.
+    # Returns the corrected path (or None), the number of iterations and the residual
+    # before the first iteration.
+    initial_residual = np.inf
+    for i in range(max_iterations + 1):
+        path.compute_tangent_derivatives(constraint_type)
+        if path.singular:
+            return None, i, initial_residual
+
+        residual = specular_residual(path)
+        if i == 0:
+            initial_residual = residual
+        if residual <= eps:
+            return path, i, initial_residual
+        if i == max_iterations:
+            break
+
+        du = [-vtx.dX if 0 < k < len(path) - 1 else 0 for k, vtx in enumerate(path)]
+        path = move_vertices(path, du)
+        if path is None:
+            return None, i + 1, initial_residual
+    return None, max_iterations, initial_residual
+
+def predictor_corrector_walk(scene, path, target, constraint_type, max_steps=20, eps=1e-3,
+                             max_corrector_steps=4, predictor_tolerance=1e-2, corrector_tolerance=1e-4):
+    # Continuation along the manifold, parameterized by the endpoint's `u`. Each step
+    # predicts all vertices with the full tangent (du_i/du_k = dC_duk), corrects with
+    # Newton on the constraints and then adapts the step size: the residual after the
+    # prediction grows quadratically with the step size and measures the local curvature.
+    # The corrector stops once the constraint residual is below `corrector_tolerance`.
+    stats = WalkStats()
+    current_path = path.copy()
+    current_path.compute_tangent_derivatives(constraint_type)
+    if current_path.singular or not current_path.has_specular_segment():
+        return None, stats
+
+    end_shape = current_path[-1].shape
+    u_target = end_shape.project(target)
+    target = end_shape.sample_position(u_target).p
+
+    h = u_difference(end_shape, current_path[-1].u, u_target)   # Try to get there in a single step first
+    while stats.steps < max_steps:
+        if norm(target - current_path[-1].p) < eps:
+            stats.success = True
+            break
+
+        remaining = u_difference(end_shape, current_path[-1].u, u_target)
+        if h*remaining <= 0 or abs(h) > abs(remaining):
+            h = remaining
+
+        # Predict along the tangent space of the manifold
+        du = np.zeros(len(current_path))
+        du[-1] = h
+        for k in range(1, len(current_path) - 1):
+            du[k] = current_path[k].dC_duk * h
+        predicted_path = move_vertices(current_path, du)
+        stats.steps += 1
+
+        corrected_path = None
+        if predicted_path is not None:
+            corrected_path, iterations, residual = correct_path(predicted_path, constraint_type,
+                                                                corrector_tolerance, max_corrector_steps)
+            stats.corrector_iterations += iterations
+            counters.newton_iterations += iterations
+        if corrected_path is not None:
+            stats.traces += 1
+            if not path_visible(scene, corrected_path):
+                corrected_path = None
+
+        stats.iterations.append(WalkIteration(h, norm(target - current_path[-1].p),
+                                              specular_residual(current_path), corrected_path is not None))
+        if corrected_path is None:
+            h *= 0.5
+            stats.rejected += 1
+            continue
+
+        stats.distance += norm(corrected_path[-1].p - current_path[-1].p)
+        current_path = corrected_path
+        h *= np.clip(np.sqrt(predictor_tolerance / max(residual, 1e-12)), 0.5, 2.0)
+
+    return (current_path if stats.success else None), stats
+
+WALK_METHODS = {
+    'reprojection': reprojection_walk,
+    'predictor_corrector': predictor_corrector_walk,
+}
+
+def manifold_walk(scene, path, target, constraint_type=ConstraintType.HalfVector, max_steps=20, eps=1e-3,
+                  method='reprojection'):
+    # Walk the endpoint of `path` to `target` (a position on or near the end shape).
+    # Returns the new path (None on failure) and the WalkStats with per-iteration
+    # diagnostics. Neither the scene nor `path` are modified.
+    if method not in WALK_METHODS:
+        raise ValueError("manifold_walk(): unknown method '%s'" % method)
+    return WALK_METHODS[method](scene, path, target, constraint_type, max_steps, eps)
+
+def start_angle(path):
+    # Direction of the first path segment in degrees, as used by `Scene.start_angle_current`
+    d = normalize(path[1].p - path[0].p)
+    return np.degrees(np.arctan2(d[1], d[0]))
+
+class WalkBatchResult:
+    def __init__(self, u):
+        self.u = u                                  # End shape parameters of the targets
+        self.success = np.zeros(len(u), dtype=bool)
+        self.endpoints = np.full((len(u), 2), np.nan)
+        self.steps = np.zeros(len(u), dtype=int)
+        self.paths = [None] * len(u)
+
+def manifold_walk_batch(scene, path, u_targets, constraint_type=ConstraintType.HalfVector, max_steps=20,
+                        eps=1e-3, method='reprojection', continuation=True):
+    # Walk `path` towards many targets on its end shape, given by their parameters
+    # `u_targets`. With `continuation`, targets are visited in order of increasing
+    # distance in u on both sides of the current endpoint, and every walk starts from
+    # the last path that made it on that side, so each walk only covers a short distance.
+    u_targets = np.asarray(u_targets, dtype=float)
+    result = WalkBatchResult(u_targets)
+    end_shape = path[-1].shape
+    u0 = path[-1].u
+
+    order = np.argsort(np.abs(u_targets - u0))
+    last_path = { -1: path, 1: path }
+    for idx in order:
+        side = 1 if u_targets[idx] >= u0 else -1
+        start_path = last_path[side] if continuation else path
+        target = end_shape.sample_position(u_targets[idx]).p
+
+        walked_path, stats = manifold_walk(scene, start_path, target, constraint_type, max_steps, eps, method)
+        result.steps[idx] = stats.steps
+        if walked_path is not None:
+            result.success[idx] = True
+            result.endpoints[idx] = walked_path[-1].p
+            result.paths[idx] = walked_path
+            last_path[side] = walked_path
+    return result
+
+def reachable_region(scene, path, resolution=200, **kwargs):
+    # Map which parameters of the end shape can be reached by walking `path`
+    u = np.linspace(0, 1, resolution)
+    return manifold_walk_batch(scene, path, u, **kwargs)
@@ -21,75 +21,83 @@ class ModeType(IntEnum):
 def lerp(t, a, b):
     return a + (b - a)*t
 
+# The vector functions below take single 2D vectors or stacks of them, i.e. arrays of
+# shape (..., 2). Scalar results (dot products, angles, ...) then have shape (...).
+
+def col(x):
+    # Scalar (stack) to a column that broadcasts against (..., 2) arrays
+    return np.expand_dims(x, -1)
+
 def normalize(v):
-    n = np.sqrt(v[0]**2 + v[1]**2)
-    return v/n
+    return v / col(norm(v))
 
 def norm(v):
-    return np.sqrt(v[0]**2 + v[1]**2)
+    v = np.asarray(v)
+    return np.sqrt(v[..., 0]**2 + v[..., 1]**2)
 
 def cross(u, v):
-    return u[0]*v[1] - u[1]*v[0]
+    u, v = np.asarray(u), np.asarray(v)
+    return u[..., 0]*v[..., 1] - u[..., 1]*v[..., 0]
 
 def dot(u, v):
-    return u @ v
+    u, v = np.asarray(u), np.asarray(v)
+    return u[..., 0]*v[..., 0] + u[..., 1]*v[..., 1]
+
+def valid_mask(valid):
+    # Plain bool for single vectors, bool array for stacks
+    return bool(valid) if np.ndim(valid) == 0 else valid
 
 def reflect(w, n):
-    return True, 2*(w @ n)*n - w
+    dot_w_n = dot(w, n)
+    return valid_mask(np.ones(np.shape(dot_w_n), dtype=bool)), 2*col(dot_w_n)*n - w
 
 def d_reflect(w, dw_du, n, dn_du):
     dot_w_n    = dot(w, n)
     dot_dwdu_n = dot(dw_du, n)
     dot_w_dndu = dot(w, dn_du)
-    return 2*((dot_dwdu_n + dot_w_dndu)*n + dot_w_n*dn_du) - dw_du
-
-def refract(w, n_, eta_):
-    n = copy.copy(n_)
-    eta = copy.copy(eta_)
-
-    if dot(w, n) < 0:
-        eta = 1.0 / eta
-        n = -n
-    f = 1.0 / eta
+    return 2*(col(dot_dwdu_n + dot_w_dndu)*n + col(dot_w_n)*dn_du) - dw_du
 
+def refract(w, n, eta):
+    # Returns (valid, wt), where `valid` is False for total internal reflection
     dot_w_n = dot(w, n)
-    root_term = 1.0 - f*f * (1 - dot_w_n*dot_w_n)
-    if root_term < 0:
-        return False, np.array([0,0])  # TIR
-
-    wt = -f*(w - dot_w_n*n) - n*np.sqrt(root_term)
-    return True, wt
+    sign = np.where(dot_w_n < 0, -1.0, 1.0)     # Flip normal and eta on the inside
+    f = np.where(dot_w_n < 0, eta, 1.0 / eta)
+    n = col(sign)*n
+    dot_w_n = sign*dot_w_n
 
-def d_refract(w, dw_du, n_, dn_du_, eta_):
-    n     = copy.copy(n_)
-    dn_du = copy.copy(dn_du_)
-    eta   = copy.copy(eta_)
+    root_term = 1.0 - f*f * (1 - dot_w_n*dot_w_n)
+    valid = root_term >= 0
+    wt = -col(f)*(w - col(dot_w_n)*n) - n*col(np.sqrt(np.maximum(root_term, 0)))
+    if np.ndim(valid) == 0:
+        return (True, wt) if valid else (False, np.array([0, 0]))  # TIR
+    return valid, np.where(col(valid), wt, 0)
 
-    if dot(w, n) < 0:
-        eta = 1.0 / eta
-        n = -n
-        dn_du = -dn_du
-    f = 1.0 / eta
+def d_refract(w, dw_du, n, dn_du, eta):
+    dot_w_n = dot(w, n)
+    sign = np.where(dot_w_n < 0, -1.0, 1.0)
+    f = np.where(dot_w_n < 0, eta, 1.0 / eta)
+    n     = col(sign)*n
+    dn_du = col(sign)*dn_du
 
-    dot_w_n    = dot(w, n)
+    dot_w_n    = sign*dot_w_n
     dot_dwdu_n = dot(dw_du, n)
     dot_w_dndu = dot(w, dn_du)
     root = np.sqrt(1 - f*f*(1 - dot_w_n*dot_w_n))
 
-    a_u  = -f*(dw_du - ((dot_dwdu_n + dot_w_dndu)*n + dot_w_n*dn_du))
-    b1_u = dn_du * root
-    b2_u = n * 1/(2*root) * (-f*f*(-2*dot_w_n*(dot_dwdu_n + dot_w_dndu)))
+    a_u  = -col(f)*(dw_du - (col(dot_dwdu_n + dot_w_dndu)*n + col(dot_w_n)*dn_du))
+    b1_u = dn_du * col(root)
+    b2_u = n * col(1/(2*root) * (-f*f*(-2*dot_w_n*(dot_dwdu_n + dot_w_dndu))))
     b_u  = -(b1_u + b2_u)
     return a_u + b_u
 
 def angle(w):
-    phi = np.arctan2(w[1], w[0])
-    if phi < 0:
-        phi += 2*np.pi
-    return phi
+    w = np.asarray(w)
+    phi = np.arctan2(w[..., 1], w[..., 0])
+    return phi + 2*np.pi*(phi < 0)
 
 def d_angle(w, dw_du):
-    yx = w[1] / w[0]
+    w, dw_du = np.asarray(w), np.asarray(dw_du)
+    yx = w[..., 1] / w[..., 0]
     d_atan = 1/(1 + yx*yx)
-    d_phi = d_atan * (w[0]*dw_du[1] - w[1]*dw_du[0]) / (w[0]*w[0])
-    return d_phi
\ No newline at end of file
+    d_phi = d_atan * (w[..., 0]*dw_du[..., 1] - w[..., 1]*dw_du[..., 0]) / (w[..., 0]*w[..., 0])
+    return d_phi
@@ -1,8 +1,12 @@
 import copy
+import threading
 from misc import *
 from path import *
 from draw import *
+from manifold_walk import manifold_walk, start_angle
+from atlas import manifold_atlas, path_signature
 from mode import Mode
+from frame_stats import counters
 from knob import DraggableKnob
 from nanogui import *
 
@@ -13,6 +17,10 @@ class ManifoldExplorationMode(Mode):
         self.path = None
         self.tangent_path = None
 
+        # First-order predictions and reprojected paths for a range of endpoint displacements
+        self.fan_predictions = None
+        self.fan_paths = []
+
         self.dragging_start = False
         self.dragging_end = False
         self.knob_start = DraggableKnob()
@@ -25,6 +33,10 @@ class ManifoldExplorationMode(Mode):
 
         self.positions = []
 
+        # Precomputed atlases, per scene name, and the scenes with a build in progress
+        self.atlases = {}
+        self.atlas_builds = set()
+
     def enter(self, last):
         super().enter(last)
         self.path_needs_update = True
@@ -36,11 +48,28 @@ class ManifoldExplorationMode(Mode):
     def scene_changed(self):
         super().scene_changed()
         self.path_needs_update = True
+        if self.atlas_chb.checked():
+            self.request_atlas(self.viewer.scenes[self.viewer.scene_idx])
+
+    def request_atlas(self, scene):
+        # Atlases are loaded or built (on the process pool) in a background thread, so
+        # the viewer stays responsive. Walks don't use the atlas until it is available.
+        if scene.name in self.atlases or scene.name in self.atlas_builds:
+            return
+        self.atlas_builds.add(scene.name)
+        def build():
+            try:
+                self.atlases[scene.name] = manifold_atlas(scene)
+            finally:
+                self.atlas_builds.discard(scene.name)
+        threading.Thread(target=build, daemon=True).start()
 
     def update(self, input, scene):
         super().update(input, scene)
 
         self.tangent_path = None
+        self.fan_predictions = None
+        self.fan_paths = []
 
         # Sample a new path from start pos & ang
         if self.path_needs_update:
@@ -118,76 +147,52 @@ class ManifoldExplorationMode(Mode):
                     self.positions[idx] -= 1.0 * self.path[idx].dp_du * self.path[idx].dC_duk * du
 
                 self.tangent_path = scene.reproject_path_me(self.positions)
+
+                if self.fan_chb.checked():
+                    self.update_fan(scene)
             else:
                 ## FULL MANIFOLD WALK MODE
                 new_position = copy.copy(self.positions[-1])
 
                 # Try to walk from start to end position
-                dx = new_position - old_position
-                current_path = self.path.copy()
-
-                if norm(dx) > 0:
-                    i = 0
-                    beta = 1.0
-                    N = self.max_steps()
-                    threshold = self.eps_threshold()
-                    success = False
-                    while True:
-                        # Give up after too many iterations
-                        if i >= N:
-                            break
-
-                        # Compute tangents and constraints
-                        current_path.compute_tangent_derivatives(self.constraint_type)
-                        if current_path.singular:
-                            break
-
-                        # Convert spatial offset of endpoint into tangential offset (along u)
-                        du = current_path[-1].s @ dx
-
-                        # And move first specular vertex in chain according to it
-                        offset_positions = current_path.copy_positions()
-                        offset_positions[1] -= beta * current_path[1].dp_du * current_path[1].dC_duk * du
-
-                        # Ray trace to re-project onto specular manifold
-                        proposed_path = scene.reproject_path_me(offset_positions)
-                        if not current_path.same_submanifold(proposed_path):
-                            beta = 0.5 * beta
-                            i += 1
-                            continue
-
-                        # Check for forward progress
-                        if proposed_path:
-                            delta_old = norm(new_position -  current_path[-1].p)
-                            delta_new = norm(new_position - proposed_path[-1].p)
-                            if delta_new < delta_old:
-                                beta = min(1.0, 2*beta)
-                                current_path = proposed_path
-                            else:
-                                beta = 0.5 * beta
-                        else:
-                            beta = 0.5 * beta
-
-                        i += 1
-
-                        # Check for success
-                        dx = new_position - current_path[-1].p
-                        if norm(dx) < threshold:
-                            success = True
-                            break
-
-                    if success:
-                        self.path = current_path
+                if norm(new_position - old_position) > 0:
+                    # Jump close to the target with a path from the atlas, so only a short walk remains
+                    start_path = self.path
+                    atlas = self.atlases.get(scene.name) if self.atlas_chb.checked() else None
+                    if atlas:
+                        end_shape = self.path[-1].shape
+                        atlas_path = atlas.starting_path(scene, path_signature(self.path), end_shape.project(new_position))
+                        counters.cache_lookup(bool(atlas_path))
+                        if atlas_path:
+                            start_path = atlas_path
+
+                    method = 'predictor_corrector' if self.predictor_corrector_chb.checked() else 'reprojection'
+                    walked_path, _ = manifold_walk(scene, start_path, new_position, self.constraint_type,
+                                                   self.max_steps(), self.eps_threshold(), method)
+                    if walked_path:
+                        self.path = walked_path
                     else:
                         self.positions[-1] = old_position
 
                     # Update start angle s.t. we can move start point without "jump" in visualization
-                    new_start_dir   = normalize(self.path[1].p - self.path[0].p)
-                    new_start_angle = np.arctan2(new_start_dir[1], new_start_dir[0])
-                    scene.start_angle_current = np.degrees(new_start_angle)
+                    scene.start_angle_current = start_angle(self.path)
 
         self.knob_end.p = self.positions[-1]
 
+    def update_fan(self, scene, n_paths=16, max_du=0.3):
+        # Move the endpoint of the current path by a range of offsets along its tangent,
+        # predict all vertices to first order and reproject them in a single batch
+        positions = np.array(self.path.copy_positions())
+        tangents = np.zeros_like(positions)
+        for idx in range(1, len(self.path) - 1):
+            tangents[idx] = self.path[idx].dp_du * self.path[idx].dC_duk
+        tangents[-1] = -self.path[-1].s
+
+        du = np.linspace(-max_du, max_du, n_paths)
+        self.fan_predictions = positions[None] - du[:, None, None]*tangents[None]
+        batch = scene.reproject_path_me_batch(self.fan_predictions, max_vertices=len(self.path) + 1)
+        self.fan_paths = [path for path in batch.paths() if self.path.same_submanifold(path)]
+
     def draw(self, ctx, scene):
         super().draw(ctx, scene)
         s = scene.scale
@@ -202,6 +207,10 @@ class ManifoldExplorationMode(Mode):
         if self.tangent_path and self.tangents_btn.pushed() and self.tangents_path_btn.pushed():
             draw_path_lines(ctx, self.tangent_path, modifier='tangent', scale=s)
 
+        if self.fan_predictions is not None:
+            draw_intermediate_path_lines_batch(ctx, self.fan_paths, nvg.RGB(120, 120, 120), 0.6*s)
+            draw_points(ctx, self.fan_predictions[:, 1:-1].reshape(-1, 2), nvg.RGB(255, 120, 120), 0.8*s)
+
         draw_path_vertices(ctx, self.path, '', s)
         if self.tangents_btn.pushed() and self.path.has_specular_segment():
             draw_vertices(ctx, self.positions[1:-1], nvg.RGB(255, 0, 0), 1.3*s)
@@ -258,6 +267,10 @@ class ManifoldExplorationMode(Mode):
         self.tangents_path_btn.set_pushed(False)
         self.tangents_path_btn.set_flags(Button.Flags.ToggleButton)
 
+        Label(tangent_tools, "  Fan:")
+        self.fan_chb = CheckBox(tangent_tools, "")
+        self.fan_chb.set_checked(False)
+
         self.debug_btn = Button(window, "Debug print", icons.FA_SPIDER)
         def debug_cb():
             self.path.print_derivative_debug(1, self.constraint_type)
@@ -292,8 +305,21 @@ class ManifoldExplorationMode(Mode):
             eps_tb.set_value("%.1E" % 10.0**(-(1 + value*7)))
         self.eps_sl.set_callback(eps_cb)
 
+        walk_tools = Widget(window)
+        walk_tools.set_layout(BoxLayout(Orientation.Horizontal,
+                                        Alignment.Middle, 0, 3))
+        Label(walk_tools, "Predictor-corrector walk:")
+        self.predictor_corrector_chb = CheckBox(walk_tools, "")
+        self.predictor_corrector_chb.set_checked(False)
+        Label(walk_tools, "  Atlas:")
+        self.atlas_chb = CheckBox(walk_tools, "")
+        self.atlas_chb.set_checked(False)
+        def atlas_cb(state):
+            if state:
+                self.request_atlas(self.viewer.scenes[self.viewer.scene_idx])
+        self.atlas_chb.set_callback(atlas_cb)
 
-        return [frame_tools, constraint_tools, tangent_tools, self.debug_btn, steps_eps_tools], []
+        return [frame_tools, constraint_tools, tangent_tools, self.debug_btn, steps_eps_tools, walk_tools], []
 
     def max_steps(self):
         value = self.max_steps_sl.value()
@@ -1,8 +1,14 @@
 import copy
 from misc import *
 from path import *
+from solver import newton_solver
+from caustics import caustic_profile, profile_curve
+from basins import basin_map, basin_strip
+from rough import rough_sample
+from seeding import SEEDING_STRATEGIES, SpecularShapes, solve_seed
 from draw import *
 from mode import Mode
+from frame_stats import counters
 from knob import DraggableKnob
 from nanogui import *
 
@@ -17,8 +23,23 @@ class SpecularManifoldSamplingMode(Mode):
         self.sms_mode = False
         self.seed_paths = []
         self.solution_paths = []
+        self.solution_paths_version = 0
         self.rough_mode = False
 
+        # Density image overlays, used instead of drawing individual paths for large sets
+        self.solution_density = PathDensityLayer(color=(80, 80, 80))
+        self.seed_density = PathDensityLayer(color=(140, 140, 140))
+
+        # Caustic irradiance along the receiver, see caustics.py
+        self.caustic_profile = None
+        self.caustic_curve = None
+
+        # Newton convergence basins over the seed domain, see basins.py. Strips of the
+        # most recent settings are kept, so going back to them doesn't recompute.
+        self.basins_key = None
+        self.basins_strip = None
+        self.basins_cache = {}      # key -> strip, least recently used first
+
         self.constraint_type = ConstraintType.HalfVector
         self.strategy_type = StrategyType.SMS
 
@@ -43,6 +64,9 @@ class SpecularManifoldSamplingMode(Mode):
     def scene_changed(self):
         scene = self.viewer.scenes[self.viewer.scene_idx]
         self.n_bounces_box.set_value(scene.n_bounces_default)
+        self.caustic_profile = None
+        self.caustic_curve = None
+        self.caustic_btn.set_background_color(Color(0, 1.0, 0, 0.1))
 
     def update(self, input, scene):
         super().update(input, scene)
@@ -99,68 +123,34 @@ class SpecularManifoldSamplingMode(Mode):
             if self.seed_path.has_specular_segment():
                 self.solution_path, self.intermediate_paths = self.newton_solver(scene, self.seed_path)
 
-    def newton_solver(self, scene, seed_path):
-        current_path = seed_path.copy()
-        intermediate_paths = [current_path]
-
-        i = 0
-        beta = 1.0
-        N = self.max_steps()
-        threshold = self.eps_threshold()
-        success = False
-        while True:
-            # Give up after too many iterations
-            if i >= N:
-                break
-
-            # Compute tangents and constraints
-            current_path.compute_tangent_derivatives(self.constraint_type)
-            if current_path.singular:
-                break
-
-            # Check for success
-            converged = True
-            for vtx in current_path:
-                if vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction:
-                    if abs(vtx.C) > threshold:
-                        converged = False
-                        break
-            if converged:
-                success = True
-                break
-
-            proposed_offsets = current_path.copy_positions()
-            for k, vtx in enumerate(current_path):
-                if vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction:
-                    proposed_offsets[k] -= self.step_size_scale()*beta * vtx.dp_du * vtx.dX
+        if self.show_basins_chb.checked() and not (self.dragging_start or self.dragging_end):
+            self.update_basins(scene)
+
+    def update_basins(self, scene):
+        # Only recompute when the endpoints or solver settings changed
+        key = (scene.name, scene.start_u_current, scene.end_u_current, int(self.constraint_type),
+               self.n_bounces_box.value(), self.max_steps(), self.eps_threshold(), self.step_size_scale())
+        if key == self.basins_key:
+            return
+        self.basins_key = key
+
+        # Only count lookups after a change, an unchanged key can't miss
+        strip = self.basins_cache.pop(key, None)
+        counters.cache_lookup(strip is not None)
+        if strip is None:
+            basins = basin_map(scene, constraint_type=self.constraint_type, n_bounces=self.n_bounces_box.value(),
+                               max_steps=self.max_steps(), eps=self.eps_threshold(), step_scale=self.step_size_scale(),
+                               cache=False)
+            strip = basin_strip(scene, basins)
+        self.basins_cache[key] = strip
+        if len(self.basins_cache) > 32:
+            del self.basins_cache[next(iter(self.basins_cache))]
+        self.basins_strip = strip
 
-            # Ray trace to re-project onto specular manifold
-            proposed_path = scene.reproject_path_sms(proposed_offsets, current_path, self.n_bounces_box.value())
-            if not current_path.same_submanifold(proposed_path):
-                beta = 0.5 * beta
-            else:
-                beta = min(1.0, 2*beta)
-                current_path = proposed_path
-                intermediate_paths.append(current_path)
-
-            i = i + 1
-
-        if success:
-            p_last = current_path[-1].p
-            p_spec = current_path[-2].p
-            d = p_spec - p_last
-            d_norm = norm(d)
-            d /= d_norm
-            ray = Ray2f(p_last, d, 1e-4, d_norm)
-            it = scene.ray_intersect(ray)
-            if it.is_valid():
-                success = False
-
-        if success:
-            solution_path = current_path
-        else:
-            solution_path = None
-        return solution_path, intermediate_paths
+    def newton_solver(self, scene, seed_path):
+        result = newton_solver(scene, seed_path, self.constraint_type, self.n_bounces_box.value(),
+                               self.max_steps(), self.eps_threshold(), self.step_size_scale())
+        return result.solution_path, result.intermediate_paths
 
     def draw(self, ctx, scene):
         super().draw(ctx, scene)
@@ -171,14 +161,20 @@ class SpecularManifoldSamplingMode(Mode):
 
         if self.sms_mode:
             if show_seed_paths:
-                for seed_path in self.seed_paths:
-                    draw_dotted_path_lines(ctx, seed_path, 0.6*s, spacing=0.02)
-            for solution in self.solution_paths:
-                draw_path_lines(ctx, solution, '', s)
+                if self.seed_density.active(self.seed_paths):
+                    self.seed_density.draw(ctx, self.seed_paths, self.solution_paths_version, self.viewer.size())
+                else:
+                    draw_dotted_path_lines_batch(ctx, self.seed_paths, 0.6*s, spacing=0.02)
+            if self.solution_density.active(self.solution_paths):
+                self.solution_density.draw(ctx, self.solution_paths, self.solution_paths_version, self.viewer.size())
+            else:
+                draw_path_lines_batch(ctx, self.solution_paths, '', s)
         elif self.rough_mode:
             draw_dotted_path_lines(ctx, self.seed_path, 0.6*s, spacing=0.02)
-            for solution in self.solution_paths:
-                draw_intermediate_path_lines(ctx, solution, nvg.RGB(80, 80, 80), s)
+            if self.solution_density.active(self.solution_paths):
+                self.solution_density.draw(ctx, self.solution_paths, self.solution_paths_version, self.viewer.size())
+            else:
+                draw_intermediate_path_lines_batch(ctx, self.solution_paths, nvg.RGB(80, 80, 80), s)
             if self.solution_path:
                 draw_intermediate_path_lines(ctx, self.solution_path, nvg.RGB(255, 0, 0), s)
         elif not show_intermediate_steps:
@@ -194,6 +190,11 @@ class SpecularManifoldSamplingMode(Mode):
 
         scene.draw(ctx)
 
+        if self.caustic_curve is not None:
+            draw_profile(ctx, *self.caustic_curve, (230, 160, 20), s)
+        if self.show_basins_chb.checked() and self.basins_strip is not None:
+            draw_strip(ctx, *self.basins_strip)
+
         if self.sms_mode or self.rough_mode:
             pass
         elif self.show_constraint_chb.checked():
@@ -244,8 +245,8 @@ class SpecularManifoldSamplingMode(Mode):
         if self.rough_mode:
             pass
         elif self.sms_mode:
-            for solution in self.solution_paths:
-                draw_path_vertices(ctx, solution, '', s)
+            if not self.solution_density.active(self.solution_paths):
+                draw_path_vertices_batch(ctx, self.solution_paths, '', s)
         elif not show_intermediate_steps:
             draw_path_vertices(ctx, self.seed_path, '', s)
             if self.solution_path:
@@ -350,6 +351,9 @@ class SpecularManifoldSamplingMode(Mode):
         Label(intermediate_tools, "Step size:")
         self.step_size_sl = Slider(intermediate_tools)
         self.step_size_sl.set_value(1.0)
+        Label(intermediate_tools, "Basins:")
+        self.show_basins_chb = CheckBox(intermediate_tools, "")
+        self.show_basins_chb.set_checked(False)
 
         sms_tools = Widget(window)
         sms_tools.set_layout(BoxLayout(Orientation.Horizontal,
@@ -376,23 +380,32 @@ class SpecularManifoldSamplingMode(Mode):
                 self.rough_btn.set_enabled(True)
 
             if self.sms_mode:
-                spec_u_current = self.scene.spec_u_current
                 self.seed_paths = []
                 self.solution_paths = []
                 N = self.n_sms_paths_box.value()
+                n_bounces = self.n_bounces_box.value()
+                seed_fn = SEEDING_STRATEGIES[self.seeding_strategy]
+                specular_shapes = SpecularShapes(self.scene)
                 for k in range(N):
-                    self.scene.spec_u_current = np.random.uniform()
-                    seed_path = self.scene.sample_seed_path(self.n_bounces_box.value())
+                    seed_path = seed_fn(self.scene, specular_shapes, n_bounces, np.random)
                     self.seed_paths.append(seed_path.copy())
 
-                    if seed_path.has_specular_segment():
-                        solution_path, _ = self.newton_solver(self.scene, seed_path)
-                        if solution_path:
-                            self.solution_paths.append(solution_path.copy())
+                    solution_path = solve_seed(self.scene, seed_path, self.seeding_strategy, self.constraint_type,
+                                               n_bounces, self.max_steps(), self.eps_threshold(),
+                                               self.step_size_scale())
+                    if solution_path:
+                        self.solution_paths.append(solution_path.copy())
 
-                self.scene.spec_u_current = spec_u_current
+                self.solution_paths_version += 1
         self.sms_btn.set_callback(sms_cb)
 
+        strategies = list(SEEDING_STRATEGIES.keys())
+        self.seeding_strategy = strategies[0]
+        seeding_cbox = ComboBox(sms_tools, ["First shape", "Area", "Independent"])
+        seeding_cbox.set_font_size(16)
+        def seeding_cb(idx):
+            self.seeding_strategy = strategies[idx]
+        seeding_cbox.set_callback(seeding_cb)
         Label(sms_tools, "  Show seeds:")
         self.show_seed_paths_chb = CheckBox(sms_tools, "")
         self.show_seed_paths_chb.set_checked(True)
@@ -418,6 +431,13 @@ class SpecularManifoldSamplingMode(Mode):
         self.roughness_box.set_font_size(20)
         self.roughness_box.set_format("[0-9]*\\.?[0-9]+")
         Label(rough_tools, " )")
+        distributions = ['beckmann', 'ggx']
+        self.slope_distribution = distributions[0]
+        distribution_cbox = ComboBox(rough_tools, ["Beckmann", "GGX"])
+        distribution_cbox.set_font_size(16)
+        def distribution_cb(idx):
+            self.slope_distribution = distributions[idx]
+        distribution_cbox.set_callback(distribution_cb)
         self.rough_btn = Button(rough_tools, "Go", icons.FA_ROCKET)
         self.rough_btn.set_background_color(Color(0, 1.0, 0, 0.1))
         def rough_cb():
@@ -430,23 +450,54 @@ class SpecularManifoldSamplingMode(Mode):
                 self.sms_btn.set_enabled(True)
 
             if self.rough_mode:
-                self.solution_paths = []
                 N = self.n_normals_box.value()
-                for k in range(N):
-                    seed_path = self.seed_path.copy()
-                    for k, vtx in enumerate(seed_path):
-                        if vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction:
-                            alpha = self.roughness_box.value()
-                            sigma2 = 0.5*alpha*alpha
-                            slope = np.random.normal(0, np.sqrt(sigma2))
-                            vtx.n_offset = normalize(np.array([-slope, 1]))
-                    if seed_path.has_specular_segment():
-                        solution_path, _ = self.newton_solver(self.scene, seed_path)
-                        if solution_path:
-                            self.solution_paths.append(solution_path.copy())
+                result = rough_sample(self.scene, N, self.roughness_box.value(), self.slope_distribution,
+                                      self.strategy_type, self.constraint_type, self.n_bounces_box.value(),
+                                      self.max_steps(), self.eps_threshold(), self.step_size_scale(),
+                                      processes=1 if N <= 1000 else None)
+                self.solution_paths = result.paths(self.scene)
+                self.solution_paths_version += 1
+
+                center, extent = result.footprint(self.scene)
+                if center is not None:
+                    print("Rough: %.1f%% of %d samples converged in %.2f s, glint extent %.4f" %
+                          (100*result.convergence_rate(), N, result.time, extent))
         self.rough_btn.set_callback(rough_cb)
 
-        return [strategy_tools, constraint_tools, steps_eps_tools, sms_tools, rough_tools, intermediate_tools], []
+        caustic_tools = Widget(window)
+        caustic_tools.set_layout(BoxLayout(Orientation.Horizontal,
+                                           Alignment.Middle, 0, 2))
+        Label(caustic_tools, "Caustic")
+        self.n_caustic_cells_box = IntBox(caustic_tools)
+        self.n_caustic_cells_box.set_fixed_size((60, 20))
+        self.n_caustic_cells_box.set_value(128)
+        self.n_caustic_cells_box.set_default_value("128")
+        self.n_caustic_cells_box.set_font_size(20)
+        self.n_caustic_cells_box.set_spinnable(True)
+        self.n_caustic_cells_box.set_min_value(2)
+        self.n_caustic_cells_box.set_value_increment(16)
+        Label(caustic_tools, " cells")
+        self.caustic_btn = Button(caustic_tools, "Go", icons.FA_SUN)
+        self.caustic_btn.set_background_color(Color(0, 1.0, 0, 0.1))
+        def caustic_cb():
+            if self.caustic_profile is not None:
+                self.caustic_profile = None
+                self.caustic_curve = None
+                self.caustic_btn.set_background_color(Color(0, 1.0, 0, 0.1))
+                return
+            self.caustic_profile = caustic_profile(self.scene, self.n_caustic_cells_box.value(),
+                                                   self.strategy_type, self.constraint_type,
+                                                   n_seeds=self.n_sms_paths_box.value(),
+                                                   n_bounces=self.n_bounces_box.value(),
+                                                   max_steps=self.max_steps(), eps=self.eps_threshold())
+            self.caustic_curve = profile_curve(self.scene, self.caustic_profile)
+            self.caustic_btn.set_background_color(Color(1.0, 0, 0, 0.1))
+            print("Caustic profile: %d solutions in %.2f s" % (np.sum(self.caustic_profile.n_solutions),
+                                                               self.caustic_profile.time))
+        self.caustic_btn.set_callback(caustic_cb)
+
+        return [strategy_tools, constraint_tools, steps_eps_tools, sms_tools, rough_tools, caustic_tools,
+                intermediate_tools], []
 
     def keyboard_event(self, key, scancode, action, modifiers):
         super().keyboard_event(key, scancode, action, modifiers)
@@ -0,0 +1,57 @@
+import os
+import multiprocessing
+
+# Process pool helpers. The C++ scene objects can't be pickled, so workers look up
+# scenes by name in the scene registry (built once per process) and the interactive
+# state (start/end/spec parameters) is sent along with each job.
+#
+# Workers are always spawned: forking the viewer process (OpenGL context, GUI and
+# background threads) isn't safe, and spawn is the default on macOS and Windows anyway.
+# Spawned workers only see the default registry, so scenes added at runtime go
+# through `register_scenes`, which repeats the registration in every worker.
+
+POOL_CONTEXT = multiprocessing.get_context('spawn')
+
+# (function, args) of all runtime registrations, replayed by the pool initializer
+worker_registrations = []
+
+def register_scenes(fn, *args):
+    # Call `fn(registry, *args)` (a module level function) on the scene registry of
+    # this process and of all pool workers started afterwards
+    from scenes import registry
+    fn(registry, *args)
+    worker_registrations.append((fn, args))
+
+def init_worker(registrations):
+    from scenes import registry
+    for fn, args in registrations:
+        fn(registry, *args)
+
+def scene_state(scene):
+    return {
+        'start_u': scene.start_u_current,
+        'start_angle': scene.start_angle_current,
+        'end_u': scene.end_u_current,
+        'spec_u': scene.spec_u_current,
+    }
+
+def worker_scene(name, state=None):
+    from scenes import registry
+    scene = registry.get(name)
+    if state is not None:
+        scene.start_u_current = state['start_u']
+        scene.start_angle_current = state['start_angle']
+        scene.end_u_current = state['end_u']
+        scene.spec_u_current = state['spec_u']
+    return scene
+
+def parallel_map(fn, jobs, processes=None, chunks_per_process=4):
+    # Evaluate `fn` (a module level function) for all jobs on a process pool.
+    # `processes=1` runs everything in the calling process.
+    jobs = list(jobs)
+    if processes == 1 or len(jobs) <= 1:
+        return [fn(job) for job in jobs]
+    processes = processes or os.cpu_count()
+    chunksize = max(1, len(jobs) // (chunks_per_process*processes))
+    with POOL_CONTEXT.Pool(processes, initializer=init_worker, initargs=(list(worker_registrations),)) as pool:
+        return pool.map(fn, jobs, chunksize=chunksize)
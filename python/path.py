@@ -346,20 +346,13 @@ class Path():
             gradC[i, idx+1] = du_next
             vC[i] = C
 
-        A = gradC[:,1:-1]
-        B1   = gradC[:,0]
-        Bk   = gradC[:,-1]
-
-        self.singular = not np.abs(np.linalg.det(A)) > 0
+        tangents = self.solve_tangents(gradC, vC)
+        self.singular = tangents is None
         if self.singular:
             return
 
         self.gradC = gradC
-
-        Ainv = np.linalg.inv(A)
-        T1 = -Ainv @ B1
-        Tk = -Ainv @ Bk
-        Tx = Ainv @ vC
+        T1, Tk, Tx = tangents
 
         for i in range(self.n_specular):
             idx = i+1
@@ -367,6 +360,21 @@ class Path():
             self.vertices[idx].dC_duk = Tk[i]
             self.vertices[idx].dX = Tx[i]
 
+    def solve_tangents(self, gradC, vC):
+        # Linear solve of the constraint system, None if it is singular
+        A = gradC[:,1:-1]
+        B1   = gradC[:,0]
+        Bk   = gradC[:,-1]
+
+        if not np.abs(np.linalg.det(A)) > 0:
+            return None
+
+        Ainv = np.linalg.inv(A)
+        T1 = -Ainv @ B1
+        Tk = -Ainv @ Bk
+        Tx = Ainv @ vC
+        return T1, Tk, Tx
+
     def same_submanifold(self, other):
         if len(self) != len(other):
             return False
@@ -449,3 +457,70 @@ class Path():
         print("")
 
         print("-----")
+
+class InteractionSubset():
+    # Selection (index array or mask) of the entries of an InteractionBatch, with the
+    # same array attributes
+    def __init__(self, its, idx):
+        base = its.idx if isinstance(its, InteractionSubset) else np.arange(len(its))
+        self.batch    = its.batch if isinstance(its, InteractionSubset) else its
+        self.idx      = base[idx]
+        self.p        = its.p[idx]
+        self.n        = its.n[idx]
+        self.s        = its.s[idx]
+        self.u        = its.u[idx]
+        self.eta      = its.eta[idx]
+        self.shape_id = its.shape_id[idx]
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __getitem__(self, j):
+        return self.batch[int(self.idx[j])]
+
+class PathBatch():
+    # Many paths with up to `n_vertices` vertices as padded (N, K, ...) arrays. The
+    # interactions of each vertex index are also kept as `InteractionBatch`es (together
+    # with the paths they belong to), so single paths can be extracted exactly.
+    def __init__(self, n_paths, n_vertices):
+        self.p        = np.zeros((n_paths, n_vertices, 2))
+        self.n        = np.zeros((n_paths, n_vertices, 2))
+        self.s        = np.zeros((n_paths, n_vertices, 2))
+        self.u        = np.zeros((n_paths, n_vertices))
+        self.shape_id = np.full((n_paths, n_vertices), -1, dtype=np.int32)
+        self.n_offset = np.zeros((n_paths, n_vertices, 2))
+        self.n_offset[:, :, 1] = 1
+        self.length   = np.zeros(n_paths, dtype=int)
+        self.valid    = np.zeros(n_paths, dtype=bool)
+        self.records  = [[] for k in range(n_vertices)]
+
+    def __len__(self):
+        return len(self.length)
+
+    def set_vertex(self, k, rows, its, n_offset=None):
+        # Vertex `k` of the paths `rows` (sorted indices) from an InteractionBatch
+        self.p[rows, k] = its.p
+        self.n[rows, k] = its.n
+        self.s[rows, k] = its.s
+        self.u[rows, k] = its.u
+        self.shape_id[rows, k] = its.shape_id
+        if n_offset is not None:
+            self.n_offset[rows, k] = n_offset
+        self.length[rows] = k + 1
+        self.records[k].append((rows, its))
+
+    def path(self, i):
+        path = Path()
+        for k in range(self.length[i]):
+            for rows, its in self.records[k]:
+                j = np.searchsorted(rows, i)
+                if j < len(rows) and rows[j] == i:
+                    it = its[int(j)]
+                    it.n_offset = self.n_offset[i, k]
+                    path.append(it)
+                    break
+        return path
+
+    def paths(self, valid_only=True):
+        indices = np.where(self.valid)[0] if valid_only else range(len(self))
+        return [self.path(i) for i in indices]
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Swap in the double precision build of the C++ library (`manifolds_double`) when
+# requested via `--double` or MANIFOLDS_DOUBLE=1. This module needs to be imported
+# before anything else imports `manifolds`.
+def double_precision_requested():
+    return '--double' in sys.argv or os.environ.get('MANIFOLDS_DOUBLE', '0') == '1'
+
+if double_precision_requested() and 'manifolds' not in sys.modules:
+    import manifolds_double
+    sys.modules['manifolds'] = manifolds_double
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import threading
+import importlib
+import functools
+from contextlib import contextmanager
+
+# Lightweight tracing profiler. While enabled, the functions below are replaced by
+# wrappers that record a `perf_counter_ns` scope per call; disabling restores the
+# original functions, so there is no overhead at all when profiling is off.
+# Recorded sessions are exported as Chrome trace JSON ("X" complete events), which
+# can be opened in chrome://tracing, Perfetto or speedscope as a flame graph.
+
+# (module, class, method, category)
+PROFILED_FUNCTIONS = [
+    ('path',  'Path',  'copy',                        'copy'),
+    ('path',  'Path',  'compute_tangent_derivatives', 'constraints'),
+    ('path',  'Path',  'grad_constraints_halfvector', 'constraints'),
+    ('path',  'Path',  'grad_constraints_anglediff',  'constraints'),
+    ('path',  'Path',  'solve_tangents',              'linear_solve'),
+    ('scene', 'Scene', 'ray_intersect',               'ray_tracing'),
+    ('scene', 'Scene', 'ray_intersect_batch',         'ray_tracing'),
+    ('scene', 'Scene', 'reproject_path_sms',          'reprojection'),
+    ('scene', 'Scene', 'reproject_path_me',           'reprojection'),
+    ('scene', 'Scene', 'draw',                        'draw'),
+]
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.events = []        # (name, category, start, end, thread id) in ns
+        self.patched = []       # (owner, attribute, original) to restore on `disable`
+
+    def record(self, name, category, start, end):
+        self.events.append((name, category, start, end, threading.get_ident()))
+
+    def wrap(self, fn, name, category):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, category, start, time.perf_counter_ns())
+        return wrapper
+
+    def patch_method(self, cls, attr, category):
+        original = cls.__dict__[attr]
+        setattr(cls, attr, self.wrap(original, "%s.%s" % (cls.__name__, attr), category))
+        self.patched.append((cls, attr, original))
+
+    def patch_function(self, module, attr, category):
+        # Functions are also imported by name (`from draw import *`), so replace
+        # every module level reference to the original function
+        original = getattr(module, attr)
+        wrapped = self.wrap(original, attr, category)
+        for m in list(sys.modules.values()):
+            if m is not None and getattr(m, attr, None) is original:
+                setattr(m, attr, wrapped)
+                self.patched.append((m, attr, original))
+
+    def enable(self):
+        if self.enabled:
+            return
+        import draw
+        for module_name, cls_name, attr, category in PROFILED_FUNCTIONS:
+            cls = getattr(importlib.import_module(module_name), cls_name)
+            self.patch_method(cls, attr, category)
+        for attr in dir(draw):
+            if attr.startswith('draw_') and callable(getattr(draw, attr)):
+                self.patch_function(draw, attr, 'draw')
+        self.enabled = True
+
+    def disable(self):
+        for owner, attr, original in reversed(self.patched):
+            setattr(owner, attr, original)
+        self.patched = []
+        self.enabled = False
+
+    def clear(self):
+        self.events = []
+
+    @contextmanager
+    def scope(self, name, category='frame'):
+        # Explicit scope, e.g. around a whole frame. Records nothing while disabled.
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter_ns())
+
+    def summary(self):
+        # Total time (s) and number of calls per scope name. Nested scopes are counted
+        # in their parents as well.
+        totals = {}
+        for name, category, start, end, tid in self.events:
+            total, count = totals.get(name, (0, 0))
+            totals[name] = (total + 1e-9*(end - start), count + 1)
+        return totals
+
+    def trace(self):
+        t0 = min((e[2] for e in self.events), default=0)
+        pid = os.getpid()
+        return [{
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': 1e-3*(start - t0),
+            'dur': 1e-3*(end - start),
+            'pid': pid,
+            'tid': tid,
+        } for name, category, start, end, tid in self.events]
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.trace(), 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self, n=20):
+        totals = sorted(self.summary().items(), key=lambda x: -x[1][0])
+        for name, (total, count) in totals[:n]:
+            print("  %-36s %8.2f ms %8d calls" % (name, 1e3*total, count))
+
+profiler = Profiler()
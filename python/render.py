@@ -0,0 +1,349 @@
+import precision
+import os
+import json
+import argparse
+import numpy as np
+import cairo
+
+from misc import *
+from draw import *
+from path import *
+from scenes import registry
+from parallel import parallel_map
+from solver import newton_solver
+from manifolds import BezierCurve
+
+# Headless frame / animation export. A track file (JSON) describes the scene, the mode
+# and a list of keyframes, e.g.
+#
+#   {
+#     "scene": "Bunny", "mode": "sms", "fps": 30, "size": [960, 540],
+#     "options": {"n_bounces": 7, "constraint": "half_vector", "eps": 1e-3},
+#     "keyframes": [{"time": 0.0, "spec_u": 0.1, "zoom": 0.75},
+#                   {"time": 4.0, "spec_u": 0.9, "zoom": 0.9, "offset": [0, -0.9]}]
+#   }
+#
+# Keyframe values are linearly interpolated, parameters that never appear keep the
+# scene defaults. Frames are drawn with cairo (software rasterizer, no window or GPU
+# needed) through an adapter for the subset of the nanovg API used by `draw.py`, and
+# are rendered in parallel across processes.
+
+ANIMATED_PARAMETERS = ['start_u', 'start_angle', 'end_u', 'spec_u', 'zoom', 'offset']
+
+DEFAULT_OPTIONS = {
+    'n_bounces': None,          # Scene default if not set
+    'strategy': 'sms',          # 'sms' or 'mnee'
+    'constraint': 'half_vector',# 'half_vector' or 'angle_difference'
+    'max_steps': 20,
+    'eps': 1e-3,
+    'step_scale': 1.0,
+    'n_paths': 10,              # Number of sampled paths in 'sms_sampling' mode
+    'show_seeds': True,
+    'show_normals': True,
+    'seed': 0,
+}
+
+BACKGROUND_COLOR = (200/255, 200/255, 200/255)
+
+def color_rgba(color):
+    # nanovg colors (as returned by nvg.RGB) or plain (r, g, b[, a]) tuples in [0, 1]
+    if hasattr(color, 'r'):
+        return color.r, color.g, color.b, color.a
+    color = tuple(color)
+    return color if len(color) == 4 else color + (1.0,)
+
+class CairoContext:
+    # Minimal nanovg style drawing context on top of a cairo surface. Like nanovg,
+    # fill and stroke keep the current path, and colors / stroke width are part of
+    # the state saved by Save().
+    def __init__(self, surface):
+        self.cr = cairo.Context(surface)
+        self.state = { 'fill': (1, 1, 1, 1), 'stroke': (0, 0, 0, 1), 'width': 1.0 }
+        self.stack = []
+
+    def Save(self):
+        self.cr.save()
+        self.stack.append(dict(self.state))
+
+    def Restore(self):
+        self.cr.restore()
+        self.state = self.stack.pop()
+
+    def ResetTransform(self):
+        self.cr.identity_matrix()
+
+    def Scale(self, x, y):
+        self.cr.scale(x, y)
+
+    def Translate(self, x, y):
+        self.cr.translate(x, y)
+
+    def Rotate(self, angle):
+        self.cr.rotate(angle)
+
+    def FillColor(self, color):
+        self.state['fill'] = color_rgba(color)
+
+    def StrokeColor(self, color):
+        self.state['stroke'] = color_rgba(color)
+
+    def StrokeWidth(self, width):
+        self.state['width'] = width
+
+    def BeginPath(self):
+        self.cr.new_path()
+
+    def MoveTo(self, x, y):
+        self.cr.move_to(x, y)
+
+    def LineTo(self, x, y):
+        self.cr.line_to(x, y)
+
+    def BezierTo(self, c1x, c1y, c2x, c2y, x, y):
+        self.cr.curve_to(c1x, c1y, c2x, c2y, x, y)
+
+    def ArcTo(self, x1, y1, x2, y2, radius):
+        # Corner rounding is below pixel size for the arrow heads drawn with it
+        self.cr.line_to(x1, y1)
+        self.cr.line_to(x2, y2)
+
+    def Arc(self, cx, cy, r, a0, a1, direction):
+        if direction == nvg.NVGwinding.CCW:
+            self.cr.arc_negative(cx, cy, r, a0, a1)
+        else:
+            self.cr.arc(cx, cy, r, a0, a1)
+
+    def Circle(self, cx, cy, r):
+        self.cr.new_sub_path()
+        self.cr.arc(cx, cy, r, 0, 2*np.pi)
+        self.cr.close_path()
+
+    def Rect(self, x, y, w, h):
+        self.cr.rectangle(x, y, w, h)
+
+    def ClosePath(self):
+        self.cr.close_path()
+
+    def PathWinding(self, winding):
+        pass
+
+    def Fill(self):
+        self.cr.set_source_rgba(*self.state['fill'])
+        self.cr.fill_preserve()
+
+    def Stroke(self):
+        self.cr.set_source_rgba(*self.state['stroke'])
+        self.cr.set_line_width(self.state['width'])
+        self.cr.stroke_preserve()
+
+SHAPE_COLORS = {
+    Shape.Type.Reflection: nvg.RGB(240, 200, 91),
+    Shape.Type.Refraction: nvg.RGBA(128, 200, 255, 128),
+    Shape.Type.Emitter:    nvg.RGB(255, 255, 180),
+}
+
+def draw_shape_outline(ctx, shape, samples=100):
+    if isinstance(shape, BezierCurve):
+        pts = shape.control_points
+        ctx.MoveTo(*pts[0])
+        for k in range(0, len(pts), 4):
+            ctx.BezierTo(*pts[k+1], *pts[k+2], *pts[k+3])
+    else:
+        pts = [shape.sample_position(t).p for t in np.linspace(0, 1, samples)]
+        ctx.MoveTo(*pts[0])
+        for p in pts[1:]:
+            ctx.LineTo(*p)
+
+def draw_scene_shapes(ctx, scene, band=0.05):
+    # Python version of the C++ `Scene.draw`, which needs a nanovg context. Closed shapes
+    # are filled (with their holes), open ones get a filled band behind their surface.
+    holes = {}
+    for shape in scene.shapes:
+        if shape.hole:
+            holes.setdefault(shape.parent, []).append(shape)
+
+    for shape in scene.shapes:
+        if not shape.visible or shape.hole:
+            continue
+
+        ctx.Save()
+        ctx.FillColor(SHAPE_COLORS.get(shape.type, nvg.RGB(120, 120, 120)))
+        ctx.StrokeColor(nvg.RGB(0, 0, 0))
+        ctx.StrokeWidth(0.007)
+        ctx.BeginPath()
+        if isinstance(shape, (BezierCurve, Circle)):
+            # Holes are cut out with the even-odd rule, everything else uses nonzero
+            # winding like nanovg (restored by `Restore`)
+            ctx.cr.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
+            draw_shape_outline(ctx, shape)
+            ctx.ClosePath()
+            for hole in holes.get(shape.name, []):
+                draw_shape_outline(ctx, hole)
+                ctx.ClosePath()
+            ctx.Fill()
+            ctx.Stroke()
+        else:
+            its = [shape.sample_position(t) for t in np.linspace(0, 1, 100)]
+            ctx.MoveTo(*its[0].p)
+            for it in its[1:]:
+                ctx.LineTo(*it.p)
+            for it in reversed(its):
+                ctx.LineTo(*(it.p - band*it.n))
+            ctx.ClosePath()
+            ctx.Fill()
+            ctx.BeginPath()
+            draw_shape_outline(ctx, shape)
+            ctx.Stroke()
+        ctx.Restore()
+
+    for p, n in scene.emitter_arrows():
+        draw_arrow(ctx, p, n, nvg.RGB(255, 255, 180), scale=0.5, length=0.03)
+
+def keyframe_value(keyframes, name, time, default):
+    frames = [k for k in keyframes if name in k]
+    if len(frames) == 0:
+        return default
+    frames.sort(key=lambda k: k['time'])
+    if time <= frames[0]['time']:
+        return frames[0][name]
+    for k0, k1 in zip(frames[:-1], frames[1:]):
+        if time <= k1['time']:
+            t = (time - k0['time']) / max(k1['time'] - k0['time'], 1e-8)
+            return lerp(t, np.array(k0[name], dtype=float), np.array(k1[name], dtype=float))
+    return frames[-1][name]
+
+def track_duration(track):
+    return max(k['time'] for k in track['keyframes'])
+
+def n_frames(track):
+    return int(round(track_duration(track) * track.get('fps', 30))) + 1
+
+def apply_keyframes(scene, track, time):
+    keyframes = track['keyframes']
+    scene.start_u_current     = keyframe_value(keyframes, 'start_u', time, scene.start_u_default)
+    scene.start_angle_current = keyframe_value(keyframes, 'start_angle', time, scene.start_angle_default)
+    scene.end_u_current       = keyframe_value(keyframes, 'end_u', time, scene.end_u_default)
+    scene.spec_u_current      = keyframe_value(keyframes, 'spec_u', time, scene.spec_u_default)
+    zoom   = keyframe_value(keyframes, 'zoom', time, scene.zoom)
+    offset = keyframe_value(keyframes, 'offset', time, scene.offset)
+    return float(zoom), np.array(offset, dtype=float)
+
+def solve(scene, seed_path, options):
+    constraint = ConstraintType.AngleDifference if options['constraint'] == 'angle_difference' else ConstraintType.HalfVector
+    return newton_solver(scene, seed_path, constraint, options['n_bounces'], options['max_steps'],
+                         options['eps'], options['step_scale'])
+
+def draw_raytracing(ctx, scene, options, rng):
+    s = scene.scale
+    path = scene.sample_path()
+    draw_path_lines(ctx, path, '', s)
+    draw_scene_shapes(ctx, scene)
+    if options['show_normals']:
+        draw_path_normals(ctx, path, scale=s)
+    draw_path_vertices(ctx, path, '', s)
+
+def draw_sms(ctx, scene, options, rng):
+    s = scene.scale
+    if options['strategy'] == 'mnee':
+        seed_path = scene.sample_mnee_seed_path()
+    else:
+        seed_path = scene.sample_seed_path(options['n_bounces'])
+    solution_path = None
+    if seed_path.has_specular_segment():
+        solution_path = solve(scene, seed_path, options).solution_path
+
+    draw_dotted_path_lines(ctx, seed_path, s, spacing=0.02)
+    if solution_path:
+        draw_path_lines(ctx, solution_path, '', s)
+    draw_scene_shapes(ctx, scene)
+    if options['show_normals']:
+        draw_path_normals(ctx, seed_path, scale=s)
+    draw_path_vertices(ctx, seed_path, '', s)
+    if solution_path:
+        draw_path_vertices(ctx, solution_path, '', s)
+
+def draw_sms_sampling(ctx, scene, options, rng):
+    s = scene.scale
+    spec_u_current = scene.spec_u_current
+    seed_paths, solution_paths = [], []
+    for k in range(options['n_paths']):
+        scene.spec_u_current = rng.uniform()
+        seed_path = scene.sample_seed_path(options['n_bounces'])
+        seed_paths.append(seed_path)
+        if seed_path.has_specular_segment():
+            solution_path = solve(scene, seed_path, options).solution_path
+            if solution_path:
+                solution_paths.append(solution_path)
+    scene.spec_u_current = spec_u_current
+
+    if options['show_seeds']:
+        draw_dotted_path_lines_batch(ctx, seed_paths, 0.6*s, spacing=0.02)
+    draw_path_lines_batch(ctx, solution_paths, '', s)
+    draw_scene_shapes(ctx, scene)
+    draw_path_vertices_batch(ctx, solution_paths, '', s)
+
+MODES = {
+    'raytracing': draw_raytracing,
+    'sms': draw_sms,
+    'sms_sampling': draw_sms_sampling,
+}
+
+def render_frame(track, frame, output_dir):
+    scene = registry.get(track['scene'])
+    options = dict(DEFAULT_OPTIONS, **track.get('options', {}))
+    if options['n_bounces'] is None:
+        options['n_bounces'] = scene.n_bounces_default
+
+    time = frame / track.get('fps', 30)
+    zoom, offset = apply_keyframes(scene, track, time)
+
+    width, height = track.get('size', [960, 540])
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = CairoContext(surface)
+    ctx.cr.set_source_rgb(*BACKGROUND_COLOR)
+    ctx.cr.paint()
+
+    # Same view transform as the viewer
+    aspect = height / width
+    ctx.Scale(width, width)
+    ctx.Translate(+0.5, +0.5*aspect)
+    ctx.Scale(0.5, -0.5)
+    ctx.Scale(zoom, zoom)
+    ctx.Translate(offset[0], offset[1])
+
+    rng = np.random.RandomState(options['seed'] + frame)
+    MODES[track.get('mode', 'sms')](ctx, scene, options, rng)
+
+    filename = os.path.join(output_dir, "frame_%05d.png" % frame)
+    surface.write_to_png(filename)
+    return filename
+
+def render_frame_worker(args):
+    return render_frame(*args)
+
+def render_track(track, output_dir, processes=None, frames=None):
+    os.makedirs(output_dir, exist_ok=True)
+    if frames is None:
+        frames = range(n_frames(track))
+    jobs = [(track, frame, output_dir) for frame in frames]
+    return parallel_map(render_frame_worker, jobs, processes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a parameter track to PNG frames without a window")
+    parser.add_argument('track', help="track description (JSON)")
+    parser.add_argument('-o', '--output', default='frames', help="output directory")
+    parser.add_argument('-j', '--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--frame', type=int, default=None, help="only render a single frame")
+    parser.add_argument('--double', action='store_true', help="use the double precision library")
+    args = parser.parse_args()
+
+    with open(args.track) as f:
+        track = json.load(f)
+    if track.get('mode', 'sms') not in MODES:
+        parser.error("unknown mode '%s', expected one of: %s" % (track['mode'], ", ".join(MODES.keys())))
+    if track['scene'] not in registry.names():
+        parser.error("unknown scene '%s'" % track['scene'])
+
+    frames = None if args.frame is None else [args.frame]
+    filenames = render_track(track, args.output, args.processes, frames)
+    print("Rendered %d frame(s) to '%s'" % (len(filenames), args.output))
@@ -0,0 +1,164 @@
+import time
+import numpy as np
+from misc import *
+from path import *
+from solver import newton_solver
+from parallel import parallel_map, scene_state, worker_scene
+
+# Glints on rough specular surfaces: the normals of all specular vertices of a seed path
+# are perturbed by slopes drawn from a microfacet distribution (stored as
+# `Interaction.n_offset`) and the perturbed path is solved with Newton's method.
+#
+# In flatland only the 1D slope marginal of the distributions matters:
+#   Beckmann:  p(x) = 1/(alpha sqrt(pi)) exp(-x^2/alpha^2), i.e. normal with sigma = alpha/sqrt(2)
+#   GGX:       p(x) = 1/(2 alpha) (1 + x^2/alpha^2)^(-3/2)
+
+def sample_slopes_beckmann(alpha, size, rng):
+    return rng.normal(0, alpha / np.sqrt(2), size=size)
+
+def sample_slopes_ggx(alpha, size, rng):
+    # Inverse of the CDF 1/2 (1 + t/sqrt(1 + t^2)), t = x/alpha
+    s = rng.uniform(-1, 1, size=size)
+    return alpha * s / np.sqrt(np.maximum(1 - s*s, 1e-12))
+
+SLOPE_DISTRIBUTIONS = {
+    'beckmann': sample_slopes_beckmann,
+    'ggx': sample_slopes_ggx,
+}
+
+def sample_slopes(distribution, alpha, size, rng=np.random):
+    if distribution not in SLOPE_DISTRIBUTIONS:
+        raise ValueError("sample_slopes(): unknown distribution '%s'" % distribution)
+    return SLOPE_DISTRIBUTIONS[distribution](alpha, size, rng)
+
+def slope_offsets(slopes):
+    # Slopes (any shape) to normalized `n_offset` vectors (shape + (2,)) in the local (s, n) frame
+    offsets = np.stack([-slopes, np.ones_like(slopes)], axis=-1)
+    return offsets / np.sqrt(1 + slopes*slopes)[..., None]
+
+class RoughResult:
+    def __init__(self, n_samples, n_vertices):
+        self.success = np.zeros(n_samples, dtype=bool)
+        self.iterations = np.zeros(n_samples, dtype=np.int32)
+        self.u = np.full((n_samples, n_vertices), np.nan)       # Vertex parameters of the solutions
+        self.offsets = np.zeros((n_samples, n_vertices, 2))     # Normal offsets of all vertices
+        self.shape_ids = []                                     # Shapes along the seed path
+        self.time = 0.0
+
+    def convergence_rate(self):
+        return np.mean(self.success) if len(self.success) > 0 else 0.0
+
+    def histogram(self, n_bins=64, vertex=1):
+        # Distribution of the converged solutions over the parameter of one vertex
+        u = self.u[self.success, vertex]
+        return np.histogram(u, bins=n_bins, range=(0, 1))
+
+    def footprint(self, scene, vertex=1, coverage=0.95):
+        # Center and world space extent of the central `coverage` fraction of solutions
+        u = self.u[self.success, vertex]
+        if len(u) == 0:
+            return None, 0.0
+        shape = scene.shapes[self.shape_ids[vertex]]
+        lo, mid, hi = np.quantile(u, [0.5 - 0.5*coverage, 0.5, 0.5 + 0.5*coverage])
+        return shape.sample_position(mid).p, norm(shape.sample_position(hi).p - shape.sample_position(lo).p)
+
+    def paths(self, scene, max_paths=None):
+        # Rebuild converged paths from the vertex parameters
+        paths = []
+        for k in np.where(self.success)[0][:max_paths]:
+            path = Path()
+            for i, shape_id in enumerate(self.shape_ids):
+                it = scene.shapes[shape_id].sample_position(self.u[k, i])
+                it.eta = it.shape.eta
+                it.n_offset = self.offsets[k, i]
+                path.append(it)
+            paths.append(path)
+        return paths
+
+def seed_path(scene, strategy_type, n_bounces):
+    if strategy_type == StrategyType.MNEE:
+        return scene.sample_mnee_seed_path()
+    return scene.sample_seed_path(n_bounces)
+
+def solve_rough_batch(scene, path, offsets, constraint_type, n_bounces, max_steps, eps, step_scale=1.0):
+    # Newton solves for a batch of normal offsets, (N, len(path), 2)
+    success = np.zeros(len(offsets), dtype=bool)
+    iterations = np.zeros(len(offsets), dtype=np.int32)
+    u = np.full((len(offsets), len(path)), np.nan)
+    for k in range(len(offsets)):
+        perturbed_path = path.copy()
+        for i, vtx in enumerate(perturbed_path):
+            vtx.n_offset = offsets[k, i]
+        result = newton_solver(scene, perturbed_path, constraint_type, n_bounces, max_steps, eps, step_scale)
+        iterations[k] = result.iterations
+        if result.success:
+            success[k] = True
+            u[k] = [vtx.u for vtx in result.solution_path]
+    return success, iterations, u
+
+def rough_batch(job):
+    name, state, offsets, options = job
+    scene = worker_scene(name, state)
+    path = seed_path(scene, StrategyType(options['strategy_type']), options['n_bounces'])
+    return solve_rough_batch(scene, path, offsets, ConstraintType(options['constraint_type']),
+                             options['n_bounces'], options['max_steps'], options['eps'], options['step_scale'])
+
+def rough_sample(scene, n_samples, alpha, distribution='beckmann', strategy_type=StrategyType.SMS,
+                 constraint_type=ConstraintType.HalfVector, n_bounces=None, max_steps=20, eps=1e-5,
+                 step_scale=1.0, batch_size=256, processes=1, rng=np.random):
+    # Solve `n_samples` perturbed versions of the scene's current seed path. All slopes
+    # are drawn up front, batches of `batch_size` samples are solved on the process pool.
+    # Batches only group samples into pool jobs, each sample is still its own Newton solve.
+    if n_bounces is None:
+        n_bounces = scene.n_bounces_default
+    path = seed_path(scene, strategy_type, n_bounces)
+    result = RoughResult(n_samples, len(path))
+    result.shape_ids = [vtx.shape.id for vtx in path]
+    if not path.has_specular_segment():
+        return result
+
+    specular = np.array([vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction
+                         for vtx in path])
+    result.offsets[:] = (0, 1)
+    result.offsets[:, specular] = slope_offsets(sample_slopes(distribution, alpha, (n_samples, np.sum(specular)), rng))
+
+    options = {
+        'strategy_type': int(strategy_type),
+        'constraint_type': int(constraint_type),
+        'n_bounces': n_bounces,
+        'max_steps': max_steps,
+        'eps': eps,
+        'step_scale': step_scale,
+    }
+    state = scene_state(scene)
+    jobs = [(scene.name, state, result.offsets[k:k + batch_size], options) for k in range(0, n_samples, batch_size)]
+
+    start = time.perf_counter()
+    for k, (success, iterations, u) in enumerate(parallel_map(rough_batch, jobs, processes)):
+        batch = slice(k*batch_size, k*batch_size + len(success))
+        result.success[batch] = success
+        result.iterations[batch] = iterations
+        result.u[batch] = u
+    result.time = time.perf_counter() - start
+    return result
+
+if __name__ == "__main__":
+    import argparse
+    from scenes import registry
+
+    parser = argparse.ArgumentParser(description="Rough specular glint sampling")
+    parser.add_argument('scene', help="scene name")
+    parser.add_argument('-n', '--samples', type=int, default=10000, help="number of normal samples")
+    parser.add_argument('-a', '--alpha', type=float, default=0.1, help="roughness")
+    parser.add_argument('-d', '--distribution', default='beckmann', help="one of: %s" % ", ".join(SLOPE_DISTRIBUTIONS.keys()))
+    parser.add_argument('-j', '--processes', type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+    if args.distribution not in SLOPE_DISTRIBUTIONS:
+        parser.error("unknown distribution '%s'" % args.distribution)
+
+    scene = registry.get(args.scene)
+    result = rough_sample(scene, args.samples, args.alpha, args.distribution, processes=args.processes)
+    center, extent = result.footprint(scene)
+    print("%d samples in %.2f s, %.1f%% converged" % (args.samples, result.time, 100*result.convergence_rate()))
+    if center is not None:
+        print("Glint footprint: center (%.4f, %.4f), extent %.4f" % (center[0], center[1], extent))
@@ -1,10 +1,11 @@
 import numpy as np
 import manifolds
 from manifolds import Scene as CppScene
-from manifolds import Ray2f, Shape
+from manifolds import Ray2f, Shape, BezierCurve
 from misc import *
-from path import Path
+from path import Path, PathBatch, InteractionSubset
 from draw import *
+from frame_stats import counters
 
 class Scene:
     def __init__(self, shapes):
@@ -23,6 +24,9 @@ class Scene:
         self.spec_u_current = 0
         self.n_bounces_default = 1
 
+        self.emitter_arrows_cache = None
+        self.layer = None           # SceneLayer with the shapes already drawn, set by the viewer
+
         self.cpp_scene = CppScene()
 
         shape_id = 0
@@ -42,6 +46,12 @@ class Scene:
         self.end_u_current = end_u
         self.spec_u_current = spec_u
 
+    def set_exact_bezier_intersection(self, exact):
+        # Closed-form instead of polyline based ray intersections for all Bezier curves
+        for shape in self.shapes:
+            if isinstance(shape, BezierCurve):
+                shape.exact_intersection = exact
+
     def start_shape(self):
         return self.cpp_scene.start_shape()
 
@@ -51,17 +61,32 @@ class Scene:
     def first_specular_shape(self):
         return self.cpp_scene.first_specular_shape()
 
+    def emitter_arrows(self):
+        # Scene geometry is static, so emitter positions are only sampled once
+        if self.emitter_arrows_cache is None:
+            self.emitter_arrows_cache = []
+            for shape in self.shapes:
+                if shape.type == Shape.Type.Emitter:
+                    for t in np.linspace(0, 1, 10):
+                        it = shape.sample_position(t)
+                        self.emitter_arrows_cache.append((it.p, it.n))
+        return self.emitter_arrows_cache
+
     def draw(self, ctx):
-        for shape in self.shapes:
-            if shape.type == Shape.Type.Emitter:
-                for t in np.linspace(0, 1, 10):
-                    it = shape.sample_position(t)
-                    draw_arrow(ctx, it.p, it.n, nvg.RGB(255, 255, 180), scale=0.5, length=0.03)
+        if self.layer is not None and self.layer.valid(self):
+            self.layer.draw(ctx)
+        else:
+            self.draw_shapes(ctx)
+
+    def draw_shapes(self, ctx):
+        for p, n in self.emitter_arrows():
+            draw_arrow(ctx, p, n, nvg.RGB(255, 255, 180), scale=0.5, length=0.03)
 
         self.cpp_scene.draw(ctx)
 
     def ray_intersect(self, ray):
         # Trace ray against C++ representation
+        counters.rays += 1
         it = self.cpp_scene.ray_intersect(ray)
 
         if it.is_valid():
@@ -72,6 +97,11 @@ class Scene:
 
         return it
 
+    def ray_intersect_batch(self, o, d):
+        # Trace N rays (given as (N, 2) arrays) in SIMD packets, IOR is already filled in
+        counters.rays += len(o)
+        return self.cpp_scene.ray_intersect_batch(o, d)
+
     def sample_start_position(self, u):
         it = self.cpp_scene.start_shape().sample_position(u)
         it.eta = it.shape.eta
@@ -126,19 +156,23 @@ class Scene:
         return path
 
     def sample_seed_path(self, n_spec_bounces=1):
+        it2 = self.sample_spec_position(self.spec_u_current)
+        return self.trace_seed_path(it2.p, it2.shape, n_spec_bounces)
+
+    def trace_seed_path(self, p_spec, spec_shape, n_spec_bounces=1):
+        # Seed path from the current start position towards `p_spec` (which has to be
+        # directly visible on `spec_shape`), traced through `n_spec_bounces` interactions
         path = Path()
 
         it1 = self.sample_start_position(self.start_u_current)
-        it2 = self.sample_spec_position(self.spec_u_current)
-        wo = normalize(it2.p - it1.p)
+        wo = normalize(p_spec - it1.p)
         if wo @ it1.n < 0.0:
             return path
 
         ray = Ray2f(it1.p, wo)
         it = self.ray_intersect(ray)
-        if not it.is_valid() or (it.shape != it2.shape):
+        if not it.is_valid() or (it.shape.id != spec_shape.id):
             return path
-        it2 = it
 
         path.append(it1)
         path.append(it)
@@ -258,7 +292,7 @@ class Scene:
 
         ray = Ray2f(p1, wo)
         it2 = self.ray_intersect(ray)
-        if it2.shape.id != self.cpp_scene.first_specular_shape().id:
+        if it2.shape.id != previous_path.vertices[1].shape.id:
             return path
         it2.n_offset = previous_path.vertices[1].n_offset
 
@@ -302,4 +336,174 @@ class Scene:
         if len(path) != n_spec_bounces + 2:
             return Path()
 
-        return path
\ No newline at end of file
+        return path
+
+    # Batched versions of the seed path sampling and SMS reprojection above. All live
+    # paths are advanced by one bounce per step with a single ray query, so the number
+    # of native calls only depends on the path length.
+
+    def shape_types(self, shape_id):
+        # Shape types (as int) for an array of shape ids, -1 for invalid interactions
+        types = np.array([int(s.type) for s in self.shapes])[np.maximum(shape_id, 0)]
+        types[shape_id < 0] = -1
+        return types
+
+    def scatter_batch(self, its, wi, n_offset=None):
+        # Outgoing directions at specular interactions (InteractionBatch), with the same
+        # rules as the single path tracing code. Returns (valid, wo).
+        types = self.shape_types(its.shape_id)
+        n, s = its.n, its.s
+        m = n if n_offset is None else s*col(n_offset[:, 0]) + n*col(n_offset[:, 1])
+
+        valid = np.zeros(len(wi), dtype=bool)
+        wo = np.zeros_like(wi)
+        refl = types == int(Shape.Type.Reflection)
+        valid[refl] = dot(wi[refl], n[refl]) >= 0
+        wo[refl] = reflect(wi[refl], m[refl])[1]
+        refr = types == int(Shape.Type.Refraction)
+        valid[refr], wo[refr] = refract(wi[refr], m[refr], its.eta[refr])
+        return valid, wo
+
+    def is_specular_batch(self, its):
+        types = self.shape_types(its.shape_id)
+        return (types == int(Shape.Type.Reflection)) | (types == int(Shape.Type.Refraction))
+
+    def trace_specular_chain_batch(self, batch, rows, its, wo, n_spec_bounces, previous=None):
+        # Continue paths `rows` whose vertex 1 is `its` (reached via direction `wo`)
+        # through further specular interactions, until they have `n_spec_bounces`.
+        # Normal offsets are taken from the `previous` PathBatch if given.
+        for k in range(2, n_spec_bounces + 1):
+            n_offset = previous.n_offset[rows, k-1] if previous is not None else None
+            valid, wo = self.scatter_batch(its, -wo, n_offset)
+            rows, wo, o = rows[valid], wo[valid], its.p[valid]
+            if len(rows) == 0:
+                break
+            its = self.ray_intersect_batch(o, wo)
+            valid = self.is_specular_batch(its)
+            if previous is not None:
+                valid &= previous.length[rows] > k
+            rows, wo = rows[valid], wo[valid]
+            its = InteractionSubset(its, valid)
+            batch.set_vertex(k, rows, its, previous.n_offset[rows, k] if previous is not None else None)
+        return rows
+
+    def sample_seed_path_batch(self, spec_u, n_spec_bounces=1, start_u=None, end_u=None):
+        # Seed paths for an array of first specular vertex parameters (`spec_u`), start
+        # and end parameters default to the current ones
+        spec_u = np.atleast_1d(np.asarray(spec_u, dtype=float))
+        N = len(spec_u)
+        start_u = np.broadcast_to(self.start_u_current if start_u is None else start_u, (N,))
+        end_u = np.broadcast_to(self.end_u_current if end_u is None else end_u, (N,))
+        batch = PathBatch(N, n_spec_bounces + 2)
+
+        it1 = self.cpp_scene.start_shape().sample_position_batch(start_u)
+        it2 = self.cpp_scene.first_specular_shape().sample_position_batch(spec_u)
+        wo = normalize(it2.p - it1.p)
+        rows = np.where(dot(wo, it1.n) >= 0)[0]
+        batch.set_vertex(0, rows, InteractionSubset(it1, rows))
+
+        its = self.ray_intersect_batch(it1.p[rows], wo[rows])
+        valid = its.shape_id == self.cpp_scene.first_specular_shape().id
+        rows, wo = rows[valid], wo[rows][valid]
+        its = InteractionSubset(its, valid)
+        batch.set_vertex(1, rows, its)
+
+        rows = self.trace_specular_chain_batch(batch, rows, its, wo, n_spec_bounces)
+        self.finish_batch(batch, rows, end_u, n_spec_bounces + 1)
+        return batch
+
+    def sample_mnee_seed_path_batch(self, start_u=None, end_u=None, max_bounces=16):
+        # Straight line MNEE seeds through refractive shapes, for arrays of start and end parameters
+        start_u = np.atleast_1d(self.start_u_current if start_u is None else start_u).astype(float)
+        end_u = np.atleast_1d(self.end_u_current if end_u is None else end_u).astype(float)
+        start_u, end_u = np.broadcast_arrays(start_u, end_u)
+        N = len(start_u)
+        batch = PathBatch(N, max_bounces + 2)
+
+        it1 = self.cpp_scene.start_shape().sample_position_batch(start_u)
+        it3 = self.cpp_scene.end_shape().sample_position_batch(end_u)
+        wo = normalize(it3.p - it1.p)
+        rows = np.where(dot(wo, it1.n) >= 0)[0]
+        batch.set_vertex(0, rows, InteractionSubset(it1, rows))
+        done = [rows[:0]]
+
+        o, wo = it1.p[rows], wo[rows]
+        for k in range(1, max_bounces + 1):
+            if len(rows) == 0:
+                break
+            its = self.ray_intersect_batch(o, wo)
+            refr = self.shape_types(its.shape_id) == int(Shape.Type.Refraction)
+            done.append(rows[~refr])
+            rows, wo = rows[refr], wo[refr]
+            its = InteractionSubset(its, refr)
+            batch.set_vertex(k, rows, its)
+            o = its.p
+        done.append(rows)
+
+        # Paths with different numbers of refractions get the end vertex at different indices
+        rows = np.sort(np.concatenate(done))
+        for k in np.unique(batch.length[rows]):
+            sub = rows[batch.length[rows] == k]
+            self.finish_batch(batch, sub, end_u, k)
+        return batch
+
+    def reproject_path_sms_batch(self, offset_vertices, previous, n_spec_bounces=1, end_u=None):
+        # `reproject_path_sms` for N sets of offset positions, (N, K, 2), and the
+        # corresponding previous paths as PathBatch
+        offset_vertices = np.asarray(offset_vertices)
+        N = len(offset_vertices)
+        end_u = np.broadcast_to(self.end_u_current if end_u is None else end_u, (N,))
+        batch = PathBatch(N, n_spec_bounces + 2)
+
+        p1, p2 = offset_vertices[:, 0], offset_vertices[:, 1]
+        start_shape = self.cpp_scene.start_shape()
+        it1 = start_shape.sample_position_batch(start_shape.project_batch(p1))
+        wo = normalize(p2 - p1)
+        rows = np.where(previous.valid & (dot(wo, it1.n) >= 0))[0]
+        batch.set_vertex(0, rows, InteractionSubset(it1, rows))
+
+        its = self.ray_intersect_batch(p1[rows], wo[rows])
+        valid = its.shape_id == previous.shape_id[rows, 1]
+        rows, wo = rows[valid], wo[rows][valid]
+        its = InteractionSubset(its, valid)
+        batch.set_vertex(1, rows, its, previous.n_offset[rows, 1])
+
+        rows = self.trace_specular_chain_batch(batch, rows, its, wo, n_spec_bounces, previous)
+        self.finish_batch(batch, rows, end_u, n_spec_bounces + 1)
+        return batch
+
+    def reproject_path_me_batch(self, offset_vertices, max_vertices=32):
+        # `reproject_path_me` for N sets of offset positions, (N, K, 2). Paths are valid
+        # if they end on a non-specular shape (or fail to scatter) within `max_vertices`.
+        offset_vertices = np.asarray(offset_vertices)
+        N = len(offset_vertices)
+        batch = PathBatch(N, max_vertices)
+
+        p0, p1 = offset_vertices[:, 0], offset_vertices[:, 1]
+        start_shape = self.cpp_scene.start_shape()
+        its = start_shape.sample_position_batch(start_shape.project_batch(p0))
+        rows = np.arange(N)
+        batch.set_vertex(0, rows, its)
+
+        o, wo = its.p, normalize(p1 - p0)
+        for k in range(1, max_vertices):
+            if len(rows) == 0:
+                break
+            its = self.ray_intersect_batch(o, wo)
+            hit = its.shape_id >= 0
+            rows, wo = rows[hit], wo[hit]
+            its = InteractionSubset(its, hit)
+            batch.set_vertex(k, rows, its)
+
+            valid, wo = self.scatter_batch(its, -wo)
+            batch.valid[rows[~valid]] = True
+            rows, wo, o = rows[valid], wo[valid], its.p[valid]
+        return batch
+
+    def finish_batch(self, batch, rows, end_u, k):
+        # Add the end vertex at index `k` to paths `rows` and mark them as valid
+        if len(rows) == 0:
+            return
+        its = self.cpp_scene.end_shape().sample_position_batch(end_u[rows])
+        batch.set_vertex(k, rows, its)
+        batch.valid[rows] = True
@@ -0,0 +1,283 @@
+import sys
+import numpy as np
+from scene import Scene
+from manifolds import BezierCurve, Circle, ConcaveSegment, ConvexSegment, LinearSegment, Shape
+
+# Binary scene file (little endian, all sections 16 byte aligned):
+#
+#   header       SCENE_FILE_HEADER
+#   scene table  n_scenes x SCENE_DTYPE
+#   shape table  n_shapes x SHAPE_DTYPE
+#   points       n_points x 2 float32, control points of all Bezier curves
+#
+# Each scene references a contiguous range of the shape table, each Bezier curve a
+# contiguous range of the point block. The file is memory-mapped when loading, so
+# control points are handed to the C++ shapes without going through Python lists.
+
+SCENE_FILE_MAGIC   = b'MFLD'
+SCENE_FILE_VERSION = 1
+
+SCENE_FILE_HEADER = np.dtype([
+    ('magic',    'S4'),
+    ('version',  '<u4'),
+    ('n_scenes', '<u4'),
+    ('n_shapes', '<u4'),
+    ('n_points', '<u4'),
+    ('pad',      '<u4', 3),
+])
+
+SCENE_DTYPE = np.dtype([
+    ('name',        'S64'),
+    ('first_shape', '<u4'),
+    ('n_shapes',    '<u4'),
+    ('start_u',     '<f4'),
+    ('start_angle', '<f4'),
+    ('end_u',       '<f4'),
+    ('spec_u',      '<f4'),
+    ('offset',      '<f4', 2),
+    ('zoom',        '<f4'),
+    ('scale',       '<f4'),
+    ('n_bounces',   '<u4'),
+    ('pad',         '<u4'),
+])
+
+SHAPE_DTYPE = np.dtype([
+    ('kind',           'u1'),
+    ('type',           'u1'),
+    ('flags',          '<u2'),
+    ('first_point',    '<u4'),
+    ('n_points',       '<u4'),
+    ('eta',            '<f4'),
+    ('params',         '<f4', 6),
+    ('gradient_start', '<f4'),
+    ('gradient_width', '<f4'),
+    ('height',         '<f4'),
+    ('pad',            '<u4'),
+    ('name',           'S32'),
+    ('parent',         'S32'),
+])
+
+# Shape kinds
+KIND_LINEAR_SEGMENT  = 0
+KIND_CIRCLE          = 1
+KIND_CONVEX_SEGMENT  = 2
+KIND_CONCAVE_SEGMENT = 3
+KIND_BEZIER_CURVE    = 4
+
+# Shape flags
+FLAG_START          = 1 << 0
+FLAG_END            = 1 << 1
+FLAG_FIRST_SPECULAR = 1 << 2
+FLAG_HOLE           = 1 << 3
+FLAG_VISIBLE        = 1 << 4
+FLAG_ALT            = 1 << 5
+FLAG_FLIPPED        = 1 << 6
+
+FLAG_ATTRIBUTES = [
+    (FLAG_START, 'start'),
+    (FLAG_END, 'end'),
+    (FLAG_FIRST_SPECULAR, 'first_specular'),
+    (FLAG_HOLE, 'hole'),
+    (FLAG_VISIBLE, 'visible'),
+]
+
+def align(offset, alignment=16):
+    return (offset + alignment - 1) // alignment * alignment
+
+def section_offsets(n_scenes, n_shapes):
+    scenes_offset = align(SCENE_FILE_HEADER.itemsize)
+    shapes_offset = align(scenes_offset + n_scenes*SCENE_DTYPE.itemsize)
+    points_offset = align(shapes_offset + n_shapes*SHAPE_DTYPE.itemsize)
+    return scenes_offset, shapes_offset, points_offset
+
+def export_shape(shape, record, points):
+    flags = 0
+    for flag, attribute in FLAG_ATTRIBUTES:
+        if getattr(shape, attribute):
+            flags |= flag
+
+    params = np.zeros(6)
+    if isinstance(shape, BezierCurve):
+        record['kind'] = KIND_BEZIER_CURVE
+        pts = shape.control_points
+        record['first_point'] = sum(len(p) for p in points)
+        record['n_points'] = len(pts)
+        points.append(np.asarray(pts, dtype=np.float32))
+    elif isinstance(shape, Circle):
+        record['kind'] = KIND_CIRCLE
+        params[0:2] = shape.center
+        params[2] = shape.radius
+        if shape.flipped:
+            flags |= FLAG_FLIPPED
+    elif isinstance(shape, ConvexSegment):
+        record['kind'] = KIND_CONVEX_SEGMENT
+        params[0:2] = shape.a
+        params[2:4] = shape.b
+        params[4] = shape.arc_radius
+        if shape.alt:
+            flags |= FLAG_ALT
+    elif isinstance(shape, ConcaveSegment):
+        record['kind'] = KIND_CONCAVE_SEGMENT
+        params[0:2] = shape.a
+        params[2:4] = shape.b
+        params[4] = shape.arc_radius
+    elif isinstance(shape, LinearSegment):
+        record['kind'] = KIND_LINEAR_SEGMENT
+        params[0:2] = shape.a
+        params[2:4] = shape.b
+        record['height'] = shape.height
+    else:
+        raise TypeError("export_shape(): unsupported shape type %s" % type(shape).__name__)
+
+    if hasattr(shape, 'gradient_start'):
+        record['gradient_start'] = shape.gradient_start
+        record['gradient_width'] = shape.gradient_width
+
+    record['type'] = int(shape.type)
+    record['flags'] = flags
+    record['eta'] = shape.eta
+    record['params'] = params
+    record['name'] = shape.name.encode()
+    record['parent'] = shape.parent.encode()
+
+def export_scenes(path, scenes=None):
+    if scenes is None:
+        from scenes import create_scenes
+        scenes = create_scenes()
+
+    n_shapes = sum(len(scene.shapes) for scene in scenes)
+    scene_table = np.zeros(len(scenes), dtype=SCENE_DTYPE)
+    shape_table = np.zeros(n_shapes, dtype=SHAPE_DTYPE)
+    points = []
+
+    shape_idx = 0
+    for k, scene in enumerate(scenes):
+        record = scene_table[k]
+        record['name'] = scene.name.encode()
+        record['first_shape'] = shape_idx
+        record['n_shapes'] = len(scene.shapes)
+        record['start_u'] = scene.start_u_default
+        record['start_angle'] = scene.start_angle_default
+        record['end_u'] = scene.end_u_default
+        record['spec_u'] = scene.spec_u_default
+        record['offset'] = scene.offset
+        record['zoom'] = scene.zoom
+        record['scale'] = scene.scale
+        record['n_bounces'] = scene.n_bounces_default
+        for shape in scene.shapes:
+            export_shape(shape, shape_table[shape_idx], points)
+            shape_idx += 1
+
+    points = np.concatenate(points) if len(points) > 0 else np.zeros((0, 2), dtype=np.float32)
+
+    header = np.zeros(1, dtype=SCENE_FILE_HEADER)
+    header['magic'] = SCENE_FILE_MAGIC
+    header['version'] = SCENE_FILE_VERSION
+    header['n_scenes'] = len(scenes)
+    header['n_shapes'] = n_shapes
+    header['n_points'] = len(points)
+
+    scenes_offset, shapes_offset, points_offset = section_offsets(len(scenes), n_shapes)
+    with open(path, 'wb') as f:
+        for offset, data in [(0, header), (scenes_offset, scene_table),
+                             (shapes_offset, shape_table), (points_offset, points)]:
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data.tobytes())
+
+class SceneFile:
+    # Memory-mapped scene file, scenes are only built when requested
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        header = self.data[:SCENE_FILE_HEADER.itemsize].view(SCENE_FILE_HEADER)[0]
+        if header['magic'] != SCENE_FILE_MAGIC:
+            raise ValueError("SceneFile: '%s' is not a scene file" % path)
+        if header['version'] != SCENE_FILE_VERSION:
+            raise ValueError("SceneFile: unsupported version %d in '%s'" % (header['version'], path))
+
+        n_scenes, n_shapes, n_points = int(header['n_scenes']), int(header['n_shapes']), int(header['n_points'])
+        scenes_offset, shapes_offset, points_offset = section_offsets(n_scenes, n_shapes)
+        self.scenes = self.section(scenes_offset, SCENE_DTYPE, n_scenes)
+        self.shapes = self.section(shapes_offset, SHAPE_DTYPE, n_shapes)
+        self.points = self.section(points_offset, np.dtype('<f4'), 2*n_points).reshape(n_points, 2)
+
+    def section(self, offset, dtype, count):
+        return self.data[offset:offset + count*dtype.itemsize].view(dtype)
+
+    def names(self):
+        return [record['name'].decode() for record in self.scenes]
+
+    def build_shape(self, record):
+        kind = record['kind']
+        params = record['params']
+        if kind == KIND_BEZIER_CURVE:
+            first = record['first_point']
+            shape = BezierCurve(self.points[first:first + record['n_points']])
+        elif kind == KIND_CIRCLE:
+            shape = Circle(params[0:2], params[2])
+            if record['flags'] & FLAG_FLIPPED:
+                shape.flip()
+        elif kind == KIND_CONVEX_SEGMENT:
+            shape = ConvexSegment(params[0:2], params[2:4], params[4], bool(record['flags'] & FLAG_ALT))
+        elif kind == KIND_CONCAVE_SEGMENT:
+            shape = ConcaveSegment(params[0:2], params[2:4], params[4])
+        elif kind == KIND_LINEAR_SEGMENT:
+            shape = LinearSegment(params[0:2], params[2:4])
+            shape.height = record['height']
+        else:
+            raise ValueError("SceneFile: unknown shape kind %d" % kind)
+
+        if hasattr(shape, 'gradient_start'):
+            shape.gradient_start = record['gradient_start']
+            shape.gradient_width = record['gradient_width']
+
+        shape.type = Shape.Type(int(record['type']))
+        shape.eta = record['eta']
+        for flag, attribute in FLAG_ATTRIBUTES:
+            setattr(shape, attribute, bool(record['flags'] & flag))
+        shape.name = record['name'].decode()
+        shape.parent = record['parent'].decode()
+        return shape
+
+    def build(self, idx):
+        record = self.scenes[idx]
+        first = record['first_shape']
+        shapes = [self.build_shape(s) for s in self.shapes[first:first + record['n_shapes']]]
+
+        scene = Scene(shapes)
+        scene.name = record['name'].decode()
+        scene.set_start(record['start_u'], record['start_angle'], record['end_u'], record['spec_u'])
+        scene.offset = list(record['offset'])
+        scene.zoom = record['zoom']
+        scene.scale = record['scale']
+        scene.n_bounces_default = int(record['n_bounces'])
+        return scene
+
+def hash_geometry(h, scene):
+    # Feed the full geometry of a scene into the hashlib object `h`: the shape records
+    # of a scene file, with the Bezier control points in full precision
+    record = np.zeros(1, dtype=SHAPE_DTYPE)
+    for shape in scene.shapes:
+        record[:] = 0
+        export_shape(shape, record[0], [])
+        h.update(record.tobytes())
+        if isinstance(shape, BezierCurve):
+            h.update(np.asarray(shape.control_points, dtype=np.float64).tobytes())
+
+def load_scenes(path):
+    scene_file = SceneFile(path)
+    return [scene_file.build(k) for k in range(len(scene_file.scenes))]
+
+def register_scene_file(registry, path):
+    # Add all scenes of a file to a `SceneRegistry`, replacing scenes of the same name
+    scene_file = SceneFile(path)
+    for k, name in enumerate(scene_file.names()):
+        registry.register(name)(lambda k=k: scene_file.build(k))
+    return scene_file
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != 'export':
+        print("Usage: python scene_format.py export <output file (.msc)>")
+        sys.exit(1)
+    export_scenes(sys.argv[2])
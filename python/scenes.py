@@ -2,14 +2,52 @@ import numpy as np
 from scene import Scene
 from manifolds import BezierCurve, Circle, ConcaveSegment, ConvexSegment, LinearSegment, Shape
 from nanogui import nanovg as nvg
-from bezier_shapes import *
+
+class SceneRegistry:
+    # Scene factories keyed by name. Scenes are only built on first access and
+    # cached afterwards, so startup cost doesn't grow with the number of scenes.
+    def __init__(self):
+        self.factories = {}
+        self.cache = {}
+
+    def register(self, name):
+        def decorator(factory):
+            self.factories[name] = factory
+            self.cache.pop(name, None)
+            return factory
+        return decorator
+
+    def names(self):
+        return list(self.factories.keys())
+
+    def get(self, name):
+        if name not in self.cache:
+            scene = self.factories[name]()
+            scene.name = name
+            self.cache[name] = scene
+        return self.cache[name]
+
+    def __getitem__(self, idx):
+        return self.get(self.names()[idx])
+
+    def __len__(self):
+        return len(self.factories)
+
+registry = SceneRegistry()
 
 def create_scenes():
-    scenes = []
+    # Eagerly build all registered scenes
+    return [registry.get(name) for name in registry.names()]
 
+def bounding_circle():
+    bounds = Circle([0, 0], 100.0)
+    bounds.type = Shape.Type.Null
+    bounds.visible = False
+    return bounds
 
-    # SIMPLE REFLECTION
 
+@registry.register("Simple reflection")
+def scene_simple_reflection():
     s1 = LinearSegment([0.7, 1.5], [-0.7, 1.5])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -20,20 +58,17 @@ def create_scenes():
     s3.first_specular = True
 
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s3, bounds])
-    scene.name = "Simple reflection"
     scene.set_start(0.1, -121.65789, 0.9, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
-
+    return scene
 
-    # SIMPLE REFRACTION
 
+@registry.register("Simple refraction")
+def scene_simple_refraction():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -48,20 +83,17 @@ def create_scenes():
     s3.first_specular = True
     s3.gradient_start = 0.4
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s2, s3, s1, bounds])
-    scene.name = "Simple refraction"
     scene.set_start(0.1, -121.429, 0.3429, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
+    return scene
 
 
-    # CONCAVE REFLECTOR
-
+@registry.register("Concave reflector")
+def scene_concave_reflector():
     s1 = LinearSegment([-1, 0], [-0.1, 0])
     s1.type = Shape.Type.Diffuse
     s1.start = True
@@ -74,20 +106,17 @@ def create_scenes():
     s3.type = Shape.Type.Reflection
     s3.first_specular = True
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, bounds])
-    scene.name = "Concave reflector"
     scene.set_start(0.47, 60.54, end_u=0.53, spec_u=-13.34)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
-
+    return scene
 
-    # REFLECTIVE SPHERE
 
+@registry.register("Reflective sphere")
+def scene_reflective_sphere():
     s1 = LinearSegment([-1, 0], [-0.1, 0])
     s1.type = Shape.Type.Diffuse
     s1.start = True
@@ -100,20 +129,17 @@ def create_scenes():
     s3.type = Shape.Type.Reflection
     s3.first_specular = True
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, bounds])
-    scene.name = "Reflective sphere"
     scene.set_start(0.43, 52.36, spec_u=0.75)
     scene.offset = [0.13, -0.8]
     scene.zoom = 0.75
-    scenes.append(scene)
+    return scene
 
 
-    # MNEE / REFRACTIVE SPHERE
-
+@registry.register("Refractive sphere / MNEE")
+def scene_mnee_refractive_sphere():
     s1 = LinearSegment([-1.0, 0], [1.0, 0])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -129,20 +155,17 @@ def create_scenes():
     s3.start = True
     s3.gradient_start = 0.08
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s2, s1, s3, bounds])
-    scene.name = "Refractive sphere / MNEE"
     scene.set_start(0.48, -143.97, 0.5, 0.5)
     scene.offset = [0, -1]
     scene.zoom = 0.65
-    scenes.append(scene)
-
+    return scene
 
-    # TWO BOUNCE SPHERE
 
+@registry.register("Two-bounce sphere")
+def scene_two_bounce_sphere():
     s1 = LinearSegment([-0.5, 0], [0.5, 0])
     s1.type = Shape.Type.Diffuse
     s1.start = True
@@ -156,21 +179,18 @@ def create_scenes():
     s3.type = Shape.Type.Diffuse
     s3.end = True
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, bounds])
-    scene.name = "Two-bounce sphere"
     scene.set_start(0.675, 87.7394, 0.7552, 0.5)
     scene.offset = [0, -1]
     scene.zoom = 0.75
     scene.n_bounces_default = 2
-    scenes.append(scene)
+    return scene
 
 
-    # WAVY REFLECTION
-
+@registry.register("Wavy reflection")
+def scene_wavy_reflection():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
 
@@ -179,30 +199,25 @@ def create_scenes():
     s2.start = True
     s2.end = True
 
-    plane_x = pts_wavy_plane[0]
-    plane_y = pts_wavy_plane[1]
-    plane_x *= 0.7;
-    plane_y *= 0.7;
-    plane_y += 0.08;
+    from bezier_shapes import pts_wavy_plane
+    plane_x = 0.7*pts_wavy_plane[0]
+    plane_y = 0.7*pts_wavy_plane[1] + 0.08
 
     s3 = BezierCurve(list(plane_x.flatten()), list(plane_y.flatten()))
     s3.type = Shape.Type.Reflection
     s3.first_specular = True
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s2, s3, s1, bounds])
-    scene.name = "Wavy reflection"
     scene.set_start(0.83, -76.76, 0.2, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
-
+    return scene
 
-    # WAVY REFRACTION / POOL
 
+@registry.register("Wavy refraction / pool")
+def scene_wavy_refraction_pool():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -211,12 +226,11 @@ def create_scenes():
     s2.type = Shape.Type.Diffuse
     s2.start = True
 
+    from bezier_shapes import pts_pool
     scale = 0.6
     offset = 0.2
-    pool_x = pts_pool[0]
-    pool_y = pts_pool[1]
-    pool_x *= scale; pool_y *= scale
-    pool_y += offset
+    pool_x = scale*pts_pool[0]
+    pool_y = scale*pts_pool[1] + offset
 
     s3 = BezierCurve(list(pool_x.flatten()), list(pool_y.flatten()))
     s3.type = Shape.Type.Refraction
@@ -235,20 +249,17 @@ def create_scenes():
     s5.gradient_width = 0.08
     s5.height = 10.0
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s3, s1, s2, s4, s5, bounds])
-    scene.name = "Wavy refraction / pool"
     scene.set_start(0.1, -121.429, 0.3849, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
+    return scene
 
 
-    # SPHERE (MANY BOUNCES)
-
+@registry.register("Sphere (many bounces)")
+def scene_sphere_many_bounces():
     s1 = LinearSegment([-0.8, 0], [0.8, 0])
     s1.type = Shape.Type.Diffuse
     s1.start = True
@@ -262,28 +273,26 @@ def create_scenes():
     s3 = LinearSegment([0.8, 2], [-0.8, 2])
     s3.type = Shape.Type.Reflection
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, bounds])
-    scene.name = "Sphere (many bounces)"
     scene.set_start(0.41, 100.61, spec_u=0.6956925392150879)
     scene.offset = [0, -1]
     scene.zoom = 0.75
     scene.n_bounces_default = 5
-    scenes.append(scene)
-
+    return scene
 
-    # BUNNY
 
+@registry.register("Bunny")
+def scene_bunny():
     s1 = LinearSegment([-0.8, 0], [0.8, 0])
     s1.type = Shape.Type.Diffuse
     s1.start = True
     s1.end = True
 
-    bunny_x = pts_bunny[0]; bunny_x *= 0.6
-    bunny_y = pts_bunny[1]; bunny_y *= 0.6; bunny_y += 1.0
+    from bezier_shapes import pts_bunny
+    bunny_x = 0.6*pts_bunny[0]
+    bunny_y = 0.6*pts_bunny[1] + 1.0
     s2 = BezierCurve(list(bunny_x.flatten()), list(bunny_y.flatten()))
     s2.type = Shape.Type.Refraction
     s2.eta = 1.5
@@ -292,21 +301,18 @@ def create_scenes():
     s3 = LinearSegment([0.8, 2], [-0.8, 2])
     s3.type = Shape.Type.Reflection
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, bounds])
-    scene.name = "Bunny"
     scene.set_start(0.644, 85.17827, end_u=0.39, spec_u=0.4038328230381012)
     scene.offset = [0, -1]
     scene.zoom = 0.75
     scene.n_bounces_default = 7
-    scenes.append(scene)
+    return scene
 
 
-    # DRAGON
-
+@registry.register("Dragon")
+def scene_dragon():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
 
@@ -315,14 +321,11 @@ def create_scenes():
     s2.start = True
     s2.end = True
 
-    dragon_x = pts_dragon[0]
-    dragon_y = pts_dragon[1]
-    dragon_hole_x = pts_dragon_hole[0]
-    dragon_hole_y = pts_dragon_hole[1]
-    dragon_x *= 0.7; dragon_hole_x *= 0.7
-    dragon_y *= 0.7; dragon_hole_y *= 0.7
-    dragon_y += 0.48; dragon_hole_y += 0.48
-
+    from bezier_shapes import pts_dragon, pts_dragon_hole
+    dragon_x = 0.7*pts_dragon[0]
+    dragon_y = 0.7*pts_dragon[1] + 0.48
+    dragon_hole_x = 0.7*pts_dragon_hole[0]
+    dragon_hole_y = 0.7*pts_dragon_hole[1] + 0.48
 
     s3 = BezierCurve(list(dragon_x.flatten()), list(dragon_y.flatten()))
     s3.type = Shape.Type.Reflection
@@ -335,20 +338,17 @@ def create_scenes():
     s_hole.hole = True
     s_hole.parent = "dragon"
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s2, s3, s1, s_hole, bounds])
-    scene.name = "Dragon"
     scene.set_start(0.104, -135.0, 0.832, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
+    return scene
 
 
-    # SIGGRAPH LOGO
-
+@registry.register("SIGGRAPH logo")
+def scene_siggraph_logo():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -357,24 +357,15 @@ def create_scenes():
     s2.type = Shape.Type.Diffuse
     s2.start = True
 
-    siggraph_1_x = pts_siggraph_1[0]
-    siggraph_1_y = pts_siggraph_1[1]
-    siggraph_2_x = pts_siggraph_2[0]
-    siggraph_2_y = pts_siggraph_2[1]
-    siggraph_3_x = pts_siggraph_3[0]
-    siggraph_3_y = pts_siggraph_3[1]
-    siggraph_4_x = pts_siggraph_4[0]
-    siggraph_4_y = pts_siggraph_4[1]
-    mitsuba_x = pts_mitsuba[0]
-    mitsuba_y = pts_mitsuba[1]
-
+    from bezier_shapes import pts_siggraph_1, pts_siggraph_2, pts_siggraph_3
     scale = 0.65
     offset = 0.7
-    siggraph_1_x *= scale; siggraph_2_x *= scale; siggraph_3_x *= scale; siggraph_4_x *= scale;
-    siggraph_1_y *= scale; siggraph_2_y *= scale; siggraph_3_y *= scale; siggraph_4_y *= scale;
-    siggraph_1_y += offset; siggraph_2_y += offset; siggraph_3_y += offset; siggraph_4_y += offset;
-    mitsuba_x *= scale; mitsuba_y *= scale
-    mitsuba_y += offset
+    siggraph_1_x = scale*pts_siggraph_1[0]
+    siggraph_1_y = scale*pts_siggraph_1[1] + offset
+    siggraph_2_x = scale*pts_siggraph_2[0]
+    siggraph_2_y = scale*pts_siggraph_2[1] + offset
+    siggraph_3_x = scale*pts_siggraph_3[0]
+    siggraph_3_y = scale*pts_siggraph_3[1] + offset
 
     s3 = BezierCurve(list(siggraph_1_x.flatten()), list(siggraph_1_y.flatten()))
     s3.type = Shape.Type.Refraction
@@ -389,29 +380,18 @@ def create_scenes():
     s5.type = Shape.Type.Refraction
     s5.eta = 1.5
 
-    s6 = BezierCurve(list(siggraph_4_x.flatten()), list(siggraph_4_y.flatten()))
-    s6.type = Shape.Type.Refraction
-    s6.eta = 1.5
-
-    s7 = BezierCurve(list(mitsuba_x.flatten()), list(mitsuba_y.flatten()))
-    s7.type = Shape.Type.Refraction
-    s7.eta = 1.5
-
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s1, s2, s3, s4, s5, bounds])
-    scene.name = "SIGGRAPH logo"
     scene.set_start(0.38, -85.24, 0.57, 0.89)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
     scene.n_bounces_default = 6
-    scenes.append(scene)
-
+    return scene
 
-    # MITSUBA LOGO
 
+@registry.register("Mitsuba logo")
+def scene_mitsuba_logo():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
 
@@ -420,29 +400,29 @@ def create_scenes():
     s2.start = True
     s2.end = True
 
-    mitsuba_x = pts_mitsuba[0]
-    mitsuba_y = pts_mitsuba[1]
-    mitsuba_x *= 0.7
-    mitsuba_y *= 0.7
+    # Same placement as when this scene was built after the SIGGRAPH logo scene,
+    # which used to transform the shared control points in place
+    from bezier_shapes import pts_mitsuba
+    scale = 0.65*0.7
+    offset = 0.7*0.7
+    mitsuba_x = scale*pts_mitsuba[0]
+    mitsuba_y = scale*pts_mitsuba[1] + offset
 
     s3 = BezierCurve(list(mitsuba_x.flatten()), list(mitsuba_y.flatten()))
     s3.type = Shape.Type.Reflection
     s3.first_specular = True
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
-    scene = Scene([s2, s3, s1, s_hole, bounds])
-    scene.name = "Mitsuba logo"
+    scene = Scene([s2, s3, s1, bounds])
     scene.set_start(0.347, -109.09, 0.832, 0.5)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
-    scenes.append(scene)
+    return scene
 
 
-    # TEAPOT
-
+@registry.register("Teapot")
+def scene_teapot():
     s1 = LinearSegment([-0.7, 0], [0.7, 0])
     s1.type = Shape.Type.Diffuse
     s1.end = True
@@ -451,13 +431,11 @@ def create_scenes():
     s2.type = Shape.Type.Diffuse
     s2.start = True
 
-    teapot_x = pts_teapot[0]
-    teapot_y = pts_teapot[1]
-    teapot_hole_x = pts_teapot_hole[0]
-    teapot_hole_y = pts_teapot_hole[1]
-    teapot_x *= 0.8; teapot_hole_x *= 0.8
-    teapot_y *= 0.8; teapot_hole_y *= 0.8
-    teapot_y += 0.6; teapot_hole_y += 0.6
+    from bezier_shapes import pts_teapot, pts_teapot_hole
+    teapot_x = 0.8*pts_teapot[0]
+    teapot_y = 0.8*pts_teapot[1] + 0.6
+    teapot_hole_x = 0.8*pts_teapot_hole[0]
+    teapot_hole_y = 0.8*pts_teapot_hole[1] + 0.6
 
     s3 = BezierCurve(list(teapot_x.flatten()), list(teapot_y.flatten()))
     s3.type = Shape.Type.Refraction
@@ -472,17 +450,45 @@ def create_scenes():
     s_hole.eta = 1.5
     s_hole.parent = "teapot"
 
-    bounds = Circle([0, 0], 100.0)
-    bounds.type = Shape.Type.Null
-    bounds.visible = False
+    bounds = bounding_circle()
 
     scene = Scene([s2, s3, s1, s_hole, bounds])
-    scene.name = "Teapot"
     scene.set_start(0.716, -69.54, end_u=0.55298, spec_u=0.22485)
     scene.offset = [0, -0.75]
     scene.zoom = 0.93
     scene.n_bounces_default = 2
-    scenes.append(scene)
+    return scene
+
 
+# Not part of the default registry: building it takes a few seconds, which would
+# dominate the loops over all scenes (benchmarks, seeding statistics, ...). The viewer
+# and session replays add it with `--svg-stress-test`.
+def scene_svg_stress_test():
+    s1 = LinearSegment([-0.7, 0], [0.7, 0])
+    s1.type = Shape.Type.Diffuse
+    s1.end = True
+
+    s2 = LinearSegment([0.7, 1.5], [-0.7, 1.5])
+    s2.type = Shape.Type.Diffuse
+    s2.start = True
+
+    # Imported outline with 20000 splines and an arc-based hole
+    from svg_import import load_svg, gear_svg
+    gear = load_svg(gear_svg(20000), width=0.9, center=(0, 0.7),
+                    shape_type=Shape.Type.Refraction)
+    for s in gear:
+        s.eta = 1.5
+    gear[0].first_specular = True
+
+    bounds = bounding_circle()
+
+    scene = Scene([s2, s1] + gear + [bounds])
+    # Refracts through the teeth on the right of the gear, next to the hole
+    scene.set_start(0.3, -91.0, end_u=0.8556, spec_u=0.8661)
+    scene.offset = [0, -0.75]
+    scene.zoom = 0.93
+    scene.n_bounces_default = 2
+    return scene
 
-    return scenes
+def register_svg_stress_test(registry=registry):
+    registry.register("SVG stress test")(scene_svg_stress_test)
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+from misc import *
+from path import *
+from solver import newton_solver
+from caustics import solution_key
+from manifold_walk import correct_path, path_visible
+
+# Seeding strategies for SMS with multiple specular bounces:
+#
+#   first_shape   Uniform position on the first specular shape, the remaining vertices
+#                 are traced deterministically (`Scene.sample_seed_path`).
+#   area          Position on any specular shape, chosen proportional to the shape's
+#                 length and uniformly in `u`, traced from there on.
+#   independent   Every specular vertex is placed independently (like `area`) without
+#                 tracing. These seeds are solved with Newton steps along the shapes
+#                 (`correct_path`) instead of the tracing based solver, and checked for
+#                 visibility afterwards.
+
+def shape_length(shape, n_samples=256):
+    p = np.array([shape.sample_position(u).p for u in np.linspace(0, 1, n_samples)])
+    return np.sum(norm(np.diff(p, axis=0)))
+
+class SpecularShapes:
+    # All specular shapes of a scene, for sampling proportional to their length
+    def __init__(self, scene):
+        self.shapes = [shape for shape in scene.shapes
+                       if shape.type == Shape.Type.Reflection or shape.type == Shape.Type.Refraction]
+        lengths = np.array([shape_length(shape) for shape in self.shapes])
+        self.cdf = np.cumsum(lengths) / np.sum(lengths)
+
+    def sample(self, rng):
+        shape = self.shapes[min(np.searchsorted(self.cdf, rng.uniform()), len(self.shapes) - 1)]
+        it = shape.sample_position(rng.uniform())
+        it.eta = shape.eta
+        it.n_offset = np.array([0, 1])
+        return it
+
+def seed_first_shape(scene, specular_shapes, n_bounces, rng):
+    spec_u_current = scene.spec_u_current
+    scene.spec_u_current = rng.uniform()
+    path = scene.sample_seed_path(n_bounces)
+    scene.spec_u_current = spec_u_current
+    return path
+
+def seed_area(scene, specular_shapes, n_bounces, rng):
+    it = specular_shapes.sample(rng)
+    return scene.trace_seed_path(it.p, it.shape, n_bounces)
+
+def seed_independent(scene, specular_shapes, n_bounces, rng):
+    path = Path()
+    path.append(scene.sample_start_position(scene.start_u_current))
+    for k in range(n_bounces):
+        path.append(specular_shapes.sample(rng))
+    path.append(scene.sample_end_position(scene.end_u_current))
+    return path
+
+SEEDING_STRATEGIES = {
+    'first_shape': seed_first_shape,
+    'area': seed_area,
+    'independent': seed_independent,
+}
+
+def solve_seed(scene, seed_path, strategy, constraint_type, n_bounces, max_steps=20, eps=1e-5, step_scale=1.0):
+    # Solution path for a seed of the given strategy, or None
+    if not seed_path.has_specular_segment():
+        return None
+    if strategy == 'independent':
+        path, _, _ = correct_path(seed_path.copy(), constraint_type, eps, max_steps)
+        if path is None or not path_visible(scene, path):
+            return None
+        return path
+    return newton_solver(scene, seed_path, constraint_type, n_bounces, max_steps, eps, step_scale).solution_path
+
+class SeedingStats:
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.n_seeds = 0
+        self.n_valid = 0            # Seeds that form a path with specular segment
+        self.n_converged = 0
+        self.solutions = set()      # Distinct solutions found
+        self.time = 0.0
+
+    def converged_per_second(self):
+        return self.n_converged / self.time if self.time > 0 else 0.0
+
+    def solutions_per_second(self):
+        return len(self.solutions) / self.time if self.time > 0 else 0.0
+
+def run_strategy(scene, strategy, n_seeds, constraint_type=ConstraintType.HalfVector, n_bounces=None,
+                 max_steps=20, eps=1e-5, rng=np.random, specular_shapes=None):
+    if strategy not in SEEDING_STRATEGIES:
+        raise ValueError("run_strategy(): unknown strategy '%s'" % strategy)
+    if n_bounces is None:
+        n_bounces = scene.n_bounces_default
+    if specular_shapes is None:
+        specular_shapes = SpecularShapes(scene)
+
+    stats = SeedingStats(strategy)
+    paths = []
+    if len(specular_shapes.shapes) == 0:
+        return paths, stats
+    start = time.perf_counter()
+    for k in range(n_seeds):
+        seed_path = SEEDING_STRATEGIES[strategy](scene, specular_shapes, n_bounces, rng)
+        stats.n_seeds += 1
+        if not seed_path.has_specular_segment():
+            continue
+        stats.n_valid += 1
+        path = solve_seed(scene, seed_path, strategy, constraint_type, n_bounces, max_steps, eps)
+        if path is not None:
+            stats.n_converged += 1
+            stats.solutions.add(solution_key(path))
+            paths.append(path)
+    stats.time = time.perf_counter() - start
+    return paths, stats
+
+def compare_strategies(scene, n_seeds=200, seed=0, **kwargs):
+    # SeedingStats for all strategies, with the same random seed each
+    specular_shapes = SpecularShapes(scene)
+    return {strategy: run_strategy(scene, strategy, n_seeds, rng=np.random.RandomState(seed),
+                                   specular_shapes=specular_shapes, **kwargs)[1]
+            for strategy in SEEDING_STRATEGIES}
+
+def best_strategy(stats):
+    # Cheapest strategy: most converged paths per second
+    return max(stats.values(), key=lambda s: s.converged_per_second()).strategy
+
+if __name__ == "__main__":
+    import sys
+    from scenes import registry
+
+    names = sys.argv[1:] if len(sys.argv) > 1 else registry.names()
+    for name in names:
+        scene = registry.get(name)
+        stats = compare_strategies(scene)
+        if sum(s.n_seeds for s in stats.values()) == 0:
+            continue
+        print("%s (N=%d):" % (name, scene.n_bounces_default))
+        for s in stats.values():
+            print("  %-12s %5.1f%% valid, %5.1f%% converged, %3d solutions, %8.1f paths/s" %
+                  (s.strategy, 100*s.n_valid / s.n_seeds, 100*s.n_converged / s.n_seeds,
+                   len(s.solutions), s.converged_per_second()))
+        print("  best: %s" % best_strategy(stats))
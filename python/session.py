@@ -0,0 +1,377 @@
+import precision
+import gc
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+import nanogui
+import manifolds
+from nanogui import *
+from scenes import registry, register_svg_stress_test
+
+# Recording and replay of interactive viewer sessions. The recorder (toggled with F5
+# in the viewer) captures the per-frame `Input` state and view, key events, GUI widget
+# changes and button presses, together with the timings and counters of each frame.
+# The replayer drives a hidden `ManifoldViewer` with the same stream frame by frame,
+# so interactive slowdowns can be reproduced and timed end-to-end, e.g.
+#
+#   python session.py session.npz -n 3 -o timings.npz
+#   python session.py session.npz -n 3 --baseline timings.npz --tolerance 1.2
+#
+# Widgets are identified by their position in a depth first walk of the widget tree,
+# so sessions are only valid for the GUI layout (and scene list) they were recorded
+# with. Replays still need an OpenGL context (e.g. xvfb-run on a server).
+
+SESSION_VERSION = 1
+
+FRAME_ARRAYS = ['mouse_p', 'mouse_dp', 'mouse_p_click', 'click', 'shift', 'alt', 'zoom', 'offset']
+TIMING_ARRAYS = ['frame_time', 'update_time', 'draw_time', 'rays', 'newton_iterations']
+
+TOGGLE_FLAGS = int(Button.Flags.ToggleButton) | int(Button.Flags.RadioButton)
+
+def widget_type(widget):
+    # ComboBox has to be checked before its base classes
+    if isinstance(widget, ComboBox):
+        return 'ComboBox'
+    if isinstance(widget, PopupButton):
+        return None
+    for name, cls in [('CheckBox', CheckBox), ('Slider', Slider), ('IntBox', IntBox),
+                      ('FloatBox', FloatBox), ('Button', Button)]:
+        if isinstance(widget, cls):
+            return name
+    return None
+
+def walk_widgets(widget, widgets=None):
+    # All widgets with a value or a callback below `widget`, in depth first order
+    if widgets is None:
+        widgets = []
+    for child in widget.children():
+        if isinstance(child, Popup):
+            continue
+        if widget_type(child) is not None:
+            widgets.append(child)
+        walk_widgets(child, widgets)
+    return widgets
+
+def widget_value(widget, kind):
+    # None for plain push buttons, which only have presses
+    if kind == 'ComboBox':
+        return widget.selected_index()
+    if kind == 'CheckBox':
+        return widget.checked()
+    if kind == 'Button':
+        return widget.pushed() if int(widget.flags()) & TOGGLE_FLAGS else None
+    return widget.value()
+
+def set_widget_value(widget, kind, value):
+    # Set a value and run the callback, like an interaction with the widget would
+    if kind == 'ComboBox':
+        widget.set_selected_index(value)
+        callback = widget.callback()
+    elif kind == 'CheckBox':
+        widget.set_checked(value)
+        callback = widget.callback()
+    elif kind == 'Button':
+        widget.set_pushed(value)
+        callback = widget.change_callback()
+    else:
+        widget.set_value(value)
+        callback = widget.callback()
+    if callback is not None:
+        callback(value)
+
+def widget_snapshot(widgets):
+    snapshot = []
+    for widget in widgets:
+        kind = widget_type(widget)
+        snapshot.append([kind, widget_value(widget, kind)])
+    return snapshot
+
+def find_widget(viewer, index, kind):
+    widgets = walk_widgets(viewer)
+    if index >= len(widgets) or widget_type(widgets[index]) != kind:
+        raise ValueError("Session doesn't match the viewer's widgets (%s at index %d)" % (kind, index))
+    return widgets[index]
+
+def apply_snapshot(viewer, snapshot):
+    # Callbacks can rebuild parts of the widget tree (e.g. the mode selection), so the
+    # tree is walked again for every widget
+    for index, (kind, value) in enumerate(snapshot):
+        widget = find_widget(viewer, index, kind)
+        if value is not None and widget_value(widget, kind) != value:
+            set_widget_value(widget, kind, value)
+
+class Session:
+    def __init__(self, header, events, frames):
+        self.header = header    # Viewer state at the start of the recording
+        self.events = events    # [frame, 'key' | 'widget' | 'press', ...], in order
+        self.frames = frames    # Per-frame arrays, FRAME_ARRAYS + TIMING_ARRAYS
+
+    def n_frames(self):
+        return len(self.frames['zoom'])
+
+    def save(self, filename):
+        np.savez_compressed(filename, header=json.dumps(self.header), events=json.dumps(self.events),
+                            **self.frames)
+
+    @staticmethod
+    def load(filename):
+        data = np.load(filename)
+        header = json.loads(str(data['header']))
+        if header['version'] != SESSION_VERSION:
+            raise ValueError("Session.load(): unsupported version %d" % header['version'])
+        frames = {name: data[name] for name in FRAME_ARRAYS + TIMING_ARRAYS}
+        return Session(header, json.loads(str(data['events'])), frames)
+
+class SessionRecorder:
+    def __init__(self, viewer, seed=0):
+        self.viewer = viewer
+        self.events = []
+        self.frames = {name: [] for name in FRAME_ARRAYS + TIMING_ARRAYS}
+        self.wrapped = {}       # id -> (button, original callback) of plain buttons
+
+        scene = viewer.scenes[viewer.scene_idx]
+        widgets = walk_widgets(viewer)
+        self.snapshot = widget_snapshot(widgets)
+        self.header = {
+            'version': SESSION_VERSION,
+            'double_precision': bool(manifolds.double_precision),
+            'scenes': registry.names(),
+            'size': [int(x) for x in viewer.size()],
+            'seed': seed,
+            'widgets': self.snapshot,
+            'state': {
+                'start_u': float(scene.start_u_current),
+                'start_angle': float(scene.start_angle_current),
+                'end_u': float(scene.end_u_current),
+                'spec_u': float(scene.spec_u_current),
+            },
+        }
+        self.wrap_buttons(widgets)
+        np.random.seed(seed)
+
+    def n_frames(self):
+        return len(self.frames['zoom'])
+
+    def key_event(self, key, scancode, action, modifiers):
+        self.events.append([self.n_frames(), 'key', key, scancode, action, modifiers])
+
+    def wrap_buttons(self, widgets):
+        # Presses of plain buttons don't change any value, so they are logged by
+        # wrapping the callbacks
+        for widget in widgets:
+            kind = widget_type(widget)
+            if kind != 'Button' or widget_value(widget, kind) is not None or id(widget) in self.wrapped:
+                continue
+            callback = widget.callback()
+            if callback is None:
+                continue
+            self.wrapped[id(widget)] = (widget, callback)
+            widget.set_callback(self.press_callback(widget, callback))
+
+    def press_callback(self, widget, callback):
+        def wrapper():
+            index = walk_widgets(self.viewer).index(widget)
+            self.events.append([self.n_frames(), 'press', index, 'Button'])
+            callback()
+        return wrapper
+
+    def record_widgets(self):
+        # Changes since the last frame. Once the widget types differ the tree was
+        # rebuilt by a callback, which happens in the same way during replay.
+        widgets = walk_widgets(self.viewer)
+        snapshot = widget_snapshot(widgets)
+        for index, ((kind, value), (last_kind, last_value)) in enumerate(zip(snapshot, self.snapshot)):
+            if kind != last_kind:
+                break
+            if value != last_value:
+                self.events.append([self.n_frames(), 'widget', index, kind, value])
+        self.snapshot = snapshot
+        self.wrap_buttons(widgets)
+
+    def record_frame(self, input, frame_stats):
+        # Called by the viewer at the end of every frame
+        self.record_widgets()
+        values = {
+            'mouse_p': input.mouse_p,
+            'mouse_dp': input.mouse_dp,
+            'mouse_p_click': input.mouse_p_click,
+            'click': input.click,
+            'shift': input.shift,
+            'alt': input.alt,
+            'zoom': self.viewer.zoom,
+            'offset': self.viewer.offset,
+            'frame_time': frame_stats.frame_times[-1] if len(frame_stats.frame_times) > 0 else 0.0,
+            'update_time': frame_stats.update_times[-1],
+            'draw_time': frame_stats.draw_times[-1],
+            'rays': frame_stats.rays,
+            'newton_iterations': frame_stats.newton_iterations,
+        }
+        for name, value in values.items():
+            self.frames[name].append(np.array(value, copy=True))
+
+    def stop(self):
+        for widget, callback in self.wrapped.values():
+            widget.set_callback(callback)
+        self.wrapped = {}
+        frames = {name: np.array(values) for name, values in self.frames.items()}
+        return Session(self.header, self.events, frames)
+
+class SessionPlayer:
+    def __init__(self, session):
+        self.session = session
+        self.frame = 0
+        self.next_event = 0
+
+    def start(self, viewer):
+        header = self.session.header
+        if header['scenes'] != registry.names():
+            raise ValueError("Session was recorded with a different scene list")
+        viewer.set_size(tuple(header['size']))
+        apply_snapshot(viewer, header['widgets'])
+        scene = viewer.scenes[viewer.scene_idx]
+        scene.start_u_current = header['state']['start_u']
+        scene.start_angle_current = header['state']['start_angle']
+        scene.end_u_current = header['state']['end_u']
+        scene.spec_u_current = header['state']['spec_u']
+        np.random.seed(header['seed'])
+        self.frame = 0
+        self.next_event = 0
+
+    def begin_frame(self, viewer):
+        # Events that happened before this frame, and its view
+        events = self.session.events
+        while self.next_event < len(events) and events[self.next_event][0] <= self.frame:
+            event = events[self.next_event]
+            if event[1] == 'key':
+                viewer.keyboard_event(*event[2:])
+            elif event[1] == 'widget':
+                index, kind, value = event[2:]
+                widget = find_widget(viewer, index, kind)
+                if widget_value(widget, kind) != value:
+                    set_widget_value(widget, kind, value)
+            elif event[1] == 'press':
+                find_widget(viewer, event[2], event[3]).callback()()
+            self.next_event += 1
+
+        frames = self.session.frames
+        viewer.zoom = float(frames['zoom'][self.frame])
+        viewer.offset = np.array(frames['offset'][self.frame])
+
+    def apply_input(self, input):
+        # Called by the viewer in place of the actual mouse state
+        frames = self.session.frames
+        input.mouse_p = np.array(frames['mouse_p'][self.frame])
+        input.mouse_dp = np.array(frames['mouse_dp'][self.frame])
+        input.mouse_p_click = np.array(frames['mouse_p_click'][self.frame])
+        input.click = bool(frames['click'][self.frame])
+        input.shift = bool(frames['shift'][self.frame])
+        input.alt = bool(frames['alt'][self.frame])
+
+    def end_frame(self):
+        self.frame += 1
+
+class ReplayResult:
+    def __init__(self, n_frames):
+        self.frame_time = np.zeros(n_frames)     # Whole frame, including the GUI
+        self.update_time = np.zeros(n_frames)
+        self.draw_time = np.zeros(n_frames)
+        self.rays = np.zeros(n_frames, dtype=np.int64)
+        self.newton_iterations = np.zeros(n_frames, dtype=np.int64)
+
+    def mismatched_frames(self, session):
+        # Frames whose counters differ from the recording, i.e. the replay diverged
+        return np.where((self.rays != session.frames['rays']) |
+                        (self.newton_iterations != session.frames['newton_iterations']))[0]
+
+    def save(self, filename):
+        np.savez(filename, frame_time=self.frame_time, update_time=self.update_time, draw_time=self.draw_time,
+                 rays=self.rays, newton_iterations=self.newton_iterations)
+
+def replay(viewer, session):
+    player = SessionPlayer(session)
+    player.start(viewer)
+    viewer.player = player
+    result = ReplayResult(session.n_frames())
+    for k in range(session.n_frames()):
+        player.begin_frame(viewer)
+        start = time.perf_counter()
+        viewer.redraw()
+        viewer.draw_all()
+        result.frame_time[k] = time.perf_counter() - start
+        result.update_time[k] = viewer.frame_stats.update_times[-1]
+        result.draw_time[k] = viewer.frame_stats.draw_times[-1]
+        result.rays[k] = viewer.frame_stats.rays
+        result.newton_iterations[k] = viewer.frame_stats.newton_iterations
+        player.end_frame()
+    viewer.player = None
+    return result
+
+def replay_repeated(session, n_repeat=1):
+    # Per-frame minimum over `n_repeat` replays, each with a freshly created viewer
+    from viewer import ManifoldViewer
+    best = None
+    for k in range(n_repeat):
+        viewer = ManifoldViewer()
+        result = replay(viewer, session)
+        del viewer
+        gc.collect()
+        if best is None:
+            best = result
+        else:
+            for name in ['frame_time', 'update_time', 'draw_time']:
+                setattr(best, name, np.minimum(getattr(best, name), getattr(result, name)))
+    return best
+
+def print_timings(label, frame_time, update_time, draw_time):
+    print("%-10s frame: median %6.2f ms, p95 %6.2f ms, max %6.2f ms | update %6.2f ms | draw %6.2f ms" %
+          (label, 1e3*np.median(frame_time), 1e3*np.percentile(frame_time, 95), 1e3*np.max(frame_time),
+           1e3*np.median(update_time), 1e3*np.median(draw_time)))
+
+if __name__ == "__main__":
+    from scene_format import register_scene_file
+    from parallel import register_scenes
+
+    parser = argparse.ArgumentParser(description="Replay a recorded viewer session and report frame timings")
+    parser.add_argument('session', help="session file (.npz) recorded in the viewer with F5")
+    parser.add_argument('scene_files', nargs='*', help="additional scene files (.msc) loaded during recording")
+    parser.add_argument('-n', '--repeat', type=int, default=1, help="number of replays, the fastest time per frame is kept")
+    parser.add_argument('-o', '--output', default=None, help="write per-frame timings to this file (.npz)")
+    parser.add_argument('--baseline', default=None, help="timings (.npz) of an earlier replay to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.2, help="maximum allowed slowdown of the median frame time")
+    parser.add_argument('--double', action='store_true', help="use the double precision library")
+    parser.add_argument('--svg-stress-test', action='store_true', help="add the SVG stress test scene, as in the viewer")
+    args = parser.parse_args()
+
+    if args.svg_stress_test:
+        register_scenes(register_svg_stress_test)
+    for filename in args.scene_files:
+        register_scenes(register_scene_file, filename)
+    session = Session.load(args.session)
+    if session.header['double_precision'] != bool(manifolds.double_precision):
+        print("Warning: session was recorded with %s precision" %
+              ('double' if session.header['double_precision'] else 'float'))
+
+    nanogui.init()
+    result = replay_repeated(session, args.repeat)
+    nanogui.shutdown()
+
+    print("%d frames" % session.n_frames())
+    print_timings('recorded', session.frames['frame_time'], session.frames['update_time'], session.frames['draw_time'])
+    print_timings('replay', result.frame_time, result.update_time, result.draw_time)
+    mismatched = result.mismatched_frames(session)
+    if len(mismatched) > 0:
+        print("Warning: replay diverged from the recording in %d frames (first: %d)" % (len(mismatched), mismatched[0]))
+    if args.output:
+        result.save(args.output)
+
+    if args.baseline:
+        baseline = np.load(args.baseline)
+        print_timings('baseline', baseline['frame_time'], baseline['update_time'], baseline['draw_time'])
+        ratio = np.median(result.frame_time) / np.median(baseline['frame_time'])
+        print("Median frame time: %.2fx baseline" % ratio)
+        if ratio > args.tolerance:
+            print("Regression: slower than %.2fx baseline" % args.tolerance)
+            sys.exit(1)
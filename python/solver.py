@@ -0,0 +1,81 @@
+from misc import *
+from path import *
+from frame_stats import counters
+
+class NewtonResult:
+    def __init__(self):
+        self.solution_path = None       # Converged path, None on failure
+        self.intermediate_paths = []    # All accepted iterates, starting with the seed path
+        self.success = False
+        self.iterations = 0
+        self.residual = np.inf          # Largest |C| of the last accepted iterate
+        self.failure = None             # 'max_steps', 'singular' or 'occluded' on failure
+
+def specular_residual(path):
+    residual = 0.0
+    for vtx in path:
+        if vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction:
+            residual = max(residual, abs(vtx.C))
+    return residual
+
+def newton_solver(scene, seed_path, constraint_type, n_bounces=1, max_steps=20, eps=1e-3, step_scale=1.0):
+    result = NewtonResult()
+
+    current_path = seed_path.copy()
+    result.intermediate_paths.append(current_path)
+
+    i = 0
+    beta = 1.0
+    success = False
+    while True:
+        # Give up after too many iterations
+        if i >= max_steps:
+            result.failure = 'max_steps'
+            break
+
+        # Compute tangents and constraints
+        current_path.compute_tangent_derivatives(constraint_type)
+        if current_path.singular:
+            result.failure = 'singular'
+            break
+
+        # Check for success
+        result.residual = specular_residual(current_path)
+        if result.residual <= eps:
+            success = True
+            break
+
+        proposed_offsets = current_path.copy_positions()
+        for k, vtx in enumerate(current_path):
+            if vtx.shape.type == Shape.Type.Reflection or vtx.shape.type == Shape.Type.Refraction:
+                proposed_offsets[k] -= step_scale*beta * vtx.dp_du * vtx.dX
+
+        # Ray trace to re-project onto specular manifold
+        proposed_path = scene.reproject_path_sms(proposed_offsets, current_path, n_bounces)
+        if not current_path.same_submanifold(proposed_path):
+            beta = 0.5 * beta
+        else:
+            beta = min(1.0, 2*beta)
+            current_path = proposed_path
+            result.intermediate_paths.append(current_path)
+
+        i = i + 1
+
+    if success:
+        p_last = current_path[-1].p
+        p_spec = current_path[-2].p
+        d = p_spec - p_last
+        d_norm = norm(d)
+        d /= d_norm
+        ray = Ray2f(p_last, d, 1e-4, d_norm)
+        it = scene.ray_intersect(ray)
+        if it.is_valid():
+            success = False
+            result.failure = 'occluded'
+
+    result.success = success
+    result.iterations = i
+    counters.newton_iterations += i
+    if success:
+        result.solution_path = current_path
+    return result
@@ -0,0 +1,287 @@
+import io
+import re
+import numpy as np
+import xml.etree.ElementTree as ET
+from manifolds import BezierCurve, Shape
+
+# Import SVG path outlines as `BezierCurve` shapes. All path commands (lines, quadratic
+# and cubic splines, elliptical arcs) are converted to cubic splines.
+#
+# The document is parsed incrementally and every <path> element is discarded once it
+# has been converted, and control points are collected per subpath in flat arrays, so
+# outlines with many thousands of segments load in bounded memory.
+#
+# The first subpath of a <path> is its outline, all further subpaths are added as
+# holes of it (via `Shape.hole` / `Shape.parent`). Element transforms are not
+# supported, coordinates are mapped from the document's viewBox into the scene.
+
+COMMAND = re.compile(r'[\s,]*([MmLlHhVvCcSsQqTtAaZz])')
+NUMBER  = re.compile(r'[\s,]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+FLAG    = re.compile(r'[\s,]*([01])')
+SPACE   = re.compile(r'[\s,]*$')
+
+class PointBuffer:
+    # Growable (N, 2) array of control points
+    def __init__(self, capacity=256):
+        self.data = np.empty((capacity, 2))
+        self.size = 0
+
+    def append(self, p0, p1, p2, p3):
+        if self.size + 4 > len(self.data):
+            self.data = np.resize(self.data, (2*len(self.data), 2))
+        self.data[self.size:self.size + 4] = (p0, p1, p2, p3)
+        self.size += 4
+
+    def points(self):
+        return self.data[:self.size].copy()
+
+    def clear(self):
+        self.size = 0
+
+def line_to_cubic(p0, p1):
+    return p0, p0 + (p1 - p0)/3, p0 + 2*(p1 - p0)/3, p1
+
+def quadratic_to_cubic(p0, q, p1):
+    return p0, p0 + 2/3*(q - p0), p1 + 2/3*(q - p1), p1
+
+def arc_to_cubics(p0, rx, ry, phi, large_arc, sweep, p1):
+    # Endpoint to center parameterization, see the SVG spec (appendix F.6)
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return [line_to_cubic(p0, p1)]
+
+    cp, sp = np.cos(np.radians(phi)), np.sin(np.radians(phi))
+    dx, dy = 0.5*(p0 - p1)
+    x1 =  cp*dx + sp*dy
+    y1 = -sp*dx + cp*dy
+
+    lam = x1**2/rx**2 + y1**2/ry**2
+    if lam > 1:
+        rx, ry = np.sqrt(lam)*rx, np.sqrt(lam)*ry
+
+    num = rx**2*ry**2 - rx**2*y1**2 - ry**2*x1**2
+    den = rx**2*y1**2 + ry**2*x1**2
+    coef = np.sqrt(max(0.0, num/den)) if den > 0 else 0.0
+    if large_arc == sweep:
+        coef = -coef
+    cx1 =  coef*rx*y1/ry
+    cy1 = -coef*ry*x1/rx
+    c = np.array([cp*cx1 - sp*cy1, sp*cx1 + cp*cy1]) + 0.5*(p0 + p1)
+
+    theta = np.arctan2((y1 - cy1)/ry, (x1 - cx1)/rx)
+    d_theta = np.arctan2((-y1 - cy1)/ry, (-x1 - cx1)/rx) - theta
+    if sweep and d_theta < 0:
+        d_theta += 2*np.pi
+    elif not sweep and d_theta > 0:
+        d_theta -= 2*np.pi
+
+    # Split into pieces of at most 90 degrees
+    n = max(1, int(np.ceil(abs(d_theta) / (0.5*np.pi) - 1e-7)))
+    delta = d_theta / n
+    k = 4/3*np.tan(delta/4)
+
+    def point(t):
+        ct, st = np.cos(t), np.sin(t)
+        return c + np.array([rx*ct*cp - ry*st*sp, rx*ct*sp + ry*st*cp])
+
+    def tangent(t):
+        ct, st = np.cos(t), np.sin(t)
+        return np.array([-rx*st*cp - ry*ct*sp, -rx*st*sp + ry*ct*cp])
+
+    cubics = []
+    a = p0
+    for i in range(n):
+        t0 = theta + i*delta
+        t1 = t0 + delta
+        b = p1 if i == n - 1 else point(t1)
+        cubics.append((a, a + k*tangent(t0), b - k*tangent(t1), b))
+        a = b
+    return cubics
+
+class PathParser:
+    # Incremental parser for SVG path data, calls `emit(p0, p1, p2, p3)` for every
+    # cubic spline and `close()` whenever a subpath ends.
+    def __init__(self, d, emit, close):
+        self.d = d
+        self.pos = 0
+        self.emit = emit
+        self.close = close
+
+    def match(self, regex):
+        m = regex.match(self.d, self.pos)
+        if not m:
+            raise ValueError("PathParser: invalid path data at position %d: '%s'" % (self.pos, self.d[self.pos:self.pos + 20]))
+        self.pos = m.end()
+        return m.group(1)
+
+    def number(self):
+        return float(self.match(NUMBER))
+
+    def flag(self):
+        return self.match(FLAG) == '1'
+
+    def point(self, relative, current):
+        p = np.array([self.number(), self.number()])
+        return p + current if relative else p
+
+    def cubic(self, p0, p1, p2, p3):
+        if np.any(p0 != p3) or np.any(p0 != p1) or np.any(p0 != p2):
+            self.emit(p0, p1, p2, p3)
+
+    def parse(self):
+        current = start = np.zeros(2)
+        last_control = None     # Reflected control point for S/T commands
+        n_segments = 0
+        command = None
+
+        while not SPACE.match(self.d, self.pos):
+            m = COMMAND.match(self.d, self.pos)
+            if m:
+                command = m.group(1)
+                self.pos = m.end()
+            elif command is None or command in 'Zz':
+                raise ValueError("PathParser: expected command at position %d" % self.pos)
+
+            relative = command.islower()
+            cmd = command.upper()
+            control = None
+
+            if cmd == 'M':
+                if n_segments > 0:
+                    self.close()
+                    n_segments = 0
+                current = start = self.point(relative, current)
+                # Further coordinate pairs are implicit line commands
+                command = 'l' if relative else 'L'
+            elif cmd == 'Z':
+                self.cubic(*line_to_cubic(current, start))
+                self.close()
+                n_segments = 0
+                current = start
+            elif cmd in 'LHV':
+                if cmd == 'L':
+                    p = self.point(relative, current)
+                elif cmd == 'H':
+                    p = np.array([self.number() + (current[0] if relative else 0), current[1]])
+                else:
+                    p = np.array([current[0], self.number() + (current[1] if relative else 0)])
+                self.cubic(*line_to_cubic(current, p))
+                current = p
+            elif cmd in 'CS':
+                if cmd == 'C':
+                    c1 = self.point(relative, current)
+                else:
+                    c1 = 2*current - last_control[1] if last_control is not None and last_control[0] == 'C' else current
+                c2 = self.point(relative, current)
+                p = self.point(relative, current)
+                self.cubic(current, c1, c2, p)
+                control = ('C', c2)
+                current = p
+            elif cmd in 'QT':
+                if cmd == 'Q':
+                    q = self.point(relative, current)
+                else:
+                    q = 2*current - last_control[1] if last_control is not None and last_control[0] == 'Q' else current
+                p = self.point(relative, current)
+                self.cubic(*quadratic_to_cubic(current, q, p))
+                control = ('Q', q)
+                current = p
+            elif cmd == 'A':
+                rx, ry, phi = self.number(), self.number(), self.number()
+                large_arc, sweep = self.flag(), self.flag()
+                p = self.point(relative, current)
+                if np.any(p != current):
+                    for cubic in arc_to_cubics(current, rx, ry, phi, large_arc, sweep, p):
+                        self.cubic(*cubic)
+                current = p
+
+            if cmd not in 'MZ':
+                n_segments += 1
+            last_control = control
+
+        if n_segments > 0:
+            self.close()
+
+def parse_subpaths(d):
+    # Control points of all subpaths in `d`, one (4 * #splines, 2) array each
+    buffer = PointBuffer()
+    subpaths = []
+    def close():
+        if buffer.size > 0:
+            subpaths.append(buffer.points())
+            buffer.clear()
+    PathParser(d, buffer.append, close).parse()
+    return subpaths
+
+def iter_svg_paths(source):
+    # Stream (viewBox, attributes) for all <path> elements of an SVG document
+    view_box = None
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if root is None:
+                root = elem
+                if 'viewBox' in elem.attrib:
+                    view_box = [float(v) for v in re.split(r'[\s,]+', elem.attrib['viewBox'].strip())]
+                elif 'width' in elem.attrib and 'height' in elem.attrib:
+                    view_box = [0, 0, float(re.match(NUMBER, elem.attrib['width']).group(1)),
+                                      float(re.match(NUMBER, elem.attrib['height']).group(1))]
+            continue
+
+        if tag == 'path' and 'd' in elem.attrib:
+            yield view_box, dict(elem.attrib)
+        if elem is not root:
+            elem.clear()
+            # Drop already processed children so the tree doesn't grow
+            if len(root) > 0 and root[-1] is elem:
+                del root[:]
+
+def load_svg(source, width=1.0, center=(0, 0), shape_type=Shape.Type.Reflection):
+    # Bezier shapes for all paths in `source` (file name or file object), with the
+    # document's viewBox scaled to `width` and centered at `center`. SVG y axis points down.
+    if isinstance(source, str) and source.lstrip().startswith('<'):
+        source = io.BytesIO(source.encode())
+
+    shapes = []
+    for idx, (view_box, attrib) in enumerate(iter_svg_paths(source)):
+        if view_box is None:
+            raise ValueError("load_svg(): document needs a viewBox or width and height")
+        x0, y0, w, h = view_box
+        scale = width / w
+        offset = np.array(center) - scale*np.array([x0 + 0.5*w, -(y0 + 0.5*h)])
+
+        name = attrib.get('id', "svg_path_%d" % idx)
+        for k, pts in enumerate(parse_subpaths(attrib['d'])):
+            pts[:, 1] = -pts[:, 1]
+            shape = BezierCurve(scale*pts + offset)
+            shape.type = shape_type
+            if k == 0:
+                shape.name = name
+            else:
+                shape.name = "%s_hole_%d" % (name, k)
+                shape.hole = True
+                shape.parent = name
+            shapes.append(shape)
+    return shapes
+
+def gear_svg(n_segments, n_teeth=60, hole_radius=0.35):
+    # Synthetic stress test outline: gear with `n_segments` cubic splines and a
+    # circular hole made of arc commands
+    phi = np.linspace(0, 2*np.pi, n_segments + 1)[:-1]
+    r = 1.0 + 0.04*np.sin(n_teeth*phi)
+    dr = 0.04*n_teeth*np.cos(n_teeth*phi)
+    p = np.stack([r*np.cos(phi), r*np.sin(phi)], axis=1)
+    t = np.stack([dr*np.cos(phi) - r*np.sin(phi), dr*np.sin(phi) + r*np.cos(phi)], axis=1)
+    t *= (2*np.pi / n_segments) / 3
+
+    out = io.StringIO()
+    out.write('<svg xmlns="http://www.w3.org/2000/svg" viewBox="-1.1 -1.1 2.2 2.2">\n')
+    out.write('<path id="gear" d="M%.6f,%.6f' % tuple(p[0]))
+    for i in range(n_segments):
+        j = (i + 1) % n_segments
+        out.write(' C%.6f,%.6f %.6f,%.6f %.6f,%.6f' % (*(p[i] + t[i]), *(p[j] - t[j]), *p[j]))
+    out.write(' Z M%.6f,0 A%.6f,%.6f 0 1,0 %.6f,0 A%.6f,%.6f 0 1,0 %.6f,0 Z"/>\n' %
+              (hole_radius, hole_radius, hole_radius, -hole_radius, hole_radius, hole_radius, hole_radius))
+    out.write('</svg>\n')
+    return out.getvalue()
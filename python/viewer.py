@@ -1,4 +1,7 @@
+import precision
 import gc
+import sys
+import time
 import numpy as np
 
 import nanogui
@@ -10,7 +13,13 @@ from misc import *
 from modes.raytracing import *
 from modes.manifold_exploration import *
 from modes.specular_manifold_sampling import *
-from scenes import create_scenes
+from scenes import registry as scene_registry, register_svg_stress_test
+from scene_format import register_scene_file
+from parallel import register_scenes
+from profiler import profiler
+from frame_stats import FrameStats
+from draw import draw_text_box, SceneLayer
+from session import SessionRecorder
 
 class Input:
     def __init__(self, screen):
@@ -36,8 +45,19 @@ class ManifoldViewer(Screen):
         self.input = Input(self)
         self.input.scale = 1.0
 
-        # Scenes
-        self.scenes = create_scenes()
+        # Performance overlay (toggled with H)
+        self.frame_stats = FrameStats()
+        self.show_hud = False
+
+        # Retained drawing of the scene shapes, if the nanovg backend supports it
+        self.scene_layer = SceneLayer() if SceneLayer.supported() else None
+
+        # Session recording (toggled with F5) and replay, see session.py
+        self.recorder = None
+        self.player = None
+
+        # Scenes (built lazily on first selection)
+        self.scenes = scene_registry
         self.scene_idx = 0
         scene = self.scenes[self.scene_idx]
         self.offset = scene.offset
@@ -77,7 +97,7 @@ class ManifoldViewer(Screen):
         scene_reset.set_tooltip("Reset scene")
         self.scene_reset_cb = scene_reset_cb
         ### Scene selection
-        scene_selection = ComboBox(scene_tools, [s.name for s in self.scenes])
+        scene_selection = ComboBox(scene_tools, self.scenes.names())
         scene_selection.set_selected_index(self.scene_idx)
         scene_selection.set_fixed_width(260)
         def scene_selection_cb(idx):
@@ -138,6 +158,21 @@ class ManifoldViewer(Screen):
             self.set_visible(False)
             return True
 
+        if key == glfw.KEY_F5 and action == glfw.PRESS:
+            if self.recorder is None:
+                self.recorder = SessionRecorder(self)
+                print("Recording session")
+            else:
+                filename = time.strftime("session_%Y%m%d_%H%M%S.npz")
+                session = self.recorder.stop()
+                session.save(filename)
+                self.recorder = None
+                print("Recorded %d frames to %s" % (session.n_frames(), filename))
+            return True
+
+        if self.recorder is not None:
+            self.recorder.key_event(key, scancode, action, modifiers)
+
         if key == glfw.KEY_SPACE and action == glfw.PRESS:
             print("offset: ", self.offset)
             print("zoom: ", self.zoom)
@@ -164,6 +199,24 @@ class ManifoldViewer(Screen):
             self.scene_reset_cb()
             return True
 
+        if key == glfw.KEY_H and action == glfw.PRESS:
+            self.show_hud = not self.show_hud
+            return True
+
+        if key == glfw.KEY_P and action == glfw.PRESS:
+            # Toggle recording of a profiler trace
+            if not profiler.enabled:
+                profiler.clear()
+                profiler.enable()
+                print("Profiling started")
+            else:
+                profiler.disable()
+                filename = time.strftime("trace_%Y%m%d_%H%M%S.json")
+                profiler.save(filename)
+                print("Profiling stopped, trace written to %s" % filename)
+                profiler.print_summary()
+            return True
+
         if key == glfw.KEY_TAB and action == glfw.PRESS:
             self.window.set_visible(not self.window.visible())
 
@@ -196,6 +249,16 @@ class ManifoldViewer(Screen):
 
         return True
 
+    def apply_view(self, ctx):
+        size = self.size()
+        aspect = size[1] / size[0]
+
+        ctx.Scale(size[0], size[0])
+        ctx.Translate(+0.5, +0.5*aspect)
+        ctx.Scale(0.5, -0.5)
+        ctx.Scale(self.zoom, self.zoom)
+        ctx.Translate(self.offset[0], self.offset[1])
+
     def draw(self, ctx):
         if self.mode == ModeType.Raytracing:
             self.set_caption("Manifold 2D Visualization - Raytracing")
@@ -206,15 +269,16 @@ class ManifoldViewer(Screen):
         else:
             self.set_caption("Manifold 2D Visualization")
 
-        # Setup view transform
+        # Static scene geometry is drawn into an offscreen layer first (only redrawn
+        # when the view or the scene change), before anything else in this frame
         size = self.size()
-        aspect = size[1] / size[0]
+        scene = self.scenes[self.scene_idx]
+        if self.scene_layer is not None:
+            self.scene_layer.update(ctx, scene, self.apply_view, size, self.pixel_ratio())
+            scene.layer = self.scene_layer
 
-        ctx.Scale(size[0], size[0])
-        ctx.Translate(+0.5, +0.5*aspect)
-        ctx.Scale(0.5, -0.5)
-        ctx.Scale(self.zoom, self.zoom)
-        ctx.Translate(self.offset[0], self.offset[1])
+        # Setup view transform
+        self.apply_view(ctx)
         mvp = nvgCurrentTransform(ctx)
         mvp = np.array([
             [mvp[0], mvp[2], mvp[4]],
@@ -228,16 +292,34 @@ class ManifoldViewer(Screen):
         new_mp = np.array([mp[0], mp[1]])
         self.input.mouse_dp = new_mp - self.input.mouse_p
         self.input.mouse_p = new_mp
-
-        scene = self.scenes[self.scene_idx]
-        self.modes[self.mode].update(self.input, scene)
-        self.modes[self.mode].draw(ctx, scene)
+        if self.player is not None:
+            self.player.apply_input(self.input)
+
+        self.frame_stats.begin_frame()
+        t0 = time.perf_counter()
+        with profiler.scope('update'):
+            self.modes[self.mode].update(self.input, scene)
+        t1 = time.perf_counter()
+        with profiler.scope('draw'):
+            self.modes[self.mode].draw(ctx, scene)
+        self.frame_stats.end_frame(t1 - t0, time.perf_counter() - t1)
+        if self.recorder is not None:
+            self.recorder.record_frame(self.input, self.frame_stats)
 
         self.input.mouse_dp = np.array([0.0, 0.0])
         ctx.ResetTransform()
+        if self.show_hud:
+            draw_text_box(ctx, size[0] - 250, 10, self.frame_stats.hud_lines())
         super(ManifoldViewer, self).draw(ctx)
 
 if __name__ == "__main__":
+    # Additional scenes given on the command line: binary scene files and the SVG stress test
+    for arg in sys.argv[1:]:
+        if arg.endswith('.msc'):
+            register_scenes(register_scene_file, arg)
+        elif arg == '--svg-stress-test':
+            register_scenes(register_svg_stress_test)
+
     nanogui.init()
     app = ManifoldViewer()
     app.draw_all()
@@ -34,16 +34,23 @@ struct BoundingBox2f {
         max = enoki::max(max, bbox.max);
     }
 
-    std::tuple<bool, float, float> ray_intersect(const Ray2f &ray) {
-        bool active = all(neq(ray.d, zero<Vector2f>()) || ((ray.o > min) || (ray.o < max)));
+    // Intersect with a single ray (Value = Float) or a packet of rays (Value = FloatN<N>)
+    template <typename Value>
+    std::tuple<mask_t<Value>, Value, Value> ray_intersect(const Ray2<Value> &ray) const {
+        using Vector = Array<Value, 2>;
 
-        Vector2f t1 = (min - ray.o) * rcp(ray.d),
-                 t2 = (max - ray.o) * rcp(ray.d);
+        Vector bmin(Value(min[0]), Value(min[1])),
+               bmax(Value(max[0]), Value(max[1]));
 
-        Vector2f t1p = enoki::min(t1, t2),
-                 t2p = enoki::max(t1, t2);
+        mask_t<Value> active = all(neq(ray.d, zero<Vector>()) || ((ray.o > bmin) || (ray.o < bmax)));
 
-        float mint = hmax(t1p),
+        Vector t1 = (bmin - ray.o) * rcp(ray.d),
+               t2 = (bmax - ray.o) * rcp(ray.d);
+
+        Vector t1p = enoki::min(t1, t2),
+               t2p = enoki::max(t1, t2);
+
+        Value mint = hmax(t1p),
               maxt = hmin(t2p);
 
         active = active && (maxt >= mint);
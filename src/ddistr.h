@@ -22,7 +22,7 @@ class DiscreteDistribution {
 public:
     DiscreteDistribution() {}
 
-    DiscreteDistribution(const float *f, int n) : m_func(f, f + n), m_cdf(n + 1) {
+    DiscreteDistribution(const Float *f, int n) : m_func(f, f + n), m_cdf(n + 1) {
         m_cdf[0] = 0.f;
         for (int i = 1; i < n + 1; ++i) {
             m_cdf[i] = m_cdf[i - 1] + m_func[i - 1];
@@ -35,39 +35,39 @@ public:
         }
     }
 
-    inline float operator[](int i) const {
+    inline Float operator[](int i) const {
         return m_cdf[i+1] - m_cdf[i];
     }
 
-    inline float cdf(int i) const {
+    inline Float cdf(int i) const {
         return m_cdf[i];
     }
 
-    inline int sample(float u) const {
+    inline int sample(Float u) const {
         return find_interval(int(m_cdf.size()), [&](int index) { return m_cdf[index] <= u; });
     }
 
-    inline int sample(float u, float &pdf) const {
+    inline int sample(Float u, Float &pdf) const {
         int offset = sample(u);
         pdf = m_func[offset] * m_normalization;
         return offset;
     }
 
-    inline int sample_reuse(float &u) const {
+    inline int sample_reuse(Float &u) const {
         int offset = sample(u);
         u = (u - m_cdf[offset]) / (m_cdf[offset + 1] - m_cdf[offset]);
         return offset;
     }
 
-    inline int sample_reuse(float &u, float &pdf) {
+    inline int sample_reuse(Float &u, Float &pdf) {
         int offset = sample(u, pdf);
         u = (u - m_cdf[offset]) / (m_cdf[offset + 1] - m_cdf[offset]);
         return offset;
     }
 
-    inline float normalization() const { return m_normalization; }
+    inline Float normalization() const { return m_normalization; }
 
 private:
-    std::vector<float> m_func, m_cdf;
-    float m_normalization;
+    std::vector<Float> m_func, m_cdf;
+    Float m_normalization;
 };
\ No newline at end of file
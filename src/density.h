@@ -0,0 +1,49 @@
+#pragma once
+
+#include <global.h>
+
+// Clip the segment a + t*(b - a), t in [0, 1] to the box [0, w] x [0, h] (Liang-Barsky).
+inline bool clip_segment(Point2f &a, Point2f &b, Float w, Float h) {
+    Vector2f d = b - a;
+    Float t0 = 0.f, t1 = 1.f;
+    Float p[4] = { -d[0], d[0], -d[1], d[1] },
+          q[4] = { a[0], w - a[0], a[1], h - a[1] };
+    for (int i = 0; i < 4; ++i) {
+        if (p[i] == 0) {
+            if (q[i] < 0) return false;
+            continue;
+        }
+        Float t = q[i] / p[i];
+        if (p[i] < 0) t0 = max(t0, t);
+        else          t1 = min(t1, t);
+        if (t0 > t1) return false;
+    }
+    Point2f a_ = a + t0*d;
+    b = a + t1*d;
+    a = a_;
+    return true;
+}
+
+// Accumulate `n` line segments (given in pixel coordinates) into a row-major
+// `width` x `height` density image. Every covered pixel receives one unit of
+// weight per pixel of segment length.
+inline void splat_segments(const Float *a, const Float *b, size_t n,
+                           float *image, int width, int height) {
+    for (size_t i = 0; i < n; ++i) {
+        Point2f p0(a[2*i], a[2*i + 1]),
+                p1(b[2*i], b[2*i + 1]);
+        if (!clip_segment(p0, p1, Float(width), Float(height)))
+            continue;
+
+        Vector2f d = p1 - p0;
+        int steps = max(1, int(std::ceil(max(abs(d[0]), abs(d[1])))));
+        Float inv_steps = rcp(Float(steps));
+        for (int k = 0; k < steps; ++k) {
+            Point2f p = p0 + (k + 0.5f)*inv_steps*d;
+            int x = int(p[0]), y = int(p[1]);
+            if (x < 0 || y < 0 || x >= width || y >= height)
+                continue;
+            image[y*width + x] += 1.f;
+        }
+    }
+}
@@ -0,0 +1,54 @@
+#pragma once
+
+#include <global.h>
+#include <stdexcept>
+
+#include <nanogui/opengl.h>
+#define NANOVG_GL3
+#include <nanovg_gl.h>
+#include <nanovg_gl_utils.h>
+
+// Offscreen nanovg render target (OpenGL backend only). nanovg renders a whole frame
+// at once, so drawing into the framebuffer happens in a nanovg frame of its own:
+// `begin` must be called before anything was drawn in the current frame, and `end`
+// starts the interrupted frame (of the same size) again.
+class Framebuffer {
+public:
+    Framebuffer(NVGcontext *ctx, int width, int height, float pixel_ratio)
+        : width(width), height(height), pixel_ratio(pixel_ratio), m_ctx(ctx) {
+        m_fb = nvgluCreateFramebuffer(ctx, int(width*pixel_ratio), int(height*pixel_ratio), 0);
+        if (!m_fb)
+            throw std::runtime_error("Framebuffer(): could not create framebuffer!");
+    }
+
+    ~Framebuffer() {
+        nvgluDeleteFramebuffer(m_fb);
+    }
+
+    void begin() {
+        glGetIntegerv(GL_VIEWPORT, m_viewport);
+        nvgluBindFramebuffer(m_fb);
+        glViewport(0, 0, int(width*pixel_ratio), int(height*pixel_ratio));
+        glClearColor(0.f, 0.f, 0.f, 0.f);
+        glClear(GL_COLOR_BUFFER_BIT | GL_STENCIL_BUFFER_BIT);
+        nvgBeginFrame(m_ctx, float(width), float(height), pixel_ratio);
+    }
+
+    void end() {
+        nvgEndFrame(m_ctx);
+        nvgluBindFramebuffer(nullptr);
+        glViewport(m_viewport[0], m_viewport[1], m_viewport[2], m_viewport[3]);
+        nvgBeginFrame(m_ctx, float(width), float(height), pixel_ratio);
+    }
+
+    // nanovg image handle of the color buffer (premultiplied alpha)
+    int image() const { return m_fb->image; }
+
+    const int width, height;
+    const float pixel_ratio;
+
+private:
+    NVGcontext *m_ctx;
+    NVGLUframebuffer *m_fb;
+    GLint m_viewport[4];
+};
@@ -1,5 +1,6 @@
 #pragma once
 
+#include <algorithm>
 #include <iostream>
 #include <string>
 #include <vector>
@@ -11,11 +12,22 @@ using namespace enoki;
 
 #define VERSION "0.0.1"
 
-constexpr float Pi           = 3.14159265358979323846f;
-constexpr float InvTwoPi     = 0.15915494309189533577f;
-constexpr float Epsilon      = 1e-3f;
-constexpr float Infinity     = std::numeric_limits<float>::infinity();
-constexpr float MaxFloat     = std::numeric_limits<float>::max();
+// Scalar type of all geometry. Building with MANIFOLDS_DOUBLE_PRECISION defined
+// produces the `manifolds_double` module, used when Newton solves need to
+// converge below single precision round-off.
+#if defined(MANIFOLDS_DOUBLE_PRECISION)
+using Float = double;
+using UInt  = uint64_t;
+#else
+using Float = float;
+using UInt  = uint32_t;
+#endif
+
+constexpr Float Pi           = Float(3.14159265358979323846);
+constexpr Float InvTwoPi     = Float(0.15915494309189533577);
+constexpr Float Epsilon      = Float(1e-3);
+constexpr Float Infinity     = std::numeric_limits<Float>::infinity();
+constexpr Float MaxFloat     = std::numeric_limits<Float>::max();
 
 #include <nanovg.h>
 
@@ -45,31 +57,60 @@ extern "C" {
     typedef struct NVGcontext { int unused; } NVGcontext;
 };
 
-using Vector2f = Array<float, 2>;
+using Vector2f = Array<Float, 2>;
 using Vector2i = Array<int32_t, 2>;
 
-using Point2f = Array<float, 2>;
+using Point2f = Array<Float, 2>;
 
-using Matrix2f = Matrix<float, 2>;
+using Matrix2f = Matrix<Float, 2>;
 
-inline float rad_to_deg(float rad) {
+// SIMD packet types, templated on the packet width. `PacketSize` is the widest
+// width supported by the instruction set enoki was compiled for (e.g. 8 floats
+// on AVX2, 16 floats on AVX-512). Indices use an integer type of the same width
+// as `Float` so that masks can be shared between them.
+constexpr size_t PacketSize = array_default_size;
+
+template <size_t N> using FloatN    = Packet<Float, N>;
+template <size_t N> using UIntN     = Packet<UInt, N>;
+template <size_t N> using MaskN     = mask_t<FloatN<N>>;
+template <size_t N> using Vector2fN = Array<FloatN<N>, 2>;
+template <size_t N> using Point2fN  = Array<FloatN<N>, 2>;
+
+using FloatP    = FloatN<PacketSize>;
+using UIntP     = UIntN<PacketSize>;
+using MaskP     = MaskN<PacketSize>;
+using Vector2fP = Vector2fN<PacketSize>;
+using Point2fP  = Point2fN<PacketSize>;
+
+// Broadcast a scalar 2D vector to all lanes of a packet
+template <size_t N>
+inline Vector2fN<N> to_packet(const Vector2f &v) {
+    return Vector2fN<N>(FloatN<N>(v[0]), FloatN<N>(v[1]));
+}
+
+inline Float rad_to_deg(Float rad) {
     return rad * (180 / Pi);
 }
 
-inline float deg_to_rad(float deg) {
+inline Float deg_to_rad(Float deg) {
     return deg * (Pi / 180);
 }
 
-inline float cross(const Vector2f &v0, const Vector2f &v1) {
+inline Float cross(const Vector2f &v0, const Vector2f &v1) {
+    return v0[0]*v1[1] - v0[1]*v1[0];
+}
+
+template <size_t N>
+inline FloatN<N> cross(const Vector2fN<N> &v0, const Vector2fN<N> &v1) {
     return v0[0]*v1[1] - v0[1]*v1[0];
 }
 
 template <typename T>
-inline T lerp(float t, T a, T b) {
+inline T lerp(Float t, T a, T b) {
     return a + t * (b - a);
 }
 
-inline std::tuple<bool, float, float> solve_quadratic(float a, float b, float c) {
+inline std::tuple<bool, Float, Float> solve_quadratic(Float a, Float b, Float c) {
     /* Is this perhaps a linear equation? */
     bool linear_case = eq(a, 0.f);
 
@@ -77,15 +118,15 @@ inline std::tuple<bool, float, float> solve_quadratic(float a, float b, float c)
     bool active = !linear_case || (b > 0.f);
 
     /* Initialize solution with that of linear equation */
-    float x0, x1;
+    Float x0, x1;
     x0 = x1 = -c / b;
 
     /* Check if the quadratic equation is solvable */
-    float discrim = fmsub(b, b, 4.f * a * c);
+    Float discrim = fmsub(b, b, 4.f * a * c);
     active &= linear_case || (discrim >= 0);
 
     if (active) {
-        float sqrt_discrim = sqrt(discrim);
+        Float sqrt_discrim = sqrt(discrim);
 
         /* Numerically stable version of (-b (+/-) sqrt_discrim) / (2 * a)
          *
@@ -94,13 +135,106 @@ inline std::tuple<bool, float, float> solve_quadratic(float a, float b, float c)
          * greater magnitude which does not suffer from loss of
          * precision and then uses the identity x1 * x2 = c / a
          */
-        float temp = -0.5f * (b + copysign(sqrt_discrim, b));
+        Float temp = -0.5f * (b + copysign(sqrt_discrim, b));
 
-        float x0p = temp / a,
+        Float x0p = temp / a,
               x1p = c / temp;
 
         /* Order the results so that x0 < x1 */
-        float x0m = min(x0p, x1p),
+        Float x0m = min(x0p, x1p),
+              x1m = max(x0p, x1p);
+
+        x0 = select(linear_case, x0, x0m);
+        x1 = select(linear_case, x0, x1m);
+    }
+
+    return std::make_tuple(active, x0, x1);
+}
+
+/* Real roots of a*x^3 + b*x^2 + c*x + d = 0 in ascending order. Returns the
+   number of roots written to `roots` (up to three, repeated roots count once). */
+inline int solve_cubic(Float a, Float b, Float c, Float d, Float roots[3]) {
+    Float scale = max(abs(b), max(abs(c), abs(d)));
+
+    /* Degenerate case: quadratic or linear equation */
+    if (abs(a) <= 1e-6f * scale) {
+        if (abs(b) <= 1e-6f * max(abs(c), abs(d))) {
+            if (eq(c, 0.f))
+                return 0;
+            roots[0] = -d / c;
+            return 1;
+        }
+
+        Float discrim = fmsub(c, c, 4.f * b * d);
+        if (discrim < 0.f)
+            return 0;
+
+        /* Same numerically stable formulation as in `solve_quadratic` */
+        Float temp = -0.5f * (c + copysign(sqrt(discrim), c));
+        if (eq(temp, 0.f)) {
+            roots[0] = 0.f;
+            return 1;
+        }
+        Float x0 = temp / b,
+              x1 = d / temp;
+        roots[0] = min(x0, x1);
+        roots[1] = max(x0, x1);
+        return 2;
+    }
+
+    /* Substitute x = y - b/(3a) to obtain the depressed cubic y^3 + p*y + q = 0 */
+    Float A = b / a, B = c / a, C = d / a,
+          A3 = A * (1.f / 3.f);
+    Float p3 = (B - A*A3) * (1.f / 3.f),
+          q2 = 0.5f * (2.f*A3*A3*A3 - A3*B + C);
+    Float discrim = q2*q2 + p3*p3*p3;
+
+    if (discrim > 0.f) {
+        /* One real root (Cardano's formula), avoiding cancellation in -q/2 +/- sqrt(discrim) */
+        Float u = cbrt(-q2 - copysign(sqrt(discrim), q2)),
+              v = eq(u, 0.f) ? Float(0.f) : -p3 / u;
+        roots[0] = u + v - A3;
+        return 1;
+    }
+
+    /* Three real roots (trigonometric method) */
+    if (eq(p3, 0.f)) {
+        roots[0] = -A3;
+        return 1;
+    }
+    Float s = sqrt(-p3),
+          phi = acos(clamp(-q2 / (s*s*s), Float(-1.f), Float(1.f))) * (1.f / 3.f);
+    for (int k = 0; k < 3; ++k)
+        roots[k] = 2.f*s*cos(phi - k * (2.f * Pi / 3.f)) - A3;
+    std::sort(roots, roots + 3);
+    return 3;
+}
+
+template <size_t N>
+inline std::tuple<MaskN<N>, FloatN<N>, FloatN<N>> solve_quadratic(const FloatN<N> &a,
+                                                                  const FloatN<N> &b,
+                                                                  const FloatN<N> &c) {
+    using Value = FloatN<N>;
+    using Mask  = MaskN<N>;
+
+    /* Same as above, but for a whole packet of equations at once */
+    Mask linear_case = eq(a, 0.f);
+    Mask active = !linear_case || (b > 0.f);
+
+    Value x0 = -c / b,
+          x1 = x0;
+
+    Value discrim = fmsub(b, b, 4.f * a * c);
+    active &= linear_case || (discrim >= 0.f);
+
+    if (any(active)) {
+        Value sqrt_discrim = sqrt(discrim);
+        Value temp = -0.5f * (b + copysign(sqrt_discrim, b));
+
+        Value x0p = temp / a,
+              x1p = c / temp;
+
+        Value x0m = min(x0p, x1p),
               x1m = max(x0p, x1p);
 
         x0 = select(linear_case, x0, x0m);
@@ -108,4 +242,4 @@ inline std::tuple<bool, float, float> solve_quadratic(float a, float b, float c)
     }
 
     return std::make_tuple(active, x0, x1);
-}
\ No newline at end of file
+}
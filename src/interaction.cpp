@@ -16,3 +16,50 @@ std::string Interaction::to_string() const {
         << "]";
     return oss.str();
 }
+
+void InteractionBatch::resize(size_t size) {
+    rayt.assign(size, Infinity);
+    p.assign(2*size, 0.f);
+    n.assign(2*size, 0.f);
+    dp_du.assign(2*size, 0.f);
+    dn_du.assign(2*size, 0.f);
+    s.assign(2*size, 0.f);
+    ds_du.assign(2*size, 0.f);
+    u.assign(size, 0.f);
+    eta.assign(size, 1.f);
+    shape_id.assign(size, -1);
+    shape.assign(size, nullptr);
+}
+
+void InteractionBatch::set(size_t i, const Interaction &it) {
+    rayt[i] = it.rayt;
+    for (size_t k = 0; k < 2; ++k) {
+        p[2*i + k]     = it.p[k];
+        n[2*i + k]     = it.n[k];
+        dp_du[2*i + k] = it.dp_du[k];
+        dn_du[2*i + k] = it.dn_du[k];
+        s[2*i + k]     = it.s[k];
+        ds_du[2*i + k] = it.ds_du[k];
+    }
+    u[i] = it.u;
+    eta[i] = it.eta;
+    shape_id[i] = it.shape ? it.shape->id : -1;
+    shape[i] = it.shape;
+}
+
+Interaction InteractionBatch::get(size_t i) const {
+    Interaction it;
+    it.rayt = rayt[i];
+    it.p     = Point2f(p[2*i], p[2*i + 1]);
+    it.n     = Vector2f(n[2*i], n[2*i + 1]);
+    it.dp_du = Vector2f(dp_du[2*i], dp_du[2*i + 1]);
+    it.dn_du = Vector2f(dn_du[2*i], dn_du[2*i + 1]);
+    it.s     = Vector2f(s[2*i], s[2*i + 1]);
+    it.ds_du = Vector2f(ds_du[2*i], ds_du[2*i + 1]);
+    it.n_offset = Vector2f(0.f, 1.f);
+    it.u = u[i];
+    it.eta = eta[i];
+    it.shape = shape[i];
+    return it;
+}
+
@@ -6,7 +6,7 @@ class Shape;
 
 struct Interaction {
     // Distance of the interaction along ray
-    float rayt = Infinity;
+    Float rayt = Infinity;
 
     // Position of the interaction
     Point2f p;
@@ -30,10 +30,10 @@ struct Interaction {
     Vector2f n_offset;
 
     // Hit position in local parameterization
-    float u;
+    Float u;
 
     // Relative index of refraction at the interaction
-    float eta;
+    Float eta;
 
     // Associated shape
     const Shape *shape = nullptr;
@@ -43,3 +43,22 @@ struct Interaction {
 
     bool is_valid() const { return rayt < Infinity; }
 };
+
+// Structure-of-arrays storage for the interactions of a batch of rays.
+// 2D quantities are stored interleaved, i.e. as (x0, y0, x1, y1, ...).
+struct InteractionBatch {
+    std::vector<Float> rayt, p, n, dp_du, dn_du, s, ds_du, u, eta;
+    std::vector<int32_t> shape_id;
+    std::vector<const Shape *> shape;
+
+    InteractionBatch(size_t size = 0) { resize(size); }
+
+    size_t size() const { return rayt.size(); }
+
+    // Resize the batch, resetting all entries to invalid interactions
+    void resize(size_t size);
+
+    void set(size_t i, const Interaction &it);
+    Interaction get(size_t i) const;
+};
+
@@ -0,0 +1,72 @@
+#include <python/python.h>
+
+#include <density.h>
+
+#if defined(NANOGUI_USE_OPENGL)
+#  define NANOVG_GL_UTILS_IMPLEMENTATION
+#  include <framebuffer.h>
+#endif
+
+#include <pybind11/numpy.h>
+
+PYTHON_EXPORT(Draw) {
+    m.def("splat_segments",
+          [](py::array_t<Float, py::array::c_style | py::array::forcecast> a,
+             py::array_t<Float, py::array::c_style | py::array::forcecast> b,
+             int width, int height) {
+              if (a.ndim() != 2 || a.shape(1) != 2 || b.ndim() != 2 || b.shape(1) != 2 ||
+                  a.shape(0) != b.shape(0))
+                  throw std::invalid_argument("splat_segments(): expected two arrays of shape (N, 2)!");
+              py::array_t<float> image({ size_t(height), size_t(width) });
+              float *data = image.mutable_data();
+              std::fill(data, data + size_t(width)*height, 0.f);
+              {
+                  py::gil_scoped_release release;
+                  splat_segments(a.data(), b.data(), a.shape(0), data, width, height);
+              }
+              return image;
+          },
+          "a"_a, "b"_a, "width"_a, "height"_a);
+
+    // Image handling is not exposed by the nanogui Python API either.
+    m.def("nvgCreateImageRGBA",
+          [](NVGcontext *ctx, py::array_t<uint8_t, py::array::c_style | py::array::forcecast> rgba) {
+              if (rgba.ndim() != 3 || rgba.shape(2) != 4)
+                  throw std::invalid_argument("nvgCreateImageRGBA(): expected an array of shape (H, W, 4)!");
+              return nvgCreateImageRGBA(ctx, int(rgba.shape(1)), int(rgba.shape(0)), 0, rgba.data());
+          });
+
+    m.def("nvgUpdateImage",
+          [](NVGcontext *ctx, int image, py::array_t<uint8_t, py::array::c_style | py::array::forcecast> rgba) {
+              int w, h;
+              nvgImageSize(ctx, image, &w, &h);
+              if (rgba.ndim() != 3 || rgba.shape(0) != h || rgba.shape(1) != w || rgba.shape(2) != 4)
+                  throw std::invalid_argument("nvgUpdateImage(): array does not match image size!");
+              nvgUpdateImage(ctx, image, rgba.data());
+          });
+
+    m.def("nvgDeleteImage", &nvgDeleteImage);
+
+    // Fill the rectangle (x, y, w, h) with an image
+    m.def("nvgDrawImage",
+          [](NVGcontext *ctx, int image, float x, float y, float w, float h, float alpha) {
+              NVGpaint paint = nvgImagePattern(ctx, x, y, w, h, 0.f, image, alpha);
+              nvgBeginPath(ctx);
+              nvgRect(ctx, x, y, w, h);
+              nvgFillPaint(ctx, paint);
+              nvgFill(ctx);
+          },
+          "ctx"_a, "image"_a, "x"_a, "y"_a, "w"_a, "h"_a, "alpha"_a=1.f);
+
+#if defined(NANOGUI_USE_OPENGL)
+    // Offscreen render target for retained drawing (only with nanogui's OpenGL backend)
+    py::class_<Framebuffer>(m, "Framebuffer")
+        .def(py::init<NVGcontext *, int, int, float>(), "ctx"_a, "width"_a, "height"_a, "pixel_ratio"_a)
+        .def("begin", &Framebuffer::begin)
+        .def("end", &Framebuffer::end)
+        .def_property_readonly("image", &Framebuffer::image)
+        .def_readonly("width", &Framebuffer::width)
+        .def_readonly("height", &Framebuffer::height)
+        .def_readonly("pixel_ratio", &Framebuffer::pixel_ratio);
+#endif
+}
@@ -3,6 +3,17 @@
 #include <interaction.h>
 #include <shape.h>
 
+#include <pybind11/numpy.h>
+
+// Expose (parts of) the batch storage as NumPy arrays without copying
+template <typename T>
+py::array_t<T> batch_array(py::handle owner, const std::vector<T> &v, size_t dim) {
+    size_t size = v.size() / dim;
+    if (dim == 1)
+        return py::array_t<T>({ size }, v.data(), owner);
+    return py::array_t<T>({ size, dim }, v.data(), owner);
+}
+
 PYTHON_EXPORT(Interaction) {
     py::class_<Interaction>(m, "Interaction", "2D Interaction record", py::dynamic_attr())
         .def(py::init<>())
@@ -34,4 +45,31 @@ PYTHON_EXPORT(Interaction) {
             new_in.shape = in.shape;
             return new_in;
         });
+
+    py::class_<InteractionBatch>(m, "InteractionBatch", "Batch of 2D interaction records (structure of arrays)")
+        .def(py::init<size_t>(), "size"_a=0)
+        .def("__len__", &InteractionBatch::size)
+        .def("__getitem__", [](const InteractionBatch &batch, size_t i) {
+            if (i >= batch.size())
+                throw py::index_error();
+            return batch.get(i);
+        })
+        .def("set", &InteractionBatch::set, "i"_a, "it"_a)
+        .def_property_readonly("rayt",     [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().rayt, 1); })
+        .def_property_readonly("p",        [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().p, 2); })
+        .def_property_readonly("n",        [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().n, 2); })
+        .def_property_readonly("dp_du",    [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().dp_du, 2); })
+        .def_property_readonly("dn_du",    [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().dn_du, 2); })
+        .def_property_readonly("s",        [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().s, 2); })
+        .def_property_readonly("ds_du",    [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().ds_du, 2); })
+        .def_property_readonly("u",        [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().u, 1); })
+        .def_property_readonly("eta",      [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().eta, 1); })
+        .def_property_readonly("shape_id", [](py::object self) { return batch_array(self, self.cast<const InteractionBatch &>().shape_id, 1); })
+        .def("is_valid", [](const InteractionBatch &batch) {
+            py::array_t<bool> valid(batch.size());
+            auto v = valid.mutable_unchecked<1>();
+            for (size_t i = 0; i < batch.size(); ++i)
+                v(i) = batch.shape_id[i] >= 0;
+            return valid;
+        });
 }
@@ -4,12 +4,20 @@ PYTHON_DECLARE(Ray2f);
 PYTHON_DECLARE(Interaction);
 PYTHON_DECLARE(Shape);
 PYTHON_DECLARE(Scene);
+PYTHON_DECLARE(Draw);
 
-PYBIND11_MODULE(manifolds, m) {
+// The double precision variant of the library is built as a separate module
+#if !defined(MANIFOLDS_MODULE_NAME)
+#  define MANIFOLDS_MODULE_NAME manifolds
+#endif
+
+PYBIND11_MODULE(MANIFOLDS_MODULE_NAME, m) {
     m.doc() = "manifold viewer python library";
+    m.attr("double_precision") = sizeof(Float) == sizeof(double);
 
     PYTHON_IMPORT(Ray2f);
     PYTHON_IMPORT(Interaction);
     PYTHON_IMPORT(Shape);
     PYTHON_IMPORT(Scene);
+    PYTHON_IMPORT(Draw);
 }
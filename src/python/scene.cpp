@@ -3,11 +3,25 @@
 #include <scene.h>
 #include <shape.h>
 
+#include <pybind11/numpy.h>
+
 PYTHON_EXPORT(Scene) {
     py::class_<Scene>(m, "Scene", "Scene", py::dynamic_attr())
         .def(py::init<>())
         .def("add_shape", &Scene::add_shape)
         .def("ray_intersect", &Scene::ray_intersect)
+        .def("ray_intersect_batch",
+             [](const Scene &scene,
+                py::array_t<Float, py::array::c_style | py::array::forcecast> o,
+                py::array_t<Float, py::array::c_style | py::array::forcecast> d,
+                Float mint, Float maxt) {
+                 if (o.ndim() != 2 || o.shape(1) != 2 || d.ndim() != 2 || d.shape(1) != 2 ||
+                     o.shape(0) != d.shape(0))
+                     throw std::invalid_argument("Scene::ray_intersect_batch(): expected two arrays of shape (N, 2)!");
+                 py::gil_scoped_release release;
+                 return scene.ray_intersect_batch(o.data(), d.data(), o.shape(0), mint, maxt);
+             },
+             "o"_a, "d"_a, "mint"_a=Epsilon, "maxt"_a=Infinity)
         .def("draw", &Scene::draw)
         .def("shape", &Scene::shape)
         .def("start_shape", &Scene::start_shape)
@@ -9,6 +9,8 @@
 
 #include <nanovg.h>
 
+#include <pybind11/numpy.h>
+
 PYTHON_EXPORT(Shape) {
     auto shape = py::class_<Shape, std::shared_ptr<Shape>>(m, "Shape", py::dynamic_attr())
         .def_readwrite("name", &Shape::name)
@@ -27,8 +29,28 @@ PYTHON_EXPORT(Shape) {
              "hole"_a)
         .def("sample_position", &Shape::sample_position,
              "sample"_a)
+        .def("sample_position_batch",
+             [](const Shape &shape, py::array_t<Float, py::array::c_style | py::array::forcecast> samples) {
+                 if (samples.ndim() != 1)
+                     throw std::invalid_argument("Shape::sample_position_batch(): expected a 1D array!");
+                 py::gil_scoped_release release;
+                 return shape.sample_position_batch(samples.data(), samples.shape(0));
+             },
+             "samples"_a)
         .def("project", &Shape::project,
              "p"_a)
+        .def("project_batch",
+             [](const Shape &shape, py::array_t<Float, py::array::c_style | py::array::forcecast> p) {
+                 if (p.ndim() != 2 || p.shape(1) != 2)
+                     throw std::invalid_argument("Shape::project_batch(): expected an array of shape (N, 2)!");
+                 std::vector<Float> result;
+                 {
+                     py::gil_scoped_release release;
+                     result = shape.project_batch(p.data(), p.shape(0));
+                 }
+                 return py::array_t<Float>(result.size(), result.data());
+             },
+             "p"_a)
         .def("draw", &Shape::draw,
              "ctx"_a, "hole"_a=false);
 
@@ -40,25 +62,57 @@ PYTHON_EXPORT(Shape) {
         .value("Refraction", Shape::Type::Refraction);
 
     py::class_<Circle, Shape, std::shared_ptr<Circle>>(m, "Circle")
-        .def(py::init<const Vector2f &, float>());
+        .def(py::init<const Vector2f &, Float>())
+        .def_property_readonly("center", &Circle::center)
+        .def_property_readonly("radius", &Circle::radius)
+        .def_property_readonly("flipped", &Circle::flipped);
 
     py::class_<ConcaveSegment, Shape, std::shared_ptr<ConcaveSegment>>(m, "ConcaveSegment")
-        .def(py::init<const Point2f &, const Point2f &, float>())
+        .def(py::init<const Point2f &, const Point2f &, Float>())
+        .def_property_readonly("a", &ConcaveSegment::a)
+        .def_property_readonly("b", &ConcaveSegment::b)
+        .def_property_readonly("arc_radius", &ConcaveSegment::arc_radius)
         .def_readwrite("gradient_start", &ConcaveSegment::gradient_start)
         .def_readwrite("gradient_width", &ConcaveSegment::gradient_width);
 
     py::class_<ConvexSegment, Shape, std::shared_ptr<ConvexSegment>>(m, "ConvexSegment")
-        .def(py::init<const Point2f &, const Point2f &, float, bool>(),
+        .def(py::init<const Point2f &, const Point2f &, Float, bool>(),
              "a"_a, "b"_a, "radius"_a, "alt"_a=false)
+        .def_property_readonly("a", &ConvexSegment::a)
+        .def_property_readonly("b", &ConvexSegment::b)
+        .def_property_readonly("arc_radius", &ConvexSegment::arc_radius)
+        .def_property_readonly("alt", &ConvexSegment::alt)
         .def_readwrite("gradient_start", &ConvexSegment::gradient_start)
         .def_readwrite("gradient_width", &ConvexSegment::gradient_width);
 
     py::class_<LinearSegment, Shape, std::shared_ptr<LinearSegment>>(m, "LinearSegment")
         .def(py::init<const Point2f &, const Point2f &>())
+        .def_property_readonly("a", &LinearSegment::a)
+        .def_property_readonly("b", &LinearSegment::b)
         .def_readwrite("gradient_start", &LinearSegment::gradient_start)
         .def_readwrite("gradient_width", &LinearSegment::gradient_width)
         .def_readwrite("height", &LinearSegment::height);
 
     py::class_<BezierCurve, Shape, std::shared_ptr<BezierCurve>>(m, "BezierCurve")
-        .def(py::init<const std::vector<float> &, const std::vector<float> &>());
+        .def(py::init<const std::vector<Float> &, const std::vector<Float> &>())
+        .def(py::init([](py::array_t<Float, py::array::c_style | py::array::forcecast> pts) {
+                 if (pts.ndim() != 2 || pts.shape(1) != 2)
+                     throw std::invalid_argument("BezierCurve(): expected control points of shape (N, 2)!");
+                 return std::make_shared<BezierCurve>(pts.data(), size_t(pts.shape(0)));
+             }),
+             "pts"_a)
+        .def_property_readonly("control_points", [](const BezierCurve &curve) {
+            // All control points as one (4 * #splines, 2) array
+            const auto &splines = curve.splines();
+            py::array_t<Float> pts({ 4*splines.size(), size_t(2) });
+            auto v = pts.mutable_unchecked<2>();
+            for (size_t i = 0; i < splines.size(); ++i) {
+                for (size_t k = 0; k < 4; ++k) {
+                    v(4*i + k, 0) = splines[i].p[k][0];
+                    v(4*i + k, 1) = splines[i].p[k][1];
+                }
+            }
+            return pts;
+        })
+        .def_readwrite("exact_intersection", &BezierCurve::exact_intersection);
 }
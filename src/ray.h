@@ -2,19 +2,25 @@
 
 #include <global.h>
 
-struct Ray2f {
-    Point2f o;
-    Vector2f d;
-    float mint = Epsilon;
-    float maxt = Infinity;
+template <typename Value>
+struct Ray2 {
+    using Vector = Array<Value, 2>;
+    using Point  = Array<Value, 2>;
 
-    Ray2f(const Point2f &o, const Vector2f &d)
+    Point o;
+    Vector d;
+    Value mint = Epsilon;
+    Value maxt = Infinity;
+
+    Ray2() {}
+
+    Ray2(const Point &o, const Vector &d)
         : o(o), d(d) {}
 
-    Ray2f(const Point2f &o, const Vector2f &d, float mint, float maxt)
+    Ray2(const Point &o, const Vector &d, Value mint, Value maxt)
         : o(o), d(d), mint(mint), maxt(maxt) {}
 
-    Point2f operator() (float t) const { return fmadd(d, t, o); }
+    Point operator() (Value t) const { return fmadd(d, t, o); }
 
     std::string to_string() const {
         std::ostringstream oss;
@@ -27,3 +33,9 @@ struct Ray2f {
         return oss.str();
     }
 };
+
+using Ray2f = Ray2<Float>;
+
+// Packet of rays that are traced together
+template <size_t N> using Ray2fN = Ray2<FloatN<N>>;
+using Ray2fP = Ray2fN<PacketSize>;
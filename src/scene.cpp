@@ -42,7 +42,7 @@ void Scene::add_shape(std::shared_ptr<Shape> shape) {
 Interaction Scene::ray_intersect(const Ray2f &ray_) const {
     bool found_hit = false;
     size_t idx = -1;
-    float spline_t = -1.f;
+    Float spline_t = -1.f;
     size_t spline_idx = -1;
     Ray2f ray(ray_);
 
@@ -68,6 +68,69 @@ Interaction Scene::ray_intersect(const Ray2f &ray_) const {
     return Interaction();
 }
 
+std::tuple<MaskP, FloatP, UIntP, FloatP, UIntP> Scene::ray_intersect_packet(const Ray2fP &ray_, MaskP active) const {
+    MaskP found_hit = false;
+    UIntP idx = 0;
+    FloatP spline_t = -1.f;
+    UIntP spline_idx = 0;
+    Ray2fP ray(ray_);
+
+    for (uint32_t k = 0; k < m_shapes.size(); ++k) {
+        auto [hit_bbox, unused_0, unused_1] = m_shapes[k]->bbox.ray_intersect(ray);
+        hit_bbox &= active;
+        if (none(hit_bbox))
+            continue;
+
+        auto [hit, t, st, sidx] = m_shapes[k]->ray_intersect_packet(ray, hit_bbox);
+        hit &= hit_bbox && t > ray.mint && t < ray.maxt;
+
+        found_hit |= hit;
+        idx        = select(hit, UIntP(k), idx);
+        spline_t   = select(hit, st, spline_t);
+        spline_idx = select(hit, sidx, spline_idx);
+        ray.maxt   = select(hit, t, ray.maxt);
+    }
+
+    return { found_hit, select(found_hit, ray.maxt, FloatP(Infinity)), idx, spline_t, spline_idx };
+}
+
+InteractionBatch Scene::ray_intersect_batch(const Float *o, const Float *d, size_t n,
+                                            Float mint, Float maxt) const {
+    InteractionBatch result(n);
+
+    for (size_t i = 0; i < n; i += PacketSize) {
+        size_t count = std::min(PacketSize, n - i);
+
+        // Gather rays into a packet, unused lanes are masked out
+        Ray2fP ray(zero<Point2fP>(), zero<Vector2fP>(), mint, maxt);
+        for (size_t j = 0; j < count; ++j) {
+            for (size_t k = 0; k < 2; ++k) {
+                ray.o[k].coeff(j) = o[2*(i + j) + k];
+                ray.d[k].coeff(j) = d[2*(i + j) + k];
+            }
+        }
+        MaskP active = arange<FloatP>() < Float(count);
+
+        auto [unused, t, idx, spline_t, spline_idx] = ray_intersect_packet(ray, active);
+
+        // Fill in hit information for each ray separately
+        for (size_t j = 0; j < count; ++j) {
+            Float t_j = t.coeff(j);
+            if (!(t_j < Infinity))
+                continue;
+
+            Ray2f ray_j(Point2f(o[2*(i + j)], o[2*(i + j) + 1]),
+                        Vector2f(d[2*(i + j)], d[2*(i + j) + 1]), mint, t_j);
+            Interaction it = m_shapes[idx.coeff(j)]->fill_interaction(ray_j, spline_t.coeff(j), spline_idx.coeff(j));
+            it.rayt = t_j;
+            it.eta = it.shape->eta;
+            result.set(i + j, it);
+        }
+    }
+
+    return result;
+}
+
 void Scene::draw(NVGcontext *ctx) const {
     for (size_t k = 0; k < m_draw_shapes.size(); ++k) {
         m_draw_shapes[k]->draw(ctx);
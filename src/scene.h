@@ -13,6 +13,15 @@ public:
 
     Interaction ray_intersect(const Ray2f &ray_) const;
 
+    // Intersect a packet of rays. Returns the hit mask, hit distances, index of the
+    // intersected shapes, and the spline parameters needed by `Shape::fill_interaction`.
+    std::tuple<MaskP, FloatP, UIntP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray_, MaskP active) const;
+
+    // Intersect `n` rays with interleaved (x, y) origins and directions, tracing
+    // them in packets of `PacketSize` rays.
+    InteractionBatch ray_intersect_batch(const Float *o, const Float *d, size_t n,
+                                         Float mint=Epsilon, Float maxt=Infinity) const;
+
     void draw(NVGcontext *ctx) const;
 
     std::shared_ptr<Shape> shape(size_t k);
@@ -4,19 +4,40 @@
 
 Shape::~Shape() {}
 
-Interaction Shape::sample_position(float sample) const {
+Interaction Shape::sample_position(Float sample) const {
     ERROR("Shape::sample_position(): Not implemented!");
 }
 
-float Shape::project(const Point2f &p) const {
+InteractionBatch Shape::sample_position_batch(const Float *samples, size_t n) const {
+    InteractionBatch result(n);
+    for (size_t i = 0; i < n; ++i) {
+        Interaction it = sample_position(samples[i]);
+        it.eta = eta;
+        result.set(i, it);
+    }
+    return result;
+}
+
+Float Shape::project(const Point2f &p) const {
     ERROR("Shape::project(): Not implemented!");
 }
 
-std::tuple<bool, float, float, size_t> Shape::ray_intersect(const Ray2f &ray) const {
+std::vector<Float> Shape::project_batch(const Float *p, size_t n) const {
+    std::vector<Float> result(n);
+    for (size_t i = 0; i < n; ++i)
+        result[i] = project(Point2f(p[2*i], p[2*i + 1]));
+    return result;
+}
+
+std::tuple<bool, Float, Float, size_t> Shape::ray_intersect(const Ray2f &ray) const {
     ERROR("Shape::ray_intersect(): Not implemented!");
 }
 
-Interaction Shape::fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const {
+std::tuple<MaskP, FloatP, FloatP, UIntP> Shape::ray_intersect_packet(const Ray2fP &ray, MaskP active) const {
+    ERROR("Shape::ray_intersect_packet(): Not implemented!");
+}
+
+Interaction Shape::fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const {
     ERROR("Shape::fill_interaction(): Not implemented!");
 }
 
@@ -12,16 +12,25 @@ public:
     virtual ~Shape();
 
     // Sample surface interaction from local parameterization
-    virtual Interaction sample_position(float sample) const;
+    virtual Interaction sample_position(Float sample) const;
+
+    // Sample surface interactions for many parameters at once, IOR is filled in
+    InteractionBatch sample_position_batch(const Float *samples, size_t n) const;
 
     // Give local parameterization of closest point on the shape
-    virtual float project(const Point2f &p) const;
+    virtual Float project(const Point2f &p) const;
+
+    // Project many points (given as N x 2 array) at once
+    std::vector<Float> project_batch(const Float *p, size_t n) const;
 
     // Intersect shape with ray
-    virtual std::tuple<bool, float, float, size_t> ray_intersect(const Ray2f &ray) const;
+    virtual std::tuple<bool, Float, Float, size_t> ray_intersect(const Ray2f &ray) const;
+
+    // Intersect shape with a packet of rays
+    virtual std::tuple<MaskP, FloatP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray, MaskP active) const;
 
     // Fill hit information after successful ray intersect
-    virtual Interaction fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const;
+    virtual Interaction fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const;
 
     // Flip orientation and normals
     virtual void flip() {}
@@ -47,7 +56,7 @@ public:
     };
 
     Type type;
-    float eta = 1.f;
+    Float eta = 1.f;
 
     bool start = false;
     bool first_specular = false;
@@ -18,26 +18,37 @@ struct BezierSpline {
         return result;
     }
 
-    Point2f eval(float t) const {
-        float tmp  = 1.f - t,
+    // Control point `i`, broadcast to the type used for evaluation
+    template <typename Value>
+    Array<Value, 2> control_point(int i) const {
+        return Array<Value, 2>(Value(p[i][0]), Value(p[i][1]));
+    }
+
+    template <typename Value>
+    Array<Value, 2> eval(const Value &t) const {
+        Value tmp  = 1.f - t,
               tmp2 = tmp * tmp,
               tmp3 = tmp * tmp2,
               t2 = t * t,
               t3 = t * t2;
         // Cubic Bezier curve (explicit form)
-        return tmp3 * p[0] + 3.f*tmp2*t * p[1] + 3.f*tmp*t2 * p[2] + t3 * p[3];
+        return tmp3 * control_point<Value>(0) + 3.f*tmp2*t * control_point<Value>(1) +
+               3.f*tmp*t2 * control_point<Value>(2) + t3 * control_point<Value>(3);
     }
 
-    Vector2f eval_tangent(float t) const {
-        float tmp  = 1.f - t,
+    template <typename Value>
+    Array<Value, 2> eval_tangent(const Value &t) const {
+        Value tmp  = 1.f - t,
               tmp2 = tmp * tmp,
               t2 = t * t;
         // First derivative of cubic Bezier curve
-        return 3.f*tmp2 * (p[1] - p[0]) + 6.f*tmp*t * (p[2] - p[1]) + 3.f*t2 * (p[3] - p[2]);
+        return 3.f*tmp2 * (control_point<Value>(1) - control_point<Value>(0)) +
+               6.f*tmp*t * (control_point<Value>(2) - control_point<Value>(1)) +
+               3.f*t2 * (control_point<Value>(3) - control_point<Value>(2));
     }
 
-    Vector2f eval_curvature(float t) const {
-        float tmp = 1.f - t;
+    Vector2f eval_curvature(Float t) const {
+        Float tmp = 1.f - t;
         return 6.f*tmp * (p[2] - 2.f*p[1] + p[0]) + 6.f*t*(p[3] - 2.f*p[2] + p[1]);
     }
 
@@ -45,19 +56,19 @@ struct BezierSpline {
         std::reverse(&p[0], &p[4]);
     }
 
-    float length() const {
+    Float length() const {
         const int n_steps = SPLINE_DISCRETIZATION;
-        float length = 0;
+        Float length = 0;
         for (int i = 0; i < n_steps; ++i)
-            length += norm(eval_tangent(float(i) / (n_steps-1)));
+            length += norm(eval_tangent(Float(i) / (n_steps-1)));
         return length / n_steps;
     }
 
-    Interaction fill_interaction(float u) const {
+    Interaction fill_interaction(Float u) const {
         Vector2f P = eval(u);
         Vector2f T = eval_tangent(u);
         Vector2f N(-T[1], T[0]);
-        float scale = 1.0f / std::sqrt(dot(N, N));
+        Float scale = 1.0f / std::sqrt(dot(N, N));
         N *= scale;
 
         // Second derivative of cubic Bezier curve
@@ -76,34 +87,34 @@ struct BezierSpline {
         return it;
     }
 
-    Interaction sample_position(float sample) const {
+    Interaction sample_position(Float sample) const {
         return fill_interaction(sample);
     }
 
-    std::tuple<bool, float, float> ray_intersect(const Ray2f &ray) const {
+    std::tuple<bool, Float, Float> ray_intersect(const Ray2f &ray) const {
         const int n_steps = SPLINE_DISCRETIZATION;
         bool success = false;
-        float t = Infinity;
-        float spline_t;
+        Float t = Infinity;
+        Float spline_t;
 
         for (int i = 0; i < n_steps; ++i) {
-            float t0 = float(i)   / n_steps,
-                  t1 = float(i+1) / n_steps;
+            Float t0 = Float(i)   / n_steps,
+                  t1 = Float(i+1) / n_steps;
             Point2f p0 = eval(t0), p1 = eval(t1);
             Vector2f d(p1 - p0);
-            float len = norm(d);
+            Float len = norm(d);
             if (len == 0.f)
                 continue;
             d /= len;
 
             Vector2f n(-d.y(), d.x());
 
-            float dp = dot(n, ray.d);
+            Float dp = dot(n, ray.d);
             if (dp == 0)
                 continue;
 
-            float tp = dot(n, p0 - ray.o) / dp;
-            float proj = dot(ray(tp)-p0, d) / len;
+            Float tp = dot(n, p0 - ray.o) / dp;
+            Float proj = dot(ray(tp)-p0, d) / len;
 
             if (tp >= ray.mint && tp <= ray.maxt && tp < t && proj >= 0 && proj <= 1) {
                 spline_t = t0*(1-proj) + t1*proj;
@@ -137,16 +148,122 @@ struct BezierSpline {
         return { success, t, spline_t };
     }
 
-    std::tuple<Point2f, float> project(const Point2f &p) const {
+    // Exact alternative to `ray_intersect`: projecting the control points onto the
+    // normal of the ray gives a cubic polynomial in the spline parameter whose
+    // roots are the intersections with the ray's line.
+    std::tuple<bool, Float, Float> ray_intersect_exact(const Ray2f &ray) const {
+        Vector2f n(-ray.d.y(), ray.d.x());
+        Float f0 = dot(n, p[0] - ray.o),
+              f1 = dot(n, p[1] - ray.o),
+              f2 = dot(n, p[2] - ray.o),
+              f3 = dot(n, p[3] - ray.o);
+
+        // Bernstein to power basis
+        Float a = f3 - f0 + 3.f*(f1 - f2),
+              b = 3.f*(f0 - 2.f*f1 + f2),
+              c = 3.f*(f1 - f0),
+              d = f0;
+
+        Float roots[3];
+        int n_roots = solve_cubic(a, b, c, d, roots);
+
+        bool success = false;
+        Float t = Infinity;
+        Float spline_t = -1.f;
+        Float inv_d2 = rcp(squared_norm(ray.d));
+
+        for (int i = 0; i < n_roots; ++i) {
+            // One Newton step on the polynomial to polish the closed-form root
+            Float u = roots[i],
+                  f = ((a*u + b)*u + c)*u + d,
+                  df = (3.f*a*u + 2.f*b)*u + c;
+            if (df != 0.f)
+                u -= f / df;
+            if (u < 0.f || u > 1.f)
+                continue;
+
+            Float tu = dot(eval(u) - ray.o, ray.d) * inv_d2;
+            if (tu >= ray.mint && tu <= ray.maxt && tu < t) {
+                success = true;
+                t = tu;
+                spline_t = u;
+            }
+        }
+
+        return { success, t, spline_t };
+    }
+
+    // Packet version of `ray_intersect`. The rays share the loop over the polyline
+    // segments and the Newton refinement, with one ray per SIMD lane.
+    template <size_t N>
+    std::tuple<MaskN<N>, FloatN<N>, FloatN<N>> ray_intersect_packet(const Ray2fN<N> &ray, MaskN<N> active) const {
+        using Value = FloatN<N>;
+        using Mask  = MaskN<N>;
+
+        const int n_steps = SPLINE_DISCRETIZATION;
+        Mask success = false;
+        Value t = Infinity;
+        Value spline_t = -1.f;
+
+        for (int i = 0; i < n_steps; ++i) {
+            Float t0 = Float(i)   / n_steps,
+                  t1 = Float(i+1) / n_steps;
+            Point2f p0 = eval(t0), p1 = eval(t1);
+            Vector2f d(p1 - p0);
+            Float len = norm(d);
+            if (len == 0.f)
+                continue;
+            d /= len;
+
+            Vector2f n(-d.y(), d.x());
+
+            Value dp = n.x()*ray.d.x() + n.y()*ray.d.y();
+
+            Value tp = (n.x()*(p0.x() - ray.o.x()) + n.y()*(p0.y() - ray.o.y())) / dp;
+            Value proj = (d.x()*(fmadd(ray.d.x(), tp, ray.o.x()) - p0.x()) +
+                          d.y()*(fmadd(ray.d.y(), tp, ray.o.y()) - p0.y())) / len;
+
+            Mask valid = active && neq(dp, 0.f) && tp >= ray.mint && tp <= ray.maxt && tp < t &&
+                         proj >= 0.f && proj <= 1.f;
+
+            spline_t = select(valid, t0*(1.f - proj) + t1*proj, spline_t);
+            t        = select(valid, tp, t);
+            success |= valid;
+        }
+
+        if (any(success)) {
+            for (int i = 0; i < 3; ++i) {
+                // Do a few 2D Newton iterations to converge on the root
+                Point2fN<N>  p_spline = eval(spline_t);
+                Vector2fN<N> dp_spline = eval_tangent(spline_t);
+                Point2fN<N>  p_ray = ray(t);
+
+                // Solve the 2x2 system [dp_spline, -d] x = p_spline - p_ray in closed form
+                Value inv_det = rcp(dp_spline.y()*ray.d.x() - dp_spline.x()*ray.d.y());
+                Vector2fN<N> b = p_spline - p_ray;
+
+                Value x0 = (-ray.d.y()*b.x() + ray.d.x()*b.y()) * inv_det,
+                      x1 = (-dp_spline.y()*b.x() + dp_spline.x()*b.y()) * inv_det;
+
+                spline_t = select(success, spline_t - x0, spline_t);
+                t        = select(success, t - x1, t);
+            }
+            success &= t >= ray.mint && t <= ray.maxt && spline_t >= 0.f && spline_t <= 1.f;
+        }
+
+        return { success, t, spline_t };
+    }
+
+    std::tuple<Point2f, Float> project(const Point2f &p) const {
         const int n_steps = SPLINE_DISCRETIZATION;
-        float d2 = Infinity;
-        float t;
+        Float d2 = Infinity;
+        Float t;
 
         for (int i = 0; i < n_steps; ++i) {
-            float t0 = float(i) / (n_steps - 1);
+            Float t0 = Float(i) / (n_steps - 1);
             Point2f p0 = eval(t0);
 
-            float d20 = squared_norm(p0 - p);
+            Float d20 = squared_norm(p0 - p);
             if (d20 < d2) {
                 d2 = d20;
                 t = t0;
@@ -159,10 +276,10 @@ struct BezierSpline {
             Vector2f  dp_spline = eval_tangent(t);
             Vector2f d2p_spline = eval_curvature(t);
 
-            float df = 2.f*(dot(p_spline, dp_spline) - dot(p, dp_spline));
-            float d2f = 2.f*(dot(p_spline, d2p_spline) + dot(dp_spline, dp_spline) - dot(p, d2p_spline));
+            Float df = 2.f*(dot(p_spline, dp_spline) - dot(p, dp_spline));
+            Float d2f = 2.f*(dot(p_spline, d2p_spline) + dot(dp_spline, dp_spline) - dot(p, d2p_spline));
 
-            float dt = rcp(d2f) * df;
+            Float dt = rcp(d2f) * df;
             t -= dt;
         }
         t = max(0.f, min(1.f, t));
@@ -173,8 +290,8 @@ struct BezierSpline {
 
 class BezierCurve : public Shape {
 public:
-    BezierCurve(const std::vector<float> &pts_x,
-                const std::vector<float> &pts_y)
+    BezierCurve(const std::vector<Float> &pts_x,
+                const std::vector<Float> &pts_y)
         : Shape() {
         name = "BezierCurve";
 
@@ -195,21 +312,33 @@ public:
             m_splines.push_back(spline);
         }
 
-        // Precompute lengths for sampling
-        std::vector<float> lengths;
-        for (size_t i = 0; i < n_splines; ++i) {
-            lengths.push_back(m_splines[i].length());
+        precompute();
+    }
+
+    // Control points given as a flat buffer of interleaved (x, y) pairs, e.g. a
+    // memory-mapped scene file
+    BezierCurve(const Float *pts, size_t n_points)
+        : Shape() {
+        name = "BezierCurve";
+
+        if (n_points % 4 != 0) {
+            WARN("BezierCurve: Number of control points should be multiple of 4.");
         }
-        m_length_map = DiscreteDistribution(lengths.data(), lengths.size());
 
-        // Precompute bounding box
-        bbox = BoundingBox2f();
-        for (size_t i = 0; i < m_splines.size(); i++) {
-            bbox.expand(m_splines[i].bbox());
+        size_t n_splines = n_points / 4;
+        m_splines.resize(n_splines);
+        for (size_t i = 0; i < n_splines; ++i) {
+            for (size_t k = 0; k < 4; ++k) {
+                m_splines[i].p[k] = Point2f(pts[8*i + 2*k], pts[8*i + 2*k + 1]);
+            }
         }
+
+        precompute();
     }
 
-    Interaction sample_position(float sample) const override {
+    const std::vector<BezierSpline> &splines() const { return m_splines; }
+
+    Interaction sample_position(Float sample) const override {
         int spline_idx = m_length_map.sample_reuse(sample);
         const BezierSpline &spline = m_splines[spline_idx];
         Interaction it = spline.sample_position(sample);
@@ -218,14 +347,14 @@ public:
         return it;
     }
 
-    float project(const Point2f &p) const override {
-        float d2 = Infinity;
-        float t;
+    Float project(const Point2f &p) const override {
+        Float d2 = Infinity;
+        Float t;
         size_t idx;
 
         for (size_t i = 0; i < m_splines.size(); ++i) {
             auto [p0, t0] = m_splines[i].project(p);
-            float d20 = squared_norm(p0 - p);
+            Float d20 = squared_norm(p0 - p);
             if (d20 < d2) {
                 d2 = d20;
                 t = t0;
@@ -233,22 +362,23 @@ public:
             }
         }
 
-        float t0 = m_length_map.cdf(idx),
+        Float t0 = m_length_map.cdf(idx),
               t1 = m_length_map.cdf(idx + 1);
         return t0*(1.f - t) + t1*t;
     }
 
-    std::tuple<bool, float, float, size_t> ray_intersect(const Ray2f &ray_) const override {
+    std::tuple<bool, Float, Float, size_t> ray_intersect(const Ray2f &ray_) const override {
         bool found_hit = false;
 
         size_t idx = -1;
-        float spline_t = -1.f;
+        Float spline_t = -1.f;
         Ray2f ray(ray_);
 
         for (uint32_t k = 0; k < m_splines.size(); ++k) {
             auto [hit_bbox, unused_0, unused_1] = m_splines[k].bbox().ray_intersect(ray);
             if (hit_bbox) {
-                auto [hit, t, st] = m_splines[k].ray_intersect(ray);
+                auto [hit, t, st] = exact_intersection ? m_splines[k].ray_intersect_exact(ray)
+                                                       : m_splines[k].ray_intersect(ray);
                 if (hit && t > ray.mint && t < ray.maxt) {
                     found_hit = true;
                     idx = k;
@@ -261,7 +391,61 @@ public:
         return { found_hit, ray.maxt, spline_t, idx };
     }
 
-    Interaction fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const override {
+    template <size_t N>
+    std::tuple<MaskN<N>, FloatN<N>, FloatN<N>, UIntN<N>> ray_intersect_packet(const Ray2fN<N> &ray_, MaskN<N> active) const {
+        using Value  = FloatN<N>;
+        using Mask   = MaskN<N>;
+        using Index = UIntN<N>;
+
+        Mask found_hit = false;
+
+        Index idx = 0;
+        Value spline_t = -1.f;
+        Ray2fN<N> ray(ray_);
+
+        if (exact_intersection) {
+            // The closed-form root finding branches on the number of roots, trace lane by lane
+            for (size_t j = 0; j < N; ++j) {
+                if (!active.coeff(j))
+                    continue;
+                Ray2f ray_j(Point2f(ray.o.x().coeff(j), ray.o.y().coeff(j)),
+                            Vector2f(ray.d.x().coeff(j), ray.d.y().coeff(j)),
+                            ray.mint.coeff(j), ray.maxt.coeff(j));
+                auto [hit_j, t_j, spline_t_j, idx_j] = ray_intersect(ray_j);
+                if (hit_j) {
+                    Mask lane = eq(arange<Value>(), Value(Float(j)));
+                    found_hit |= lane;
+                    ray.maxt = select(lane, Value(t_j), ray.maxt);
+                    spline_t = select(lane, Value(spline_t_j), spline_t);
+                    idx      = select(lane, Index(UInt(idx_j)), idx);
+                }
+            }
+            return { found_hit, select(found_hit, ray.maxt, Value(Infinity)), spline_t, idx };
+        }
+
+        for (uint32_t k = 0; k < m_splines.size(); ++k) {
+            auto [hit_bbox, unused_0, unused_1] = m_splines[k].bbox().ray_intersect(ray);
+            hit_bbox &= active;
+            if (none(hit_bbox))
+                continue;
+
+            auto [hit, t, st] = m_splines[k].ray_intersect_packet<N>(ray, hit_bbox);
+            hit &= hit_bbox && t > ray.mint && t < ray.maxt;
+
+            found_hit |= hit;
+            idx       = select(hit, Index(k), idx);
+            spline_t  = select(hit, st, spline_t);
+            ray.maxt  = select(hit, t, ray.maxt);
+        }
+
+        return { found_hit, select(found_hit, ray.maxt, Value(Infinity)), spline_t, idx };
+    }
+
+    std::tuple<MaskP, FloatP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray, MaskP active) const override {
+        return ray_intersect_packet<PacketSize>(ray, active);
+    }
+
+    Interaction fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const override {
         Interaction it = m_splines[spline_idx].fill_interaction(spline_t);
         it.shape = this;
         return it;
@@ -317,6 +501,26 @@ public:
         return oss.str();
     }
 
+public:
+    // Use closed-form root finding instead of the polyline approximation for ray intersections
+    bool exact_intersection = false;
+
+protected:
+    void precompute() {
+        // Precompute lengths for sampling
+        std::vector<Float> lengths;
+        for (size_t i = 0; i < m_splines.size(); ++i) {
+            lengths.push_back(m_splines[i].length());
+        }
+        m_length_map = DiscreteDistribution(lengths.data(), lengths.size());
+
+        // Precompute bounding box
+        bbox = BoundingBox2f();
+        for (size_t i = 0; i < m_splines.size(); i++) {
+            bbox.expand(m_splines[i].bbox());
+        }
+    }
+
 protected:
     std::vector<BezierSpline> m_splines;
     DiscreteDistribution m_length_map;
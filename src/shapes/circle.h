@@ -5,7 +5,7 @@
 
 class Circle : public Shape {
 public:
-    Circle(const Point2f &center, float radius)
+    Circle(const Point2f &center, Float radius)
         : Shape(), m_center(center), m_radius(radius) {
         name = "Circle";
 
@@ -14,8 +14,8 @@ public:
         bbox.max = m_center + Vector2f(m_radius);
     }
 
-    Interaction sample_position(float sample) const override {
-        float phi = 2.f*Pi*sample;
+    Interaction sample_position(Float sample) const override {
+        Float phi = 2.f*Pi*sample;
         auto [sp, cp] = sincos(phi);
         Point2f p_local(cp, sp);
 
@@ -24,7 +24,7 @@ public:
         in.p = m_center + m_radius*p_local;
         in.n = p_local;
         in.dp_du = 2.f*Pi*Vector2f(-p_local[1], p_local[0]);
-        float inv_radius = (m_flipped ? -1.f : 1.f) * rcp(m_radius);
+        Float inv_radius = (m_flipped ? -1.f : 1.f) * rcp(m_radius);
         in.dn_du = in.dp_du*inv_radius;
         if (m_flipped) {
             in.n *= -1.f;
@@ -36,21 +36,21 @@ public:
         return in;
     }
 
-    float project(const Point2f &p) const override {
+    Float project(const Point2f &p) const override {
         Vector2f d = normalize(p - m_center);
-        float phi = atan2(d.y(), d.x());
+        Float phi = atan2(d.y(), d.x());
         if (phi < 0.f) phi += 2.f*Pi;
         return phi*InvTwoPi;
     }
 
-    std::tuple<bool, float, float, size_t> ray_intersect(const Ray2f &ray) const override {
-        float mint = ray.mint,
+    std::tuple<bool, Float, Float, size_t> ray_intersect(const Ray2f &ray) const override {
+        Float mint = ray.mint,
               maxt = ray.maxt;
 
         Vector2f o = Vector2f(ray.o) - m_center;
         Vector2f d(ray.d);
 
-        float A = squared_norm(d),
+        Float A = squared_norm(d),
               B = 2.0f * dot(o, d),
               C = squared_norm(o) - m_radius*m_radius;
 
@@ -60,12 +60,40 @@ public:
              in_bounds  = (near_t < mint) && (far_t > maxt);
 
         bool valid_intersection = solution_found && (!out_bounds) && (!in_bounds);
-        float t = near_t < mint ? far_t : near_t;
+        Float t = near_t < mint ? far_t : near_t;
 
         return { valid_intersection, t, -1.f, 0 };
     }
 
-    Interaction fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const override {
+    template <size_t N>
+    std::tuple<MaskN<N>, FloatN<N>, FloatN<N>, UIntN<N>> ray_intersect_packet(const Ray2fN<N> &ray, MaskN<N> active) const {
+        using Value  = FloatN<N>;
+        using Mask   = MaskN<N>;
+        using Vector = Vector2fN<N>;
+
+        Vector o = ray.o - to_packet<N>(m_center);
+        Vector d(ray.d);
+
+        Value A = squared_norm(d),
+              B = 2.0f * dot(o, d),
+              C = squared_norm(o) - m_radius*m_radius;
+
+        auto [solution_found, near_t, far_t] = solve_quadratic(A, B, C);
+
+        Mask out_bounds = !((near_t <= ray.maxt) && (far_t >= ray.mint)),
+             in_bounds  = (near_t < ray.mint) && (far_t > ray.maxt);
+
+        active &= solution_found && (!out_bounds) && (!in_bounds);
+        Value t = select(near_t < ray.mint, far_t, near_t);
+
+        return { active, select(active, t, Value(Infinity)), Value(-1.f), UIntN<N>(0) };
+    }
+
+    std::tuple<MaskP, FloatP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray, MaskP active) const override {
+        return ray_intersect_packet<PacketSize>(ray, active);
+    }
+
+    Interaction fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const override {
         Interaction in;
         in.rayt = ray.maxt;
         in.p = ray(in.rayt);
@@ -76,7 +104,7 @@ public:
         if (m_flipped) {
             in.n = -in.n;
         }
-        float inv_radius = (m_flipped ? -1.f : 1.f) * rcp(m_radius);
+        Float inv_radius = (m_flipped ? -1.f : 1.f) * rcp(m_radius);
         in.dn_du = in.dp_du * inv_radius;
         in.u = project(in.p);
         in.s = Vector2f(-in.n[1], in.n[0]);
@@ -89,6 +117,10 @@ public:
         m_flipped = !m_flipped;
     }
 
+    const Point2f &center() const { return m_center; }
+    Float radius() const { return m_radius; }
+    bool flipped() const { return m_flipped; }
+
     void draw(NVGcontext *ctx, bool hole=false) const override {
         if (hole) {
             nvgCircle(ctx, m_center[0], m_center[1], m_radius);
@@ -119,6 +151,6 @@ public:
 
 protected:
     Vector2f m_center;
-    float m_radius;
+    Float m_radius;
     bool m_flipped = false;
 };
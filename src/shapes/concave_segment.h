@@ -5,35 +5,43 @@
 
 class ConcaveSegment : public Shape {
 public:
-    ConcaveSegment(const Point2f &a, const Point2f &b, float arc_radius)
+    ConcaveSegment(const Point2f &a, const Point2f &b, Float arc_radius)
         : Shape(), m_a(a), m_b(b), m_arc_radius(arc_radius) {
             name = "ConcaveSegment";
 
             Vector2f dir = m_b - m_a;
-            float length = norm(dir);
+            Float length = norm(dir);
             Vector2f n(-dir[1], dir[0]);
             n *= rcp(length);
-            float phi = atan2(n.y(), n.x());
+            Float phi = atan2(n.y(), n.x());
             if (phi < 0.f) phi += 2.f*Pi;
 
-            float d_phi = asin(0.5f*length*rcp(m_arc_radius));
+            Float d_phi = asin(0.5f*length*rcp(m_arc_radius));
             m_phi_0 = phi - d_phi + Pi;
             m_phi_1 = phi + d_phi - Pi + 2.f*Pi;
 
-            float offset = safe_sqrt(sqr(m_arc_radius) - sqr(0.5f*length));
+            Float offset = safe_sqrt(sqr(m_arc_radius) - sqr(0.5f*length));
             m_center = 0.5f*(m_a + m_b) + n*offset;
 
+            // Angular extent of the arc around its axis (the inverted normal of [A, B]),
+            // cached for `project` and the ray intersection tests
+            m_axis = -n;
+            m_phi_n = atan2(m_axis.y(), m_axis.x());
+            if (m_phi_n < 0.f) m_phi_n += 2.f*Pi;
+            m_d_phi = d_phi;
+            m_cos_d_phi = cos(m_d_phi);
+
             size_t K = 30;
             bbox = BoundingBox2f();
             for (size_t k = 0; k < K; ++k) {
-                float t = k * rcp(float(K-1));
+                Float t = k * rcp(Float(K-1));
                 Interaction it = sample_position(t);
                 bbox.expand(it.p);
             }
         }
 
-    Interaction sample_position(float sample) const override {
-        float phi = m_phi_0 + (m_phi_1 - m_phi_0)*sample;
+    Interaction sample_position(Float sample) const override {
+        Float phi = m_phi_0 + (m_phi_1 - m_phi_0)*sample;
         auto [sp, cp] = sincos(phi);
         Point2f p_local(cp, sp);
 
@@ -42,7 +50,7 @@ public:
         in.p = m_center + m_arc_radius*p_local;
         in.n = -p_local;
         in.dp_du = (m_phi_1 - m_phi_0)*Vector2f(-p_local[1], p_local[0]);
-        float inv_radius = -rcp(m_arc_radius);
+        Float inv_radius = -rcp(m_arc_radius);
         in.dn_du = in.dp_du*inv_radius;
         in.u = sample;
         in.s = Vector2f(-in.n[1], in.n[0]);
@@ -51,47 +59,46 @@ public:
         return in;
     }
 
-    std::tuple<float, float, float> angle_test(const Point2f &p) const {
-        // Compute extent of valid angles
-        Vector2f dir = m_b - m_a;
-        float length = norm(dir);
-        float d_phi = asin(0.5f*length*rcp(m_arc_radius));
-
-        // Project to circle
-        Vector2f d = normalize(p - m_center);
-        float phi = atan2(d.y(), d.x());
+    // Angle of `p` around the center in [0, 2Pi), and relative to the axis of the arc in [-Pi, +Pi)
+    std::pair<Float, Float> angle_test(const Point2f &p) const {
+        Vector2f d = p - m_center;
+        Float phi = atan2(d.y(), d.x());
         if (phi < 0.f) phi += 2.f*Pi;
 
-        // Rotate everything s.t. it alignes with the normal of [A, B]
-        Vector2f n(-dir[1], dir[0]);
-        n *= rcp(length);
-        float phi_n = atan2(-n.y(), -n.x());
-        if (phi_n < 0.f) phi_n += 2.f*Pi;
-        float phi_p = phi - phi_n;
+        // Both angles are in [0, 2Pi), so a single wrap suffices
+        Float phi_p = phi - m_phi_n;
+        if (phi_p >= Pi) phi_p -= 2.f*Pi;
+        else if (phi_p < -Pi) phi_p += 2.f*Pi;
+
+        return { phi, phi_p };
+    }
 
-        // Make sure, phi_p is in [-Pi, +Pi)
-        phi_p = fmod(phi_p + Pi, 2.f*Pi);
-        if (phi_p < 0.f) phi_p += 2.f*Pi;
-        phi_p -= Pi;
+    // Does the direction `d` (pointing away from the center) lie within the extent of
+    // the arc? Compares cosines instead of angles to avoid any trigonometry.
+    bool arc_test(const Vector2f &d) const {
+        return dot(d, m_axis) > m_cos_d_phi * norm(d);
+    }
 
-        return std::make_tuple(phi, phi_p, d_phi);
+    template <size_t N>
+    MaskN<N> arc_test_packet(const Vector2fN<N> &d) const {
+        return d.x()*m_axis.x() + d.y()*m_axis.y() > m_cos_d_phi * norm(d);
     }
 
-    float project(const Point2f &p) const override {
-        auto [phi, phi_p, d_phi] = angle_test(p);
-        if (phi_p > d_phi) return 1.f;
-        if (phi_p < -d_phi) return 0.f;
+    Float project(const Point2f &p) const override {
+        auto [phi, phi_p] = angle_test(p);
+        if (phi_p > m_d_phi) return 1.f;
+        if (phi_p < -m_d_phi) return 0.f;
         return (phi - m_phi_0) / (m_phi_1 - m_phi_0);
     }
 
-    std::tuple<bool, float, float, size_t> ray_intersect(const Ray2f &ray) const override {
-        float mint = ray.mint,
+    std::tuple<bool, Float, Float, size_t> ray_intersect(const Ray2f &ray) const override {
+        Float mint = ray.mint,
               maxt = ray.maxt;
 
         Vector2f o = Vector2f(ray.o) - m_center;
         Vector2f d(ray.d);
 
-        float A = squared_norm(d),
+        Float A = squared_norm(d),
               B = 2.0f * dot(o, d),
               C = squared_norm(o) - m_arc_radius*m_arc_radius;
 
@@ -105,27 +112,57 @@ public:
             return { false, Infinity, -1.f, 0 };
         }
 
-        if (near_t >= mint) {
-            // Test near hit
-            Point2f p = ray(near_t);
-            p = m_center + normalize(p - m_center) * m_arc_radius;
-            auto [unused, phi_p, d_phi] = angle_test(p);
-            if (abs(phi_p) < d_phi) {
-                return { true, near_t, -1.f, 0 };
-            }
+        // Test near hit
+        if (near_t >= mint && arc_test(ray(near_t) - m_center)) {
+            return { true, near_t, -1.f, 0 };
         }
         // Test far hit
-        Point2f p = ray(far_t);
-        p = m_center + normalize(p - m_center) * m_arc_radius;
-        auto [unused, phi_p, d_phi] = angle_test(p);
-        if (abs(phi_p) < d_phi) {
+        if (arc_test(ray(far_t) - m_center)) {
             return { true, far_t, -1.f, 0 };
         }
 
         return { false, Infinity, -1.f, 0 };
     }
 
-    Interaction fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const override {
+    template <size_t N>
+    std::tuple<MaskN<N>, FloatN<N>, FloatN<N>, UIntN<N>> ray_intersect_packet(const Ray2fN<N> &ray, MaskN<N> active) const {
+        using Value  = FloatN<N>;
+        using Mask   = MaskN<N>;
+        using Vector = Vector2fN<N>;
+
+        Vector center = to_packet<N>(m_center);
+        Vector o = ray.o - center;
+        Vector d(ray.d);
+
+        Value A = squared_norm(d),
+              B = 2.0f * dot(o, d),
+              C = squared_norm(o) - m_arc_radius*m_arc_radius;
+
+        auto [solution_found, near_t, far_t] = solve_quadratic(A, B, C);
+
+        Mask out_bounds = !((near_t <= ray.maxt) && (far_t >= ray.mint)),
+             in_bounds  = (near_t < ray.mint) && (far_t > ray.maxt);
+
+        active &= solution_found && (!out_bounds) && (!in_bounds);
+        if (none(active)) {
+            return { active, Value(Infinity), Value(-1.f), UIntN<N>(0) };
+        }
+
+        // Test near and far hits
+        Mask near_hit = active && (near_t >= ray.mint) && arc_test_packet<N>(ray(near_t) - center),
+             far_hit  = active && arc_test_packet<N>(ray(far_t) - center);
+
+        Value t = select(near_hit, near_t, far_t);
+        active = near_hit || far_hit;
+
+        return { active, select(active, t, Value(Infinity)), Value(-1.f), UIntN<N>(0) };
+    }
+
+    std::tuple<MaskP, FloatP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray, MaskP active) const override {
+        return ray_intersect_packet<PacketSize>(ray, active);
+    }
+
+    Interaction fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const override {
         Interaction in;
         in.rayt = ray.maxt;
         in.p = ray(in.rayt);
@@ -161,31 +198,31 @@ public:
         // The rounded rectangles and gradients behave inconsistently
         // when elements get too small in nanovg, so we work in a scaled coord.
         // system here.
-        float nvg_scale     = 1e2f,
+        Float nvg_scale     = 1e2f,
               inv_nvg_scale = rcp(nvg_scale);
         nvgScale(ctx, inv_nvg_scale, inv_nvg_scale);
 
-        auto nvgLinearGradientS = [&](NVGcontext *ctx, float sx, float sy, float ex, float ey,
+        auto nvgLinearGradientS = [&](NVGcontext *ctx, Float sx, Float sy, Float ex, Float ey,
                                       NVGcolor icolor, NVGcolor ecolor) {
             return nvgLinearGradient(ctx, nvg_scale*sx, nvg_scale*sy, nvg_scale*ex, nvg_scale*ey,
                                      icolor, ecolor);
         };
-        auto nvgMoveToS = [&](NVGcontext *ctx, float x, float y) {
+        auto nvgMoveToS = [&](NVGcontext *ctx, Float x, Float y) {
             nvgMoveTo(ctx, nvg_scale*x, nvg_scale*y);
         };
-        auto nvgLineToS = [&](NVGcontext *ctx, float x, float y) {
+        auto nvgLineToS = [&](NVGcontext *ctx, Float x, Float y) {
             nvgLineTo(ctx, nvg_scale*x, nvg_scale*y);
         };
-        auto nvgArcS = [&](NVGcontext *ctx, float cx, float cy, float r, float a0, float a1, int dir) {
+        auto nvgArcS = [&](NVGcontext *ctx, Float cx, Float cy, Float r, Float a0, Float a1, int dir) {
             nvgArc(ctx, nvg_scale*cx, nvg_scale*cy, nvg_scale*r, a0, a1, dir);
         };
 
         // Another limitation of nanovg is that rectangles are always axis-aligned.
         // We need to do some more coordinate transforms to generalize.
-        float phi = atan2(m_b[1] - m_a[1], m_b[0] - m_a[0]);
+        Float phi = atan2(m_b[1] - m_a[1], m_b[0] - m_a[0]);
         if (phi < 0.f) phi += 2.f*Pi;
         auto [sp, cp] = sincos(phi);
-        float length = norm(m_b - m_a);
+        Float length = norm(m_b - m_a);
 
         Matrix2f R  = Matrix2f(cp, -sp, sp, cp),
                  Ri = transpose(R),
@@ -193,7 +230,7 @@ public:
 
         Point2f ap = Si * Ri * m_a,
                 bp = Si * Ri * m_b;
-        float arc_radius = rcp(length) * m_arc_radius;
+        Float arc_radius = rcp(length) * m_arc_radius;
 
         nvgStrokeWidth(ctx, nvg_scale*0.007f*rcp(length));
         nvgRotate(ctx, phi);
@@ -213,16 +250,16 @@ public:
         nvgBeginPath(ctx);
 
         // Main arc
-        float offset = safe_sqrt(sqr(arc_radius) - 0.25f);
+        Float offset = safe_sqrt(sqr(arc_radius) - 0.25f);
         Point2f c_main = Point2f(ap[0] + 0.5f, bp[1] + offset);
-        float alpha = asin(0.5f*rcp(arc_radius));
+        Float alpha = asin(0.5f*rcp(arc_radius));
 
         // Smaller arcs left and right to transition smoothly to vertical
         Vector2f n_left = normalize(ap - c_main),
                  n_right = normalize(bp - c_main);
         Point2f c_left = ap + corner_radius*n_left,
                 c_right = bp + corner_radius*n_right;
-        float beta_left = atan2(-n_left.y(), -n_left.x()),
+        Float beta_left = atan2(-n_left.y(), -n_left.x()),
               beta_right = atan2(-n_right.y(), -n_right.x());
         if (beta_left < 0.f) beta_left += 2.f*Pi;
         if (beta_right < 0.f) beta_right += 2.f*Pi;
@@ -250,6 +287,10 @@ public:
         nvgRestore(ctx);
     }
 
+    const Point2f &a() const { return m_a; }
+    const Point2f &b() const { return m_b; }
+    Float arc_radius() const { return m_arc_radius; }
+
     std::string to_string() const override {
         std::ostringstream oss;
         oss << "ConcaveSegment[" << std::endl
@@ -261,12 +302,14 @@ public:
 
 protected:
     Point2f m_a, m_b;
-    float m_arc_radius;
+    Float m_arc_radius;
     Point2f m_center;
-    float m_phi_0, m_phi_1;
+    Float m_phi_0, m_phi_1;
+    Vector2f m_axis;
+    Float m_phi_n, m_d_phi, m_cos_d_phi;
 
 public:
-    float gradient_start = 0.08f,
+    Float gradient_start = 0.08f,
           gradient_width = 0.03f;
-    float corner_radius = 0.02f;
+    Float corner_radius = 0.02f;
 };
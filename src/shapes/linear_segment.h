@@ -14,7 +14,7 @@ public:
         bbox.expand(m_b);
     }
 
-    Interaction sample_position(float sample) const override {
+    Interaction sample_position(Float sample) const override {
         Interaction in;
         in.rayt = 0;
         in.p = m_a + (m_b - m_a)*sample;
@@ -29,16 +29,16 @@ public:
         return in;
     }
 
-    float project(const Point2f &p) const override {
+    Float project(const Point2f &p) const override {
         Vector2f v = m_b - m_a;
-        float scale = rcp(dot(v, v));
+        Float scale = rcp(dot(v, v));
 
-        float t = dot((p - m_a), v)*scale;
+        Float t = dot((p - m_a), v)*scale;
         return min(1.f, max(0.f, t));
     }
 
-    std::tuple<bool, float, float, size_t> ray_intersect(const Ray2f &ray) const override {
-        float mint = ray.mint,
+    std::tuple<bool, Float, Float, size_t> ray_intersect(const Ray2f &ray) const override {
+        Float mint = ray.mint,
               maxt = ray.maxt;
 
         Vector2f v1 = ray.o - m_a,
@@ -50,11 +50,11 @@ public:
             v3 = Vector2f(-ray.d[1], ray.d[0]);
         }
 
-        float denom = dot(v2, v3);
+        Float denom = dot(v2, v3);
         if (denom == 0)
             return { false, Infinity, -1.f, 0 };
 
-        float t1 = abs(cross(v2, v1)) / denom,
+        Float t1 = abs(cross(v2, v1)) / denom,
               t2 = dot(v1, v3) / denom;
 
         if (t1 < mint || t1 > maxt || t2 < Epsilon || t2 > (1.f + Epsilon))
@@ -62,7 +62,31 @@ public:
         return { true, t1, -1.f, 0 };
     }
 
-    Interaction fill_interaction(const Ray2f &ray, float spline_t, size_t spline_idx) const override {
+    template <size_t N>
+    std::tuple<MaskN<N>, FloatN<N>, FloatN<N>, UIntN<N>> ray_intersect_packet(const Ray2fN<N> &ray, MaskN<N> active) const {
+        using Value  = FloatN<N>;
+        using Vector = Vector2fN<N>;
+
+        Vector v1 = ray.o - to_packet<N>(m_a),
+               v2 = to_packet<N>(m_b - m_a);
+        Value sign = select(cross(v1, v2) > 0.f, Value(1.f), Value(-1.f));
+        Vector v3(sign*ray.d[1], -sign*ray.d[0]);
+
+        Value denom = dot(v2, v3);
+        active &= neq(denom, 0.f);
+
+        Value t1 = abs(cross(v2, v1)) / denom,
+              t2 = dot(v1, v3) / denom;
+
+        active &= (t1 >= ray.mint) && (t1 <= ray.maxt) && (t2 >= Epsilon) && (t2 <= (1.f + Epsilon));
+        return { active, select(active, t1, Value(Infinity)), Value(-1.f), UIntN<N>(0) };
+    }
+
+    std::tuple<MaskP, FloatP, FloatP, UIntP> ray_intersect_packet(const Ray2fP &ray, MaskP active) const override {
+        return ray_intersect_packet<PacketSize>(ray, active);
+    }
+
+    Interaction fill_interaction(const Ray2f &ray, Float spline_t, size_t spline_idx) const override {
         Interaction in;
         in.rayt = ray.maxt;
         in.p = ray(in.rayt);
@@ -101,16 +125,16 @@ public:
         // The rounded rectangles and gradients behave inconsistently
         // when elements get too small in nanovg, so we work in a scaled coord.
         // system here.
-        float nvg_scale     = 1e2f,
+        Float nvg_scale     = 1e2f,
               inv_nvg_scale = rcp(nvg_scale);
         nvgScale(ctx, inv_nvg_scale, inv_nvg_scale);
 
-        auto nvgRectS = [&](NVGcontext *ctx, float x, float y, float w, float h, float r) {
+        auto nvgRectS = [&](NVGcontext *ctx, Float x, Float y, Float w, Float h, Float r) {
             nvgRoundedRectVarying(ctx, nvg_scale*x, nvg_scale*y, nvg_scale*w, nvg_scale*h,
                                   nvg_scale*r, nvg_scale*r, 0.f, 0.f);
         };
 
-        auto nvgLinearGradientS = [&](NVGcontext *ctx, float sx, float sy, float ex, float ey,
+        auto nvgLinearGradientS = [&](NVGcontext *ctx, Float sx, Float sy, Float ex, Float ey,
                                       NVGcolor icolor, NVGcolor ecolor) {
             return nvgLinearGradient(ctx, nvg_scale*sx, nvg_scale*sy, nvg_scale*ex, nvg_scale*ey,
                                      icolor, ecolor);
@@ -118,9 +142,9 @@ public:
 
         // Another limitation of nanovg is that rectangles are always axis-aligned.
         // We need to do some more coordinate transforms to generalize.
-        float phi = atan2(m_b[1] - m_a[1], m_b[0] - m_a[0]);
+        Float phi = atan2(m_b[1] - m_a[1], m_b[0] - m_a[0]);
         auto [sp, cp] = sincos(phi);
-        float length = (1.f + 2.f*corner_radius)*norm(m_b - m_a);
+        Float length = (1.f + 2.f*corner_radius)*norm(m_b - m_a);
 
         Matrix2f R  = Matrix2f(cp, -sp, sp, cp),
                  Ri = transpose(R),
@@ -155,6 +179,9 @@ public:
         nvgRestore(ctx);
     }
 
+    const Point2f &a() const { return m_a; }
+    const Point2f &b() const { return m_b; }
+
     std::string to_string() const override {
         std::ostringstream oss;
         oss << "LinearSegment[" << std::endl
@@ -168,8 +195,8 @@ protected:
     Point2f m_a, m_b;
 
 public:
-    float height = 1.f;
-    float gradient_start = 0.04f,
+    Float height = 1.f;
+    Float gradient_start = 0.04f,
           gradient_width = 0.03f;
-    float corner_radius = 0.04f;
+    Float corner_radius = 0.04f;
 };